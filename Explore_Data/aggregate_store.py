@@ -0,0 +1,533 @@
+"""
+Incremental Aggregate Store
+Persistent per apartment x category aggregates, maintained report by report
+instead of being recomputed from the full history.
+
+Tables (in the analytics side DB, attached as `agg`):
+- ReportLedger: which reports have been applied, with the signature
+  (Report.updatedAt, item count) they were applied with.
+- ApartmentCategoryReport: the contribution of one report to one
+  apartment x category: item count, sum of V3 item progress, V3 defect
+  count and OK/DEFECT/PENDING/INFO state tallies.
+- ApartmentCategoryTotals: running totals of the above over all reports.
+- ItemLatestState: the latest non-INFO state per (apartment, category,
+  location) - the basis of the readiness summary.
+
+Applying or removing a report touches only that report's items (plus, on
+removal, a history lookup for the items whose latest state it held), so
+a new, re-processed or deleted report costs O(items in the report).
+sync() finds those reports by comparing dev.db with the ledger.
+
+The readers (read_readiness, read_progress, read_timeseries,
+read_defect_history) answer from the store alone. read_current() syncs
+first, so its answers match a full recomputation; it backs
+get_readiness_data(aggregates=True), get_defect_history(aggregates=True)
+and the defect-history and completion charts.
+
+Usage:
+    python aggregate_store.py sync      # apply new/changed/deleted reports
+    python aggregate_store.py rebuild   # drop and rebuild from the full history
+    python aggregate_store.py verify    # compare the store with a full recomputation
+"""
+
+import sys
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+from explore_db import STATUS_MAP, attach_analytics_db, check_unambiguous, get_db_connection
+from calculate_v3_progress import CATEGORY_WEIGHTS, calculate_item_progress_v3, has_defect_v3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg.ReportLedger (
+    reportId TEXT PRIMARY KEY,
+    projectId TEXT NOT NULL,
+    reportDate INTEGER NOT NULL,
+    hasErrors INTEGER NOT NULL DEFAULT 0,
+    updatedAt INTEGER,
+    itemCount INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS agg.ApartmentCategoryReport (
+    reportId TEXT NOT NULL,
+    projectId TEXT NOT NULL,
+    apartmentId TEXT NOT NULL,
+    apartmentNumber TEXT NOT NULL,
+    category TEXT NOT NULL,
+    reportDate INTEGER NOT NULL,
+    items INTEGER NOT NULL,
+    progressSum INTEGER NOT NULL,
+    defectsV3 INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    defect INTEGER NOT NULL,
+    pending INTEGER NOT NULL,
+    info INTEGER NOT NULL,
+    PRIMARY KEY (reportId, apartmentId, category)
+);
+CREATE INDEX IF NOT EXISTS agg.ApartmentCategoryReport_apartment_idx
+    ON ApartmentCategoryReport (apartmentId, reportDate);
+
+CREATE TABLE IF NOT EXISTS agg.ApartmentCategoryTotals (
+    projectId TEXT NOT NULL,
+    apartmentId TEXT NOT NULL,
+    apartmentNumber TEXT NOT NULL,
+    category TEXT NOT NULL,
+    reports INTEGER NOT NULL,
+    items INTEGER NOT NULL,
+    progressSum INTEGER NOT NULL,
+    defectsV3 INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    defect INTEGER NOT NULL,
+    pending INTEGER NOT NULL,
+    info INTEGER NOT NULL,
+    PRIMARY KEY (apartmentId, category)
+);
+
+CREATE TABLE IF NOT EXISTS agg.ItemLatestState (
+    projectId TEXT NOT NULL,
+    apartmentId TEXT NOT NULL,
+    apartmentNumber TEXT NOT NULL,
+    category TEXT NOT NULL,
+    location TEXT NOT NULL,
+    reportId TEXT NOT NULL,
+    reportDate INTEGER NOT NULL,
+    itemId TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (apartmentId, category, location)
+);
+CREATE INDEX IF NOT EXISTS agg.ItemLatestState_report_idx ON ItemLatestState (reportId);
+"""
+
+TALLY_COLUMNS = ['items', 'progressSum', 'defectsV3', 'ok', 'defect', 'pending', 'info']
+STATE_COLUMNS = {'OK': 'ok', 'DEFECT': 'defect', 'PENDING': 'pending', 'INFO': 'info'}
+
+# ItemLatestState keys NULL locations as '' (primary key columns cannot be NULL)
+NO_LOCATION = ''
+
+
+def connect(db_path=None, analytics_db_path=None):
+    """
+    Opens dev.db with the analytics DB attached as `agg` and the schema in place.
+    """
+    conn = attach_analytics_db(get_db_connection(db_path), analytics_db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _report_items(conn, report_id):
+    query = """
+        SELECT w.id, w.apartmentId, a.number, a.projectId, w.category, w.location, w.status, w.notes
+        FROM WorkItem w
+        JOIN Apartment a ON w.apartmentId = a.id
+        WHERE w.reportId = ?
+        ORDER BY w.id
+    """
+    return conn.execute(query, (report_id,)).fetchall()
+
+
+def _add_totals(conn, row, sign):
+    """Adds (sign=1) or subtracts (sign=-1) one ApartmentCategoryReport row from the running totals."""
+    project_id, apartment_id, apartment_number, category = row[:4]
+    tallies = [sign * v for v in row[4:]]
+    conn.execute(f"""
+        INSERT INTO agg.ApartmentCategoryTotals
+            (projectId, apartmentId, apartmentNumber, category, reports, {', '.join(TALLY_COLUMNS)})
+        VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(TALLY_COLUMNS))})
+        ON CONFLICT (apartmentId, category) DO UPDATE SET
+            reports = reports + excluded.reports,
+            {', '.join(f'{c} = {c} + excluded.{c}' for c in TALLY_COLUMNS)}
+    """, (project_id, apartment_id, apartment_number, category, sign, *tallies))
+    conn.execute("DELETE FROM agg.ApartmentCategoryTotals WHERE apartmentId = ? AND category = ? AND reports <= 0",
+                 (apartment_id, category))
+
+
+def _refresh_latest_states(conn, keys, exclude_report_id):
+    """
+    Re-derives ItemLatestState for the given (apartmentId, category, location)
+    keys from the remaining history, ignoring exclude_report_id.
+    """
+    statuses = list(STATUS_MAP)
+    placeholders = ', '.join('?' * len(statuses))
+    for apartment_id, category, location in keys:
+        conn.execute("DELETE FROM agg.ItemLatestState WHERE apartmentId = ? AND category = ? AND location = ?",
+                     (apartment_id, category, location))
+        row = conn.execute(f"""
+            SELECT a.projectId, a.number, r.id, r.reportDate, w.id, w.status
+            FROM WorkItem w
+            JOIN Report r ON w.reportId = r.id
+            JOIN Apartment a ON w.apartmentId = a.id
+            WHERE w.apartmentId = ? AND w.category = ? AND coalesce(w.location, '') = ?
+              AND w.reportId != ? AND w.status IN ({placeholders})
+            ORDER BY r.reportDate DESC, w.id DESC
+            LIMIT 1
+        """, (apartment_id, category, location, exclude_report_id, *statuses)).fetchone()
+        if row:
+            project_id, number, report_id, report_date, item_id, status = row
+            conn.execute("""
+                INSERT INTO agg.ItemLatestState
+                    (projectId, apartmentId, apartmentNumber, category, location, reportId, reportDate, itemId, state)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (project_id, apartment_id, number, category, location, report_id, report_date, item_id,
+                  STATUS_MAP[status]))
+
+
+def remove_report(conn, report_id, _reapplying=False):
+    """
+    Removes a report's contribution. Safe to call after the report (and its
+    WorkItems) have been deleted from dev.db: the stored per-report rows are
+    what gets subtracted.
+    """
+    rows = conn.execute(f"""
+        SELECT projectId, apartmentId, apartmentNumber, category, {', '.join(TALLY_COLUMNS)}
+        FROM agg.ApartmentCategoryReport WHERE reportId = ?
+    """, (report_id,)).fetchall()
+    for row in rows:
+        _add_totals(conn, row, -1)
+    conn.execute("DELETE FROM agg.ApartmentCategoryReport WHERE reportId = ?", (report_id,))
+
+    keys = conn.execute("SELECT apartmentId, category, location FROM agg.ItemLatestState WHERE reportId = ?",
+                        (report_id,)).fetchall()
+    if _reapplying:
+        # apply_report re-adds this report's items right after
+        conn.execute("DELETE FROM agg.ItemLatestState WHERE reportId = ?", (report_id,))
+    _refresh_latest_states(conn, keys, report_id)
+
+    conn.execute("DELETE FROM agg.ReportLedger WHERE reportId = ?", (report_id,))
+
+
+def apply_report(conn, report_id):
+    """
+    Adds (or, for a re-processed report, replaces) a report's contribution.
+    Cost is proportional to the number of items in the report.
+    """
+    report = conn.execute(
+        "SELECT projectId, reportDate, hasErrors, updatedAt FROM Report WHERE id = ?", (report_id,)
+    ).fetchone()
+    if report is None:
+        remove_report(conn, report_id)
+        return
+    project_id, report_date, has_errors, updated_at = report
+
+    if conn.execute("SELECT 1 FROM agg.ReportLedger WHERE reportId = ?", (report_id,)).fetchone():
+        remove_report(conn, report_id, _reapplying=True)
+
+    items = _report_items(conn, report_id)
+    tallies = defaultdict(lambda: dict.fromkeys(TALLY_COLUMNS, 0))
+    latest = {}
+    for item_id, apartment_id, number, apt_project_id, category, location, status, notes in items:
+        entry = tallies[(apt_project_id, apartment_id, number, category)]
+        state = STATUS_MAP.get(status, 'INFO')
+        entry['items'] += 1
+        entry['progressSum'] += calculate_item_progress_v3(status, notes, is_first_time=False)
+        entry['defectsV3'] += int(has_defect_v3(status, notes))
+        entry[STATE_COLUMNS[state]] += 1
+        if state != 'INFO':
+            # Items are ordered by id, so the last one per key wins (same tie-break as the readers)
+            latest[(apartment_id, category, location or NO_LOCATION)] = (apt_project_id, number, item_id, state)
+
+    for (apt_project_id, apartment_id, number, category), entry in tallies.items():
+        values = [entry[c] for c in TALLY_COLUMNS]
+        conn.execute(f"""
+            INSERT INTO agg.ApartmentCategoryReport
+                (reportId, projectId, apartmentId, apartmentNumber, category, reportDate, {', '.join(TALLY_COLUMNS)})
+            VALUES (?, ?, ?, ?, ?, ?, {', '.join('?' * len(TALLY_COLUMNS))})
+        """, (report_id, apt_project_id, apartment_id, number, category, report_date, *values))
+        _add_totals(conn, (apt_project_id, apartment_id, number, category, *values), 1)
+
+    for (apartment_id, category, location), (apt_project_id, number, item_id, state) in latest.items():
+        conn.execute("""
+            INSERT INTO agg.ItemLatestState
+                (projectId, apartmentId, apartmentNumber, category, location, reportId, reportDate, itemId, state)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (apartmentId, category, location) DO UPDATE SET
+                reportId = excluded.reportId, reportDate = excluded.reportDate,
+                itemId = excluded.itemId, state = excluded.state
+            WHERE excluded.reportDate > ItemLatestState.reportDate
+               OR (excluded.reportDate = ItemLatestState.reportDate AND excluded.itemId > ItemLatestState.itemId)
+        """, (apt_project_id, apartment_id, number, category, location, report_id, report_date, item_id, state))
+
+    conn.execute("""
+        INSERT INTO agg.ReportLedger (reportId, projectId, reportDate, hasErrors, updatedAt, itemCount)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (report_id, project_id, report_date, int(bool(has_errors)), updated_at, len(items)))
+
+
+def pending_changes(conn):
+    """
+    Returns (to_apply, to_remove): reports that are new or changed since they
+    were applied, and ledger entries whose report no longer exists.
+    """
+    current = {
+        row[0]: (row[1], row[2]) for row in conn.execute("""
+            SELECT r.id, r.updatedAt, (SELECT COUNT(*) FROM WorkItem w WHERE w.reportId = r.id)
+            FROM Report r
+        """)
+    }
+    applied = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute("SELECT reportId, updatedAt, itemCount FROM agg.ReportLedger")
+    }
+    to_apply = [rid for rid, signature in current.items() if applied.get(rid) != signature]
+    to_remove = [rid for rid in applied if rid not in current]
+    return to_apply, to_remove
+
+
+def sync(conn=None):
+    """
+    Brings the store up to date with dev.db. Returns (applied, removed) counts.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = connect()
+    try:
+        to_apply, to_remove = pending_changes(conn)
+        with conn:
+            for report_id in to_remove:
+                remove_report(conn, report_id)
+            # Oldest first keeps the latest-state upserts cheap
+            for report_id in sorted(to_apply, key=lambda rid: _report_date(conn, rid)):
+                apply_report(conn, report_id)
+        return len(to_apply), len(to_remove)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def _report_date(conn, report_id):
+    return conn.execute("SELECT reportDate FROM Report WHERE id = ?", (report_id,)).fetchone()[0]
+
+
+def rebuild(conn=None):
+    """
+    Drops every aggregate and rebuilds the store from the full history.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = connect()
+    try:
+        with conn:
+            for table in ['ReportLedger', 'ApartmentCategoryReport', 'ApartmentCategoryTotals', 'ItemLatestState']:
+                conn.execute(f"DELETE FROM agg.{table}")
+        return sync(conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+# --- Readers ---
+
+_sync_lock = threading.Lock()
+
+def _read(query, params=(), conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = connect()
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def read_readiness(project_id=None, conn=None):
+    """
+    Readiness summary in the shape of progress_visualization.get_readiness_data.
+    """
+    from progress_visualization import readiness_index, summarize_readiness
+
+    query = "SELECT projectId, apartmentNumber, category, location, state AS State FROM agg.ItemLatestState"
+    params = ()
+    if project_id is not None:
+        query += " WHERE projectId = ?"
+        params = (project_id,)
+    latest = _read(query, params, conn)
+    if latest.empty:
+        return pd.DataFrame()
+    return summarize_readiness(latest, readiness_index(latest, project_id))
+
+
+def read_progress(project_id=None, conn=None):
+    """
+    V3 progress per apartment from its latest report, as computed by
+    calculate_v3_progress.calculate_apartment_progress(history=False): one row
+    per apartment with the overall weighted progress and the per-category progress.
+    """
+    query = """
+        SELECT c.projectId, c.apartmentNumber, c.category, c.items, c.progressSum, c.defectsV3
+        FROM agg.ApartmentCategoryReport c
+        JOIN (
+            SELECT apartmentId, MAX(reportDate) AS reportDate
+            FROM agg.ApartmentCategoryReport GROUP BY apartmentId
+        ) l ON l.apartmentId = c.apartmentId AND l.reportDate = c.reportDate
+    """
+    params = ()
+    if project_id is not None:
+        query += " WHERE c.projectId = ?"
+        params = (project_id,)
+    df = _read(query, params, conn)
+
+    # A report date can hold more than one report row; merge them per category
+    df = df.groupby(['projectId', 'apartmentNumber', 'category'], as_index=False)[
+        ['items', 'progressSum', 'defectsV3']
+    ].sum()
+    # Round half to even, like Python's round() in calculate_apartment_progress
+    df['progress'] = (df['progressSum'] / df['items']).round().astype(int)
+    df['weight'] = df['category'].map(CATEGORY_WEIGHTS).fillna(0.8)
+    df['weighted'] = df['progress'] * df['weight']
+
+    grouped = df.groupby(['projectId', 'apartmentNumber'])
+    summary = pd.DataFrame({
+        'overall': (grouped['weighted'].sum() / grouped['weight'].sum()).round().astype(int),
+        'defects': grouped['defectsV3'].sum(),
+    })
+    summary['by_category'] = [
+        dict(zip(group['category'], group['progress'].astype(int))) for _, group in grouped
+    ]
+    return summary.reset_index()
+
+
+def read_timeseries(project_id=None, conn=None):
+    """
+    Per-report OK/DEFECT/PENDING per (apartment, category) with cumulative
+    sums and completion_pct, as built in improved_charts.py.
+    """
+    keys = ['projectId', 'apartment_number', 'category']
+    query = """
+        SELECT c.projectId, c.apartmentNumber AS apartment_number, c.category, c.reportDate,
+               SUM(c.ok) AS OK, SUM(c.defect) AS DEFECT, SUM(c.pending) AS PENDING
+        FROM agg.ApartmentCategoryReport c
+        JOIN agg.ReportLedger l ON l.reportId = c.reportId
+        WHERE l.hasErrors = 0 AND c.ok + c.defect + c.pending > 0
+    """
+    params = ()
+    if project_id is not None:
+        query += " AND c.projectId = ?"
+        params = (project_id,)
+    query += " GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4"
+    df = _read(query, params, conn)
+    df['reportDate'] = pd.to_datetime(df['reportDate'], unit='ms')
+    # SQLite gives no type to the sums of an empty result
+    df[['OK', 'DEFECT', 'PENDING']] = df[['OK', 'DEFECT', 'PENDING']].astype('int64')
+
+    grouped = df.groupby(keys)
+    df['cumulative_ok'] = grouped['OK'].cumsum()
+    df['cumulative_defect'] = grouped['DEFECT'].cumsum()
+    df['cumulative_pending'] = grouped['PENDING'].cumsum()
+    df['cumulative_total'] = df['cumulative_ok'] + df['cumulative_defect'] + df['cumulative_pending']
+    df['total_scope'] = df.groupby(keys)['cumulative_total'].transform('max')
+    df['completion_pct'] = (df['cumulative_ok'] / df['total_scope'] * 100).fillna(0)
+    return df
+
+
+def read_defect_history(apt_num, project_id=None, conn=None):
+    """
+    Pending DEFECT count per (reportDate, category) for an apartment, in the
+    shape of the df_history frame from defect_history_chart.get_defect_history.
+    Raises ValueError when project_id is None and the number exists in more
+    than one project.
+    """
+    query = """
+        SELECT c.projectId, c.reportDate, c.category, SUM(c.defect) AS pending_defects
+        FROM agg.ApartmentCategoryReport c
+        JOIN agg.ReportLedger l ON l.reportId = c.reportId
+        WHERE c.apartmentNumber = ? AND l.hasErrors = 0
+    """
+    params = [str(apt_num)]
+    if project_id is not None:
+        query += " AND c.projectId = ?"
+        params.append(project_id)
+    query += " GROUP BY c.projectId, c.reportDate, c.category"
+    df = _read(query, params, conn)
+    if df.empty:
+        return pd.DataFrame(columns=['reportDate', 'category', 'pending_defects'])
+    check_unambiguous(apt_num, df['projectId'].unique())
+
+    full_index = pd.MultiIndex.from_product(
+        [sorted(df['reportDate'].unique()), sorted(df['category'].unique())], names=['reportDate', 'category']
+    )
+    df_history = df.set_index(['reportDate', 'category'])['pending_defects'].reindex(full_index, fill_value=0)
+    df_history = df_history.astype('int64').reset_index()
+    df_history['reportDate'] = pd.to_datetime(df_history['reportDate'], unit='ms')
+    return df_history
+
+
+def read_current(reader, *args, conn=None):
+    """
+    reader(*args) on the store after a sync(), so it reflects the DB as it
+    is now. A conn without the store gets it attached for the call.
+    """
+    own_conn = conn is None
+    attached = False
+    if own_conn:
+        conn = connect()
+    elif 'agg' not in [row[1] for row in conn.execute("PRAGMA database_list")]:
+        attach_analytics_db(conn)
+        conn.executescript(SCHEMA)
+        attached = True
+    try:
+        # Threads of one process (the analytics service) must not apply the same report twice
+        with _sync_lock:
+            sync(conn)
+        return reader(*args, conn=conn)
+    finally:
+        if own_conn:
+            conn.close()
+        elif attached:
+            conn.execute("DETACH DATABASE agg")
+
+
+def verify(conn=None):
+    """
+    Compares the store with a full recomputation. Returns a list of mismatch descriptions.
+    """
+    from progress_visualization import get_readiness_data
+    from calculate_v3_progress import calculate_apartment_progress
+
+    own_conn = conn is None
+    if own_conn:
+        conn = connect()
+    try:
+        mismatches = []
+
+        expected = get_readiness_data(conn=conn)
+        actual = read_readiness(conn=conn)
+        if not expected.reset_index(drop=False).equals(actual.reset_index(drop=False)):
+            mismatches.append("readiness summary differs from get_readiness_data()")
+
+        for row in read_progress(conn=conn).itertuples(index=False):
+            result = calculate_apartment_progress(
+                row.apartmentNumber, 'v3', row.projectId, conn=conn, verbose=False, history=False
+            )
+            if result is None or result['overall'] != row.overall or result['by_category'] != row.by_category:
+                mismatches.append(f"progress differs for apartment {row.apartmentNumber} ({row.projectId})")
+
+        to_apply, to_remove = pending_changes(conn)
+        if to_apply or to_remove:
+            mismatches.append(f"{len(to_apply)} reports not applied, {len(to_remove)} deleted reports still applied")
+        return mismatches
+    finally:
+        if own_conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'sync'
+
+    if command == 'sync':
+        applied, removed = sync()
+        print(f"Applied {applied} reports, removed {removed} reports.")
+    elif command == 'rebuild':
+        applied, _ = rebuild()
+        print(f"Rebuilt aggregates from {applied} reports.")
+    elif command == 'verify':
+        problems = verify()
+        if problems:
+            print("--- Aggregate store does NOT match a full recomputation ---")
+            for problem in problems:
+                print(f"  - {problem}")
+            sys.exit(1)
+        print("Aggregate store matches a full recomputation.")
+    else:
+        print(f"Unknown command: {command} (expected sync, rebuild or verify)")
+        sys.exit(2)
@@ -0,0 +1,164 @@
+"""
+Analytics Client
+Notebook helpers that ask the analytics service (analytics_service.py) for
+readiness, progress, defect history and time series, so a repeated query
+is answered from the service's memory in milliseconds instead of being
+recomputed in every notebook.
+
+Results are fetched as Arrow when pyarrow is installed, else as JSON, and
+come back as DataFrames shaped like the local functions' results. When the
+service is not running, the helpers compute the result locally (once
+noted) unless the client was made with fallback=False.
+
+Set CONSTRUCTOR_SERVICE_URL when the service runs elsewhere.
+
+Usage (notebook):
+    from analytics_client import readiness, progress, defect_history, timeseries
+    readiness('p1')
+"""
+
+import io
+import json
+import os
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+SERVICE_URL = os.environ.get(
+    'CONSTRUCTOR_SERVICE_URL',
+    f"http://127.0.0.1:{os.environ.get('CONSTRUCTOR_SERVICE_PORT', '8765')}",
+)
+TIMEOUT = 120
+
+ARROW_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+class ServiceError(Exception):
+    """The service answered with an error."""
+
+
+class AnalyticsClient:
+    def __init__(self, url=SERVICE_URL, arrow=HAS_PYARROW, fallback=True, timeout=TIMEOUT):
+        self.url = url.rstrip('/')
+        self.arrow = arrow
+        self.fallback = fallback
+        self.timeout = timeout
+        self._fallback_noted = False
+
+    def _request(self, path, params):
+        query = urlencode({k: v for k, v in params.items() if v is not None})
+        request = urllib.request.Request(f"{self.url}{path}?{query}")
+        if self.arrow:
+            request.add_header('Accept', ARROW_TYPE)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.headers.get('Content-Type', ''), response.read()
+        except urllib.error.HTTPError as e:
+            raise ServiceError(json.loads(e.read() or b'{}').get('error', f"HTTP {e.code}")) from None
+
+    def _frame(self, path, params, local):
+        """DataFrame from the service, or from local() when it is not running."""
+        try:
+            content_type, body = self._request(path, params)
+        except (urllib.error.URLError, ConnectionError):
+            if not self.fallback:
+                raise
+            if not self._fallback_noted:
+                print(f"Analytics service not reachable at {self.url}; computing locally.")
+                self._fallback_noted = True
+            return local()
+        if content_type.startswith(ARROW_TYPE):
+            return pa.ipc.open_stream(io.BytesIO(body)).read_all().to_pandas()
+        payload = json.loads(body)
+        return pd.DataFrame(payload['data'], columns=payload['columns'])
+
+    def available(self):
+        try:
+            self._request('/status', {})
+            return True
+        except (urllib.error.URLError, ConnectionError, ServiceError):
+            return False
+
+    def status(self):
+        return json.loads(self._request('/status', {})[1])
+
+    def readiness(self, project_id=None):
+        """progress_visualization.get_readiness_data(project_id)"""
+        def local():
+            from progress_visualization import get_readiness_data
+            return get_readiness_data(project_id)
+
+        df = self._frame('/readiness', {'project': project_id}, local)
+        # Same index as get_readiness_data: projectId only when several projects are covered
+        index_cols = ['projectId', 'apartmentNumber'] if 'projectId' in df.columns else ['apartmentNumber']
+        if df.empty or 'apartmentNumber' not in df.columns:
+            return df
+        return df.set_index(index_cols).rename_axis(columns='State')
+
+    def progress(self, version='v3', project_id=None):
+        """calculate_v3_progress.calculate_all_progress(version, project_id)"""
+        def local():
+            from calculate_v3_progress import calculate_all_progress
+            return calculate_all_progress(version, project_id)
+
+        df = self._frame('/progress', {'version': version, 'project': project_id}, local)
+        if 'by_category' in df.columns:
+            df['by_category'] = df['by_category'].map(lambda v: json.loads(v) if isinstance(v, str) else v)
+        return df
+
+    def defect_history(self, apt_num, project_id=None):
+        """The df_history frame of defect_history_chart.get_defect_history(apt_num, project_id)"""
+        def local():
+            from defect_history_chart import get_defect_history
+            return get_defect_history(apt_num, project_id)[1]
+
+        df = self._frame('/defect-history', {'apt': apt_num, 'project': project_id}, local)
+        if 'reportDate' in df.columns:
+            df['reportDate'] = pd.to_datetime(df['reportDate'])
+        return df
+
+    def timeseries(self, project_id=None):
+        """duckdb_engine completion_timeseries(project_id) as a DataFrame"""
+        def local():
+            from duckdb_engine import as_pandas, get_engine
+            engine = get_engine()
+            try:
+                return as_pandas(engine.completion_timeseries(project_id))
+            finally:
+                engine.close()
+
+        return self._frame('/timeseries', {'project': project_id}, local)
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = AnalyticsClient()
+    return _client
+
+
+def readiness(project_id=None):
+    return get_client().readiness(project_id)
+
+
+def progress(version='v3', project_id=None):
+    return get_client().progress(version, project_id)
+
+
+def defect_history(apt_num, project_id=None):
+    return get_client().defect_history(apt_num, project_id)
+
+
+def timeseries(project_id=None):
+    return get_client().timeseries(project_id)
@@ -0,0 +1,285 @@
+"""
+Analytics Service
+A local HTTP service that keeps the WorkItem frame (load_work_items) and
+every result it has computed in memory, so the dashboard and the notebooks
+stop recomputing the same readiness and progress numbers. Notebooks call
+it through analytics_client.py.
+
+Endpoints (GET, query parameters in brackets):
+    /readiness        [project]                 readiness summary per apartment
+    /progress         [version=v3] [project]    calculate_all_progress()
+    /defect-history   apt [project]             pending defects per report date and category (aggregate store)
+    /timeseries       [project]                 cumulative completion per category (DuckDB engine)
+    /status           the DB token and the cache contents
+
+Results are JSON ({"columns": [...], "data": [[...], ...]}), or an Arrow IPC
+stream with ?format=arrow or an `Accept: application/vnd.apache.arrow.stream`
+header (requires pyarrow).
+
+Every request compares db_token() (size and mtime of the DB the analyses
+read, see explore_db.read_db_path) with the token the cache was filled
+under and drops the cache when the DB changed. Computations run in a
+worker thread, one per distinct request at a time; concurrent identical
+requests wait for the same result.
+
+Binds to 127.0.0.1 unless told otherwise; there is no authentication, so
+only bind to another interface on a trusted network.
+
+Usage:
+    python analytics_service.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from calculate_v3_progress import calculate_all_progress
+from defect_history_chart import get_defect_history
+from duckdb_engine import as_pandas, get_engine
+from explore_db import db_token
+from progress_visualization import readiness_from_items
+from work_items import load_work_items
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+HOST = os.environ.get('CONSTRUCTOR_SERVICE_HOST', '127.0.0.1')
+PORT = int(os.environ.get('CONSTRUCTOR_SERVICE_PORT', '8765'))
+
+ARROW_TYPE = 'application/vnd.apache.arrow.stream'
+JSON_TYPE = 'application/json'
+
+MAX_HEADER_LINES = 100
+
+
+class RequestError(Exception):
+    """A request the service cannot answer, with its HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def to_json(df):
+    # DuckDB window sums come back as Decimal, which to_json would write as strings
+    df = df.assign(**{
+        column: pd.to_numeric(df[column])
+        for column in df.columns
+        if df[column].dtype == object and df[column].map(lambda v: isinstance(v, Decimal)).any()
+    })
+    return df.to_json(orient='split', index=False, date_format='iso', date_unit='ms').encode('utf-8')
+
+
+def to_arrow(df):
+    # Dicts (progress by_category) have no fixed Arrow type; they travel as JSON text
+    df = df.assign(**{
+        column: df[column].map(json.dumps)
+        for column in df.columns
+        if df[column].dtype == object and df[column].map(lambda v: isinstance(v, dict)).any()
+    })
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as stream:
+        stream.write_table(table)
+    return sink.getvalue()
+
+
+class AnalyticsCache:
+    """
+    Results keyed by request, valid for one db_token(). `computing` holds
+    the task of a result being computed, so identical requests share it.
+    """
+
+    def __init__(self):
+        self.token = None
+        self.filled_at = None
+        self.results = {}
+        self.computing = {}
+        self.hits = self.misses = 0
+
+    def check_token(self):
+        token = db_token()
+        if token != self.token:
+            self.token = token
+            self.filled_at = time.time()
+            self.results.clear()
+            self.computing.clear()
+
+    async def get(self, key, compute):
+        """The cached result for key, else compute() run in a worker thread."""
+        self.check_token()
+        if key in self.results:
+            self.hits += 1
+            return self.results[key]
+        task = self.computing.get(key)
+        if task is None:
+            self.misses += 1
+            token = self.token
+            task = asyncio.ensure_future(asyncio.to_thread(compute))
+            self.computing[key] = task
+            try:
+                value = await task
+            finally:
+                if self.computing.get(key) is task:
+                    del self.computing[key]
+            # A DB change while computing makes the result stale: serve it, do not keep it
+            if self.token == token:
+                self.results[key] = value
+            return value
+        self.hits += 1
+        return await asyncio.shield(task)
+
+
+class AnalyticsService:
+    def __init__(self):
+        self.cache = AnalyticsCache()
+        self.routes = {
+            '/readiness': self.readiness,
+            '/progress': self.progress,
+            '/defect-history': self.defect_history,
+            '/timeseries': self.timeseries,
+        }
+
+    async def items(self):
+        """Every apartment WorkItem, INFO rows included: the frame readiness is computed from."""
+        return await self.cache.get(('items',), lambda: load_work_items(drop_info=False))
+
+    async def readiness(self, params):
+        project_id = params.get('project')
+        items = await self.items()
+        summary = await self.cache.get(('readiness', project_id),
+                                       lambda: readiness_from_items(items, project_id))
+        return summary.reset_index() if not summary.empty else summary
+
+    async def progress(self, params):
+        version = params.get('version', 'v3')
+        if version not in ('v2', 'v3'):
+            raise RequestError(400, f"Unknown version {version} (v2 or v3)")
+        project_id = params.get('project')
+        return await self.cache.get(('progress', version, project_id),
+                                    lambda: calculate_all_progress(version, project_id))
+
+    async def defect_history(self, params):
+        if 'apt' not in params:
+            raise RequestError(400, "Missing the apt parameter")
+        apt_num, project_id = params['apt'], params.get('project')
+        return await self.cache.get(('defect-history', apt_num, project_id),
+                                    lambda: get_defect_history(apt_num, project_id, aggregates=True)[1])
+
+    async def timeseries(self, params):
+        project_id = params.get('project')
+
+        def compute():
+            engine = get_engine()
+            try:
+                return as_pandas(engine.completion_timeseries(project_id))
+            finally:
+                engine.close()
+
+        return await self.cache.get(('timeseries', project_id), compute)
+
+    def status(self):
+        self.cache.check_token()
+        return {
+            'dbToken': self.cache.token,
+            'cachedSince': self.cache.filled_at,
+            'results': [list(key) for key in self.cache.results],
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+        }
+
+    async def respond(self, method, target, headers):
+        """(status, content type, body) for one request."""
+        if method != 'GET':
+            raise RequestError(405, f"{method} is not supported")
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if url.path == '/status':
+            return 200, JSON_TYPE, json.dumps(self.status()).encode('utf-8')
+        handler = self.routes.get(url.path)
+        if handler is None:
+            raise RequestError(404, f"Unknown endpoint {url.path} (known: /status, {', '.join(self.routes)})")
+
+        arrow = params.get('format') == 'arrow' or ARROW_TYPE in headers.get('accept', '')
+        if arrow and not HAS_PYARROW:
+            raise RequestError(406, "pyarrow is not installed; ask for JSON")
+        try:
+            df = await handler(params)
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        fmt = 'arrow' if arrow else 'json'
+        key = (url.path, tuple(sorted(params.items())), fmt)
+        body = await self.cache.get(key, lambda: to_arrow(df) if arrow else to_json(df))
+        return 200, ARROW_TYPE if arrow else JSON_TYPE, body
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            headers = {}
+            for _ in range(MAX_HEADER_LINES):
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            try:
+                method, target, _ = request_line.split(' ', 2)
+                status, content_type, body = await self.respond(method, target, headers)
+            except RequestError as e:
+                status, content_type, body = e.status, JSON_TYPE, json.dumps({'error': str(e)}).encode('utf-8')
+            except ValueError:
+                status, content_type, body = 400, JSON_TYPE, b'{"error": "Malformed request"}'
+            except Exception as e:
+                print(f"Error serving {request_line}: {type(e).__name__}: {e}")
+                status, content_type, body = 500, JSON_TYPE, json.dumps({'error': str(e)}).encode('utf-8')
+
+            writer.write(
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host=HOST, port=PORT):
+    service = AnalyticsService()
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving analytics on http://{host}:{port} (Ctrl+C to stop)")
+    async with server:
+        await server.serve_forever()
+
+
+def _option(args, flag, default):
+    if flag in args and args.index(flag) + 1 < len(args):
+        return args[args.index(flag) + 1]
+    return default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if '-h' in args or '--help' in args:
+        print(__doc__)
+        sys.exit(0)
+    host = _option(args, '--host', HOST)
+    if host not in ('127.0.0.1', 'localhost', '::1'):
+        print(f"Warning: binding to {host}; the service has no authentication.")
+    try:
+        asyncio.run(serve(host, int(_option(args, '--port', PORT))))
+    except KeyboardInterrupt:
+        pass
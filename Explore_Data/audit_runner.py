@@ -0,0 +1,280 @@
+"""
+Report Audit Runner
+Runs every registered check against every report concurrently and prints
+one consolidated audit, instead of running check_feb10_report.py,
+get_failed_report_path.py, investigate_zero_defects.py and check_files.py
+one at a time.
+
+A check is a coroutine registered with @check(name, description). It gets
+the database pool and one Report row (a dict, without rawExtraction) and
+returns a list of (severity, message) findings, severity being 'error' or
+'warning'. Queries go through the pool: aiosqlite connections when
+aiosqlite is installed, else sqlite3 connections driven from a thread.
+Blocking file work (stat, hashing, JSON parsing) runs in the default
+thread pool. At most CONCURRENCY checks are in flight at once.
+
+The DB is opened read-only; the audit never writes.
+
+Usage:
+    python audit_runner.py [--project ID] [--checks name,name] [--concurrency N] [--json out.json]
+    python audit_runner.py list       # the registered checks
+
+Exits with 1 when an error-level finding is reported or a check failed.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import timedelta
+
+from explore_db import ANALYTICS_DB_PATH, attach_analytics_db, read_db_path
+from extraction_store import read_field
+from pdf_reconcile import PDF_DIR, hash_file
+from report_catalog import parse_filename_date, to_date
+
+try:
+    import aiosqlite
+    HAS_AIOSQLITE = True
+except ImportError:
+    HAS_AIOSQLITE = False
+
+CONCURRENCY = 32
+POOL_SIZE = 4
+
+REPORT_COLUMNS = ['id', 'projectId', 'reportDate', 'fileName', 'filePath', 'fileHash',
+                  'processed', 'hasErrors', 'errorDetails']
+
+# name -> (coroutine function, description), in registration order
+CHECKS = {}
+
+
+def check(name, description):
+    """Registers a check coroutine: async def fn(db, report) -> [(severity, message)]."""
+    def register(func):
+        CHECKS[name] = (func, description)
+        return func
+    return register
+
+
+class Database:
+    """
+    A fixed pool of read-only connections to the DB. Each query borrows a
+    connection, so up to POOL_SIZE queries run at the same time.
+    """
+
+    def __init__(self, db_path=None, size=POOL_SIZE):
+        self.db_path = db_path or read_db_path()
+        self.size = size
+        self._pool = None
+        self._connections = []
+
+    def _uri(self):
+        return f"file:{os.path.abspath(self.db_path)}?mode=ro"
+
+    async def open(self):
+        self._pool = asyncio.Queue()
+        for _ in range(self.size):
+            if HAS_AIOSQLITE:
+                conn = await aiosqlite.connect(self._uri(), uri=True)
+            else:
+                conn = sqlite3.connect(self._uri(), uri=True, check_same_thread=False)
+            self._connections.append(conn)
+            self._pool.put_nowait(conn)
+        return self
+
+    async def close(self):
+        for conn in self._connections:
+            if HAS_AIOSQLITE:
+                await conn.close()
+            else:
+                conn.close()
+        self._connections = []
+
+    async def fetchall(self, sql, params=()):
+        conn = await self._pool.get()
+        try:
+            if HAS_AIOSQLITE:
+                return list(await conn.execute_fetchall(sql, params))
+            return await asyncio.to_thread(lambda: conn.execute(sql, params).fetchall())
+        finally:
+            self._pool.put_nowait(conn)
+
+    async def fetchone(self, sql, params=()):
+        rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+
+def _local_pdf(report):
+    """The report's PDF on this machine: filePath, else PDF_DIR/fileName. None when neither exists."""
+    for path in (report['filePath'], os.path.join(PDF_DIR, report['fileName'] or '')):
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+@check('processing', "Report not processed, or processed with errors")
+async def check_processing(db, report):
+    findings = []
+    if not report['processed']:
+        findings.append(('error', "not processed"))
+    if report['hasErrors']:
+        details = (report['errorDetails'] or '').replace('\n', ' ')
+        findings.append(('warning', f"processed with errors: {details[:120]}"))
+    return findings
+
+
+@check('file', "PDF missing on disk or changed since it was uploaded")
+async def check_file(db, report):
+    path = await asyncio.to_thread(_local_pdf, report)
+    if path is None:
+        return [('error', f"PDF not found: {report['filePath']}")]
+    if report['fileHash']:
+        digest = await asyncio.to_thread(hash_file, path)
+        if digest != report['fileHash']:
+            return [('error', f"{path} does not match fileHash")]
+    return []
+
+
+@check('date', "reportDate differs from the date in the file name")
+async def check_date(db, report):
+    from_name = parse_filename_date(report['fileName'])
+    if from_name is None:
+        return [('warning', "no date in the file name")]
+    stored = to_date(report['reportDate'])
+    # DD.MM.YY file name dates are stored as local midnight, a day early in UTC
+    if from_name not in (stored, stored + timedelta(days=1)):
+        return [('warning', f"reportDate {stored} but file name says {from_name}")]
+    return []
+
+
+@check('items', "Processed report without work items, or without any DEFECT")
+async def check_items(db, report):
+    total, defects = await db.fetchone(
+        "SELECT COUNT(*), COALESCE(SUM(status = 'DEFECT'), 0) FROM WorkItem WHERE reportId = ?",
+        (report['id'],),
+    )
+    if not report['processed']:
+        return []
+    if total == 0:
+        return [('error', "no work items")]
+    if defects == 0:
+        return [('warning', f"zero defects in {total} items")]
+    return []
+
+
+def _stored_extraction(db_path, report_id):
+    """rawExtraction of a report from the extraction store (pruned from the DB), read-only."""
+    if not os.path.exists(ANALYTICS_DB_PATH):
+        return None
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        return read_field(attach_analytics_db(conn), report_id, 'rawExtraction')
+    finally:
+        conn.close()
+
+
+@check('extraction', "rawExtraction missing or not valid JSON")
+async def check_extraction(db, report):
+    row = await db.fetchone("SELECT rawExtraction FROM Report WHERE id = ?", (report['id'],))
+    raw = row[0] if row else None
+    if not raw:
+        raw = await asyncio.to_thread(_stored_extraction, db.db_path, report['id'])
+    if not raw:
+        return [('error' if report['processed'] else 'warning', "no rawExtraction")]
+    try:
+        await asyncio.to_thread(json.loads, raw)
+    except ValueError as e:
+        return [('error', f"rawExtraction is not valid JSON: {e}")]
+    return []
+
+
+async def _run_one(semaphore, name, func, db, report):
+    async with semaphore:
+        try:
+            findings = await func(db, report)
+        except Exception as e:
+            findings = [('failed', f"{type(e).__name__}: {e}")]
+    return [(name, report['id'], report['fileName'], severity, message) for severity, message in findings]
+
+
+async def run_audit(project_id=None, checks=None, concurrency=CONCURRENCY, db_path=None):
+    """
+    Runs the checks (names, default all) on every report of the project
+    (default all projects). Returns (findings, report_count) where each
+    finding is (check, reportId, fileName, severity, message).
+    """
+    selected = {name: CHECKS[name][0] for name in (checks or CHECKS)}
+    db = await Database(db_path).open()
+    try:
+        sql = f"SELECT {', '.join(REPORT_COLUMNS)} FROM Report"
+        params = ()
+        if project_id is not None:
+            sql += " WHERE projectId = ?"
+            params = (project_id,)
+        reports = [dict(zip(REPORT_COLUMNS, row)) for row in await db.fetchall(sql + " ORDER BY reportDate", params)]
+
+        semaphore = asyncio.Semaphore(concurrency)
+        results = await asyncio.gather(*(
+            _run_one(semaphore, name, func, db, report)
+            for report in reports
+            for name, func in selected.items()
+        ))
+    finally:
+        await db.close()
+    return [finding for findings in results for finding in findings], len(reports)
+
+
+def print_audit(findings, report_count, checks):
+    print(f"Audited {report_count} reports with {len(checks)} checks")
+    for name in checks:
+        rows = [f for f in findings if f[0] == name]
+        print(f"\n--- {name}: {CHECKS[name][1]} ({len(rows)}) ---")
+        for _, report_id, file_name, severity, message in rows:
+            print(f"  [{severity}] {file_name} ({report_id}): {message}")
+    by_severity = {}
+    for finding in findings:
+        by_severity[finding[3]] = by_severity.get(finding[3], 0) + 1
+    print("\nTotal: " + (', '.join(f"{n} {s}" for s, n in sorted(by_severity.items())) or "no findings"))
+
+
+def _option(args, flag, default=None):
+    if flag in args:
+        i = args.index(flag)
+        if i + 1 < len(args):
+            return args[i + 1]
+    return default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == 'list':
+        for name, (_, description) in CHECKS.items():
+            print(f"{name:<12} {description}")
+        sys.exit(0)
+
+    checks = _option(args, '--checks')
+    checks = checks.split(',') if checks else list(CHECKS)
+    unknown = [name for name in checks if name not in CHECKS]
+    if unknown:
+        print(f"Unknown checks: {', '.join(unknown)} (known: {', '.join(CHECKS)})")
+        sys.exit(2)
+
+    start = time.perf_counter()
+    findings, report_count = asyncio.run(run_audit(
+        _option(args, '--project'), checks, int(_option(args, '--concurrency', CONCURRENCY)),
+    ))
+    print_audit(findings, report_count, checks)
+    print(f"Finished in {time.perf_counter() - start:.2f}s "
+          f"({'aiosqlite' if HAS_AIOSQLITE else 'sqlite3 in threads'})")
+
+    json_path = _option(args, '--json')
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump([dict(zip(['check', 'reportId', 'fileName', 'severity', 'message'], finding))
+                       for finding in findings], f, ensure_ascii=False, indent=2)
+        print(f"Wrote {json_path}")
+
+    sys.exit(1 if any(f[3] in ('error', 'failed') for f in findings) else 0)
@@ -0,0 +1,342 @@
+"""
+Bulk Re-import
+Rebuilds the WorkItem and Inspection rows of reports from their stored
+rawExtraction (or from a snapshot export), with the same rules as the
+save step of processReport (src/lib/report-processing.ts), without
+calling the extraction model again. Use it after the status / category
+rules changed; renormalize.py shows what a rebuild would change.
+
+Loading:
+- The secondary indexes of WorkItem and Inspection are dropped before the
+  load and created again after it (also when the load fails), when the
+  rebuild covers at least DROP_INDEXES_SHARE of the reports. Recreating
+  them costs a full table pass, which a rebuild of a few reports should
+  not pay.
+- Reports are loaded in batches, one transaction per batch: the batch's
+  old rows are deleted and the new ones inserted with executemany, so a
+  failed run leaves every report either rebuilt or untouched.
+- Ids are cuid-style and generated per batch, in insertion order, so
+  ORDER BY createdAt, id still returns the items in report order.
+- Report.updatedAt is bumped for every rebuilt report, so the aggregate
+  store, the extraction store and the parse caches see the change.
+
+Usage:
+    python bulk_reimport.py [--project <id>] [--from <snapshot_id|file.json>]
+                            [--drop-indexes | --keep-indexes] [report_id ...]
+"""
+
+import json
+import os
+import re
+import socket
+import sys
+import time
+from datetime import datetime, time as dt_time, timezone
+
+import numpy as np
+
+from explore_db import get_live_connection
+from extraction_store import attach_store, read_field, value_condition
+from renormalize import Rules, _text, parse_extraction
+from report_catalog import rolled_date
+from snapshot_reader import iter_json_records, iter_snapshot
+
+BATCH_SIZE = 500
+# Share of all reports from which dropping and recreating the indexes beats
+# updating them row by row
+DROP_INDEXES_SHARE = 0.25
+
+TABLES = ('WorkItem', 'Inspection')
+
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+DMY_DATE = re.compile(r'^(\d{1,2})\.(\d{1,2})\.(\d{2,4})$')
+# Tracking cells holding a verdict rather than a date
+NOT_A_DATE = ('תקין', 'קיימים')
+
+BASE36 = np.frombuffer(b'0123456789abcdefghijklmnopqrstuvwxyz', dtype='S1')
+
+
+def _base36(numbers, width):
+    """Fixed-width base-36 strings (bytes) of an int array."""
+    powers = 36 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    digits = (np.asarray(numbers, dtype=np.int64)[:, None] // powers) % 36
+    return np.ascontiguousarray(BASE36[digits]).view(f'S{width}').ravel()
+
+
+_FINGERPRINT = (_base36([os.getpid()], 2)[0]
+                + _base36([sum(map(ord, socket.gethostname()))], 2)[0])
+_rng = np.random.default_rng()
+_last_timestamp = 0
+
+
+def cuid_batch(count):
+    """
+    `count` cuid-style ids ('c' + time + counter + fingerprint + random,
+    25 chars) that sort in generation order, also across batches.
+    """
+    global _last_timestamp
+    if count > 36 ** 4:
+        raise ValueError(f"At most {36 ** 4} ids per batch")
+    # A new batch never reuses the time block of the previous one
+    timestamp = max(int(time.time() * 1000), _last_timestamp + 1)
+    _last_timestamp = timestamp
+    prefix = b'c' + _base36([timestamp], 8)[0]
+    ids = np.char.add(prefix, _base36(np.arange(count), 4))
+    ids = np.char.add(np.char.add(ids, _FINGERPRINT), _base36(_rng.integers(0, 36 ** 8, count), 8))
+    return ids.astype('U25').tolist()
+
+
+def parse_date(value):
+    """parseDate from report-processing.ts, as epoch ms."""
+    if not value or not isinstance(value, str):
+        return None
+    trimmed = value.strip()
+    if any(word in trimmed for word in NOT_A_DATE):
+        return None
+
+    if ISO_DATE.match(trimmed):
+        try:
+            parsed = datetime.fromisoformat(trimmed).replace(tzinfo=timezone.utc)
+            return int(parsed.timestamp() * 1000)
+        except ValueError:
+            pass
+
+    match = DMY_DATE.match(trimmed)
+    if match:
+        day, month, year = (int(g) for g in match.groups())
+        if year < 100:
+            year += 2000
+        # new Date(y, m, d) is local midnight, and rolls over out-of-range values
+        return int(datetime.combine(rolled_date(year, month, day), dt_time()).timestamp() * 1000)
+
+    try:
+        parsed = datetime.fromisoformat(trimmed.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return int(parsed.timestamp() * 1000)
+
+
+def build_rows(raw, apartment_ids, normalize_status, normalize_category):
+    """
+    The WorkItems and Inspections processReport would save for a
+    rawExtraction, as (work_items, inspections) lists of dicts.
+    apartment_ids maps the project's apartment numbers to ids.
+    """
+    data = json.loads(raw)
+    work_items = []
+    for item in parse_extraction(data):
+        apartment_id = None
+        if item['apartmentNumber'] is not None:
+            apartment_id = apartment_ids.get(item['apartmentNumber'])
+            if apartment_id is None:
+                continue
+        work_items.append({
+            'apartmentId': apartment_id,
+            'category': normalize_category(item['rawCategory'], item['description']),
+            'location': item['location'],
+            'description': item['description'],
+            'status': normalize_status(item['rawStatus'], item['notes']),
+            'notes': item['notes'],
+            'hasPhoto': item['hasPhoto'],
+        })
+
+    # Keyed like the (reportId, apartmentId, category) upserts: later entries update earlier ones
+    inspections = {}
+    for apt in data.get('apartments') or []:
+        apartment_id = apartment_ids.get(_text(apt.get('apartmentNumber')))
+        if apartment_id is None or not isinstance(apt.get('inspectionDates'), dict):
+            continue
+        for category, date_str in apt['inspectionDates'].items():
+            inspection_date = parse_date(date_str)
+            if inspection_date is None:
+                continue
+            key = (apartment_id, normalize_category(category, ''))
+            inspections.setdefault(key, {'status': None})['inspectionDate'] = inspection_date
+
+    tracking = data.get('progressTracking')
+    for entry in tracking if isinstance(tracking, list) else []:
+        apartment_id = apartment_ids.get(_text(entry.get('apartmentNumber')))
+        inspection_date = parse_date(entry.get('inspectionDate'))
+        if apartment_id is None or inspection_date is None:
+            continue
+        key = (apartment_id, normalize_category(_text(entry.get('category')), ''))
+        row = inspections.setdefault(key, {'status': None})
+        row['inspectionDate'] = inspection_date
+        if entry.get('status'):
+            row['status'] = normalize_status(_text(entry['status']), None)
+
+    return work_items, [
+        {'apartmentId': apartment_id, 'category': category, **row}
+        for (apartment_id, category), row in inspections.items()
+    ]
+
+
+def select_reports(conn, report_ids=None, project_id=None, with_extraction=True):
+    """{reportId: projectId} of the selected reports, in reportDate order."""
+    query = "SELECT id, projectId FROM Report"
+    conditions, params = [], []
+    if with_extraction:
+        conditions.append(value_condition(conn, 'rawExtraction'))
+    if project_id is not None:
+        conditions.append("projectId = ?")
+        params.append(project_id)
+    if report_ids:
+        conditions.append(f"id IN ({', '.join('?' * len(report_ids))})")
+        params.extend(report_ids)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return dict(conn.execute(query + " ORDER BY reportDate, id", params).fetchall())
+
+
+def iter_sources(conn, projects, source=None):
+    """
+    (reportId, projectId, rawExtraction) of the reports in `projects`
+    ({reportId: projectId}), read one at a time: from the DB, or from a
+    snapshot id / snapshot JSON file.
+    """
+    if source is None:
+        for report_id, project in projects.items():
+            yield report_id, project, read_field(conn, report_id, 'rawExtraction')
+        return
+
+    if os.path.isfile(source):
+        with open(source, 'rb') as f:
+            for kind, record in iter_json_records(f):
+                if kind == 'reports' and record.get('id') in projects and record.get('rawExtraction'):
+                    yield record['id'], projects[record['id']], record['rawExtraction']
+        return
+
+    for _, record in iter_snapshot(conn, source, kinds={'reports'}):
+        if record['id'] in projects and record.get('rawExtraction'):
+            yield record['id'], projects[record['id']], record['rawExtraction']
+
+
+def _secondary_indexes(conn):
+    return conn.execute(f"""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({', '.join('?' * len(TABLES))})
+    """, TABLES).fetchall()
+
+
+def _load_batch(conn, batch, now):
+    """Replaces the rows of a batch of (reportId, work_items, inspections) in one transaction."""
+    report_ids = [report_id for report_id, _, _ in batch]
+    placeholders = ', '.join('?' * len(report_ids))
+    item_ids = iter(cuid_batch(sum(len(items) + len(insp) for _, items, insp in batch)))
+
+    with conn:
+        for table in TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE reportId IN ({placeholders})", report_ids)
+        conn.executemany("""
+            INSERT INTO WorkItem (id, reportId, apartmentId, category, location, description,
+                                  status, notes, hasPhoto, createdAt, updatedAt)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (next(item_ids), report_id, w['apartmentId'], w['category'], w['location'], w['description'],
+             w['status'], w['notes'], w['hasPhoto'], now, now)
+            for report_id, items, _ in batch for w in items
+        ])
+        conn.executemany("""
+            INSERT INTO Inspection (id, reportId, apartmentId, category, inspectionDate, status, createdAt, updatedAt)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (next(item_ids), report_id, i['apartmentId'], i['category'], i['inspectionDate'], i['status'], now, now)
+            for report_id, _, inspections in batch for i in inspections
+        ])
+        conn.execute(f"UPDATE Report SET updatedAt = ? WHERE id IN ({placeholders})", [now] + report_ids)
+
+
+def reimport(report_ids=None, project_id=None, source=None, conn=None, rules=None,
+             batch_size=BATCH_SIZE, drop_indexes=None):
+    """
+    Rebuilds the WorkItems and Inspections of the selected reports (all
+    reports with a rawExtraction by default). Returns a dict with the
+    counts of reports, workItems and inspections, and the ids of the
+    reports whose JSON could not be parsed (left untouched).
+    drop_indexes=None drops the indexes when the rebuild is large enough.
+    """
+    rules = rules or Rules()
+    status_cache, category_cache = {}, {}
+
+    def normalize_status(status, notes):
+        key = (status, notes)
+        if key not in status_cache:
+            status_cache[key] = rules.normalize_status(status, notes)
+        return status_cache[key]
+
+    def normalize_category(category, description):
+        key = (category, description)
+        if key not in category_cache:
+            category_cache[key] = rules.normalize_category(category, description)
+        return category_cache[key]
+
+    own_conn = conn is None
+    if own_conn:
+        # The extraction store holds rawExtraction of the reports pruned from dev.db
+        conn = attach_store(get_live_connection())
+    result = {'reports': 0, 'workItems': 0, 'inspections': 0, 'failed': []}
+    dropped = []
+    try:
+        projects = select_reports(conn, report_ids, project_id, with_extraction=source is None)
+        if drop_indexes is None:
+            total = conn.execute("SELECT COUNT(*) FROM Report").fetchone()[0]
+            drop_indexes = len(projects) >= DROP_INDEXES_SHARE * total
+        apartments = {}
+        for apartment_id, project, number in conn.execute("SELECT id, projectId, number FROM Apartment"):
+            apartments.setdefault(project, {})[number] = apartment_id
+
+        for name, sql in _secondary_indexes(conn) if drop_indexes else []:
+            with conn:
+                conn.execute(f'DROP INDEX "{name}"')
+            dropped.append(sql)
+
+        batch = []
+        now = int(time.time() * 1000)
+        for report_id, project, raw in iter_sources(conn, projects, source):
+            try:
+                items, inspections = build_rows(raw, apartments.get(project, {}),
+                                                normalize_status, normalize_category)
+            except (ValueError, AttributeError, TypeError):
+                result['failed'].append(report_id)
+                continue
+            batch.append((report_id, items, inspections))
+            result['reports'] += 1
+            result['workItems'] += len(items)
+            result['inspections'] += len(inspections)
+            if len(batch) >= batch_size:
+                _load_batch(conn, batch, now)
+                batch = []
+        if batch:
+            _load_batch(conn, batch, now)
+    finally:
+        with conn:
+            for sql in dropped:
+                conn.execute(sql)
+        if own_conn:
+            conn.close()
+    return result
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {'--project': None, '--from': None}
+    report_ids = []
+    while args:
+        arg = args.pop(0)
+        if arg in options and args:
+            options[arg] = args.pop(0)
+        elif arg not in ('--drop-indexes', '--keep-indexes'):
+            report_ids.append(arg)
+    drop_indexes = None
+    if '--drop-indexes' in sys.argv:
+        drop_indexes = True
+    elif '--keep-indexes' in sys.argv:
+        drop_indexes = False
+
+    start = time.perf_counter()
+    result = reimport(report_ids or None, options['--project'], options['--from'],
+                      drop_indexes=drop_indexes)
+    print(f"Rebuilt {result['reports']} report(s): {result['workItems']} work items, "
+          f"{result['inspections']} inspections in {time.perf_counter() - start:.1f}s")
+    if result['failed']:
+        print(f"Could not parse rawExtraction of: {', '.join(result['failed'])}")
@@ -3,13 +3,14 @@ Calculate V3 Progress for Apartments 7 and 11
 Compares V2 vs V3 logic to show the impact of aligned defect detection
 """
 
-import sqlite3
+import numpy as np
 import pandas as pd
 from collections import defaultdict
 
-# Connect to DB
-db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-conn = sqlite3.connect(db_path)
+import report_sequence
+from explore_db import STATUS_MAP, check_unambiguous, get_db_connection
+from memo import memoize
+from report_sequence import get_apartment_reports, load_items
 
 # Category weights (from progress-calculator-v2.ts)
 CATEGORY_WEIGHTS = {
@@ -38,8 +39,12 @@ PROGRESS_THRESHOLDS = {
     'NOT_STARTED': 5,
     'UNKNOWN': 15,
     'CATEGORY_GRADUATED': 90,
+    'ITEM_FIXED': 90,
 }
 
+# An item is the same item across reports when these match (as in the dashboard)
+ITEM_KEY = ['apartmentId', 'category', 'description']
+
 # Negative keywords (from status-mapper.ts)
 NEGATIVE_KEYWORDS = [
     'אי תיאומים', 'אי תאומים', 'נמצאו אי', 'קיימים אי',
@@ -53,7 +58,7 @@ NEGATIVE_KEYWORDS = [
 
 def has_negative_notes_v2(notes):
     """V2 logic - check if notes contain negative keywords"""
-    if not notes:
+    if not isinstance(notes, str) or not notes:
         return False
     notes_lower = notes.lower()
     return any(keyword.lower() in notes_lower for keyword in NEGATIVE_KEYWORDS)
@@ -142,24 +147,121 @@ def calculate_item_progress_v3(status, notes, is_first_time=False):
     else:
         return PROGRESS_THRESHOLDS['UNKNOWN']
 
-def calculate_apartment_progress(apt_num, version='v2'):
-    """Calculate overall progress for an apartment"""
-    print(f"\n{'='*80}")
-    print(f"Calculating {version.upper()} Progress for Apartment {apt_num}")
-    print(f"{'='*80}")
-    
-    # Get apartment ID first
-    query_apt = """
-    SELECT id FROM Apartment WHERE number = ?
+def load_item_history(conn, project_id=None, apartment_ids=None):
     """
-    apt_df = pd.read_sql_query(query_apt, conn, params=(str(apt_num),))
-    
-    if apt_df.empty:
-        print(f"Apartment {apt_num} not found")
-        return None
-    
-    apt_id = apt_df.iloc[0]['id']
-    
+    Every WorkItem of the apartments with its report's per-apartment seq
+    (0, 1, 2... by report date), sorted by apartment and seq.
+    """
+    reports = get_apartment_reports(conn, project_id, exclude_errors=False)
+    if apartment_ids is not None:
+        reports = reports[reports['apartmentId'].isin(apartment_ids)]
+    items = load_items(conn, reports, columns=('id', 'category', 'description', 'status', 'notes'))
+    items = items.merge(reports[['apartmentId', 'seq', 'reportDate']], on=['apartmentId', 'seq'])
+    return items.sort_values(['apartmentId', 'seq', 'id'], kind='stable').reset_index(drop=True)
+
+def score_item_history(items, version='v2'):
+    """
+    Scores every item ever seen by an apartment as of its latest report,
+    the way the apartment page of the dashboard does:
+
+    - an item in the latest report is scored from its status and notes,
+      and is_first_time is set when that report is the first to list it
+      (COMPLETED_OK_FIRST vs COMPLETED_OK_LATER);
+    - an item seen earlier but missing from the latest report is ITEM_FIXED.
+
+    items is the frame from load_item_history(). Returns one row per item
+    key with firstSeq, lastSeq, is_first_time, in_latest, has_defect and progress.
+    """
+    calc_func = calculate_item_progress_v2 if version == 'v2' else calculate_item_progress_v3
+    defect_func = has_defect_v2 if version == 'v2' else has_defect_v3
+
+    # A key listed twice in one report keeps its last row, like the dashboard's map
+    items = items.drop_duplicates(ITEM_KEY + ['seq'], keep='last')
+    grouped = items.groupby(ITEM_KEY, sort=False)
+    items = items.assign(
+        firstSeq=grouped['seq'].transform('first'),
+        is_first_time=grouped.cumcount() == 0,
+        latestSeq=items.groupby('apartmentId')['seq'].transform('max'),
+    )
+
+    latest = items.drop_duplicates(ITEM_KEY, keep='last').rename(columns={'seq': 'lastSeq'})
+    latest['in_latest'] = latest['lastSeq'] == latest['latestSeq']
+
+    # Score each distinct (status, notes, is_first_time) once and map it back
+    score_cols = ['status', 'notes', 'is_first_time']
+    codes = latest.groupby(score_cols, sort=False, dropna=False).ngroup().to_numpy()
+    combos = latest[score_cols].drop_duplicates().astype(object)
+    combos = combos.where(combos.notna(), None).itertuples(index=False)
+    scores = np.array([(calc_func(s, n, is_first_time=f), defect_func(s, n)) for s, n, f in combos])
+    scores = scores.reshape(-1, 2)
+
+    in_latest = latest['in_latest'].to_numpy()
+    latest['has_defect'] = in_latest & scores[codes, 1].astype(bool)
+    latest['progress'] = np.where(in_latest, scores[codes, 0], PROGRESS_THRESHOLDS['ITEM_FIXED']).astype(int)
+    return latest.drop(columns='latestSeq').reset_index(drop=True)
+
+def summarize_item_scores(scored):
+    """
+    Per-category and overall progress per apartment from score_item_history().
+
+    Category progress averages every item the category ever had, fixed ones
+    included, and the overall progress weighs every category the apartment
+    ever had. The dashboard scores a category seen before but without items
+    as CATEGORY_GRADUATED; since fixed items stay in their category's
+    average, that case reduces to a category of ITEM_FIXED items here.
+
+    Returns (categories, apartments) DataFrames.
+    """
+    keys = ['projectId', 'apartmentNumber', 'apartmentId']
+    categories = scored.assign(fixed=~scored['in_latest']).groupby(keys + ['category'], as_index=False).agg(
+        items=('progress', 'size'),
+        defects=('has_defect', 'sum'),
+        fixed=('fixed', 'sum'),
+        total_progress=('progress', 'sum'),
+    )
+    categories['progress'] = (categories['total_progress'] / categories['items']).round().astype(int)
+
+    categories['weight'] = categories['category'].map(CATEGORY_WEIGHTS).fillna(0.8)
+    categories['weighted'] = categories['progress'] * categories['weight']
+    grouped = categories.groupby(keys)
+    apartments = pd.DataFrame({
+        'overall': (grouped['weighted'].sum() / grouped['weight'].sum()).round().astype(int),
+        'defects': grouped['defects'].sum(),
+    }).reset_index()
+    return categories.drop(columns=['weight', 'weighted']), apartments
+
+@memoize(uses=[report_sequence, STATUS_MAP])
+def calculate_all_progress(version='v2', project_id=None, conn=None):
+    """
+    History-aware progress of every apartment at once, memoized (see memo.py).
+
+    Returns a DataFrame with one row per apartment: projectId,
+    apartmentNumber, apartmentId, latest_report_date, overall, defects and
+    by_category (category -> progress).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        items = load_item_history(conn, project_id)
+    finally:
+        if own_conn:
+            conn.close()
+    if items.empty:
+        return pd.DataFrame()
+
+    categories, apartments = summarize_item_scores(score_item_history(items, version))
+    latest_dates = items.groupby('apartmentId')['reportDate'].max()
+    apartments.insert(3, 'latest_report_date', apartments['apartmentId'].map(latest_dates))
+    by_category = {
+        apt_id: dict(zip(group['category'], group['progress'].tolist()))
+        for apt_id, group in categories.groupby('apartmentId')
+    }
+    apartments['by_category'] = apartments['apartmentId'].map(by_category)
+    return apartments
+
+def _score_latest_report(conn, apt_id, version):
+    """Per-category sums over the items of the apartment's latest report only"""
     # Get all work items for the latest report of this apartment
     # Group by report and get the most recent
     query = """
@@ -173,22 +275,16 @@ def calculate_apartment_progress(apt_num, version='v2'):
     all_items = pd.read_sql_query(query, conn, params=(apt_id,))
     
     if all_items.empty:
-        print(f"No work items found for Apartment {apt_num}")
         return None
     
     # Get the latest report date
     latest_date = all_items['reportDate'].max()
     items = all_items[all_items['reportDate'] == latest_date].copy()
     
-    print(f"\nLatest report date: {pd.to_datetime(latest_date, unit='ms').strftime('%Y-%m-%d')}")
-    print(f"Total items: {len(items)}")
-    
     # Calculate progress by category
-    category_progress = {}
     category_details = defaultdict(lambda: {'items': 0, 'defects_v2': 0, 'defects_v3': 0, 'total_progress': 0})
     
     calc_func = calculate_item_progress_v2 if version == 'v2' else calculate_item_progress_v3
-    defect_func = has_defect_v2 if version == 'v2' else has_defect_v3
     
     for _, item in items.iterrows():
         cat = item['category']
@@ -207,7 +303,107 @@ def calculate_apartment_progress(apt_num, version='v2'):
         elif version == 'v3' and has_defect_v3(status, notes):
             category_details[cat]['defects_v3'] += 1
     
+    return latest_date, len(items), category_details
+
+def _score_apartment_history(conn, apt_id, version):
+    """Per-category sums over every item the apartment ever had, see score_item_history()"""
+    items = load_item_history(conn, apartment_ids=[apt_id])
+    if items.empty:
+        return None
+
+    categories, _ = summarize_item_scores(score_item_history(items, version))
+    category_details = {
+        row.category: {
+            'items': int(row.items),
+            f'defects_{version}': int(row.defects),
+            'fixed': int(row.fixed),
+            'total_progress': int(row.total_progress),
+        }
+        for row in categories.itertuples(index=False)
+    }
+    return items['reportDate'].max(), int(categories['items'].sum()), category_details
+
+def calculate_apartment_progress(apt_num, version='v2', project_id=None, conn=None, verbose=True, history=True):
+    """
+    Calculate overall progress for an apartment.
+
+    Apartment numbers are only unique within a project, so pass project_id
+    whenever the DB holds more than one building.
+
+    With history=True (the dashboard's scoring) every item the apartment
+    ever had is scored, see score_item_history(). With history=False only
+    the items of the latest report are scored, all as later completions.
+
+    Results are memoized (see memo.py) until the DB or this module changes.
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+
+    log(f"\n{'='*80}")
+    log(f"Calculating {version.upper()} Progress for Apartment {apt_num}")
+    log(f"{'='*80}")
+
+    result, problem = _apartment_progress(apt_num, version, project_id, history, conn=conn)
+    if result is None:
+        log(problem)
+        return None
+
+    log(f"\nLatest report date: {pd.to_datetime(result['latest_report_date'], unit='ms').strftime('%Y-%m-%d')}")
+    log(f"Total items: {sum(details['items'] for details in result['details'].values())}")
+
+    # Print details
+    log(f"\n{'Category':<20} {'Items':<8} {'Defects':<10} {'Avg Progress':<15}")
+    log('-' * 80)
+    for cat in sorted(result['details'].keys()):
+        details = result['details'][cat]
+        defect_count = details.get(f'defects_{version}', 0)
+        avg_prog = result['by_category'].get(cat, 0)
+        log(f"{cat:<20} {details['items']:<8} {defect_count:<10} {avg_prog}%")
+
+    log(f"\n{'='*80}")
+    log(f"Overall Progress ({version.upper()}): {result['overall']}%")
+    log(f"{'='*80}")
+
+    return result
+
+@memoize(uses=[report_sequence, STATUS_MAP])
+def _apartment_progress(apt_num, version, project_id, history, conn=None):
+    """(result, None), or (None, why) when the apartment has nothing to score"""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        return _score_apartment(conn, apt_num, version, project_id, history)
+    finally:
+        if own_conn:
+            conn.close()
+
+def _score_apartment(conn, apt_num, version, project_id, history):
+    # Get apartment ID first
+    query_apt = """
+    SELECT id, projectId FROM Apartment WHERE number = ?
+    """
+    params = [str(apt_num)]
+    if project_id is not None:
+        query_apt += " AND projectId = ?"
+        params.append(project_id)
+    apt_df = pd.read_sql_query(query_apt, conn, params=params)
+    
+    if apt_df.empty:
+        return None, f"Apartment {apt_num} not found"
+    check_unambiguous(apt_num, apt_df['projectId'])
+    
+    apt_id = apt_df.iloc[0]['id']
+    
+    if history:
+        result = _score_apartment_history(conn, apt_id, version)
+    else:
+        result = _score_latest_report(conn, apt_id, version)
+    if result is None:
+        return None, f"No work items found for Apartment {apt_num}"
+    latest_date, _, category_details = result
+
     # Calculate average progress per category
+    category_progress = {}
     for cat, details in category_details.items():
         if details['items'] > 0:
             category_progress[cat] = round(details['total_progress'] / details['items'])
@@ -223,29 +419,19 @@ def calculate_apartment_progress(apt_num, version='v2'):
     
     overall_progress = round(weighted_sum / total_weight) if total_weight > 0 else 0
     
-    # Print details
-    print(f"\n{'Category':<20} {'Items':<8} {'Defects':<10} {'Avg Progress':<15}")
-    print('-' * 80)
-    for cat in sorted(category_details.keys()):
-        details = category_details[cat]
-        defect_count = details.get(f'defects_{version}', 0)
-        avg_prog = category_progress.get(cat, 0)
-        print(f"{cat:<20} {details['items']:<8} {defect_count:<10} {avg_prog}%")
-    
-    print(f"\n{'='*80}")
-    print(f"Overall Progress ({version.upper()}): {overall_progress}%")
-    print(f"{'='*80}")
-    
     return {
+        'apartment_id': apt_id,
+        'project_id': apt_df.iloc[0]['projectId'],
+        'latest_report_date': latest_date,
         'overall': overall_progress,
         'by_category': category_progress,
         'details': dict(category_details)
-    }
+    }, None
 
-def compare_versions(apt_num):
+def compare_versions(apt_num, project_id=None):
     """Compare V2 vs V3 for an apartment"""
-    v2_result = calculate_apartment_progress(apt_num, 'v2')
-    v3_result = calculate_apartment_progress(apt_num, 'v3')
+    v2_result = calculate_apartment_progress(apt_num, 'v2', project_id)
+    v3_result = calculate_apartment_progress(apt_num, 'v3', project_id)
     
     if v2_result and v3_result:
         print(f"\n{'='*80}")
@@ -278,5 +464,3 @@ if __name__ == "__main__":
     
     # Compare Apartment 11
     compare_versions('11')
-    
-    conn.close()
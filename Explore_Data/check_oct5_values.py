@@ -1,9 +1,10 @@
-import sqlite3
 import pandas as pd
 
+from explore_db import STATUS_MAP, get_db_connection
+from status_summary import status_counts
+
 # Connect to DB
-db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-conn = sqlite3.connect(db_path)
+conn = get_db_connection()
 
 # 1. Get all reports for Apt 7 in late 2025 to see dates
 query_dates = """
@@ -29,41 +30,18 @@ print(df_dates)
 
 # Let's calculate the values for *all* these reports so we can match what the user sees.
 
-query_data = """
-    SELECT 
-        r.reportDate,
-        wi.category,
-        wi.status,
-        wi.location,
-        wi.description
-    FROM WorkItem wi
-    JOIN Report r ON wi.reportId = r.id
-    JOIN Apartment a ON wi.apartmentId = a.id
-    WHERE a.number = '7' 
-    AND r.reportDate >= 1756684800000 -- Sept 1 2025
-    AND r.reportDate <= 1764547200000 -- Dec 1 2025
-    ORDER BY r.reportDate
-"""
-
-df = pd.read_sql_query(query_data, conn)
+# Counts per (report, category, status) for Apt 7 in the same window
+df = status_counts(conn, by=['reportDate', 'category', 'status'], apt_num='7',
+                   start_ms=1756684800000,  # Sept 1 2025
+                   end_ms=1764547200000)    # Dec 1 2025
 df['reportDate_dt'] = pd.to_datetime(df['reportDate'], unit='ms')
-
-# Status Map
-STATUS_MAP = {
-    'COMPLETED': 'OK',
-    'COMPLETED_OK': 'OK',
-    'DEFECT': 'DEFECT',
-    'NOT_OK': 'DEFECT',
-    'IN_PROGRESS': 'PENDING',
-    'PENDING': 'PENDING',
-}
 df['state'] = df['status'].map(STATUS_MAP).fillna('INFO')
 
 # Identify defects
-defects_only = df[df['state'] == 'DEFECT'].copy()
+defects_only = df[df['state'] == 'DEFECT']
 
 # Count per report
-counts = defects_only.groupby(['reportDate_dt', 'category']).size().reset_index(name='pending_defects')
+counts = defects_only.groupby(['reportDate_dt', 'category'])['count'].sum().reset_index(name='pending_defects')
 
 print("\n--- Defect Counts per Report (Chart Values) ---")
 print(counts.to_string())
@@ -0,0 +1,73 @@
+"""
+Start-up Budget Check
+Times the quick explore.py commands in fresh interpreters and fails when
+one is over its budget or imported a heavy module (pandas, numpy,
+matplotlib...). Run it after touching explore.py or a module a quick
+command imports; it exits with 1 on a failure, so it can gate a commit.
+
+Each command runs RUNS times and the median wall time is compared with its
+budget. The catalog lookup reads the DB set by CONSTRUCTOR_DB_PATH.
+
+Usage:
+    python check_startup.py
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+RUNS = 5
+
+# explore.py arguments -> budget in seconds
+BUDGETS = {
+    (): 0.3,
+    ('help', 'progress'): 0.3,
+    ('catalog', '2025-01-01'): 0.5,
+}
+
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'seaborn', 'IPython', 'ipywidgets', 'duckdb', 'pyarrow')
+
+# Runs explore.main and reports the heavy modules it loaded
+PROBE = """
+import contextlib, io, sys
+sys.path.insert(0, {here!r})
+import explore
+with contextlib.redirect_stdout(io.StringIO()):
+    explore.main({args!r})
+print(','.join(sorted({{m.split('.')[0] for m in sys.modules}} & set({heavy!r}))))
+"""
+
+
+def time_command(args):
+    """Median wall time of `python explore.py <args>` over RUNS runs."""
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(HERE, 'explore.py'), *args],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def heavy_imports(args):
+    probe = PROBE.format(here=HERE, args=list(args), heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True)
+    last_line = (result.stdout.strip().splitlines() or [''])[-1]
+    return [m for m in last_line.split(',') if m]
+
+
+if __name__ == "__main__":
+    failures = 0
+    for args, budget in BUDGETS.items():
+        label = ' '.join(('explore.py',) + args)
+        elapsed = time_command(args)
+        heavy = heavy_imports(args)
+        ok = elapsed <= budget and not heavy
+        failures += not ok
+        note = f"  imported {', '.join(heavy)}" if heavy else ""
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<35} {elapsed:.3f}s (budget {budget:.1f}s){note}")
+    sys.exit(1 if failures else 0)
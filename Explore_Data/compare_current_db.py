@@ -1,23 +1,12 @@
-import sqlite3
-import pandas as pd
+from explore_db import get_db_connection
+from status_summary import status_counts
 
 # Connect to DB
-db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-conn = sqlite3.connect(db_path)
-
-# Query to get status counts for Apt 7
-query = """
-    SELECT 
-        w.status,
-        COUNT(*) as count
-    FROM WorkItem w
-    JOIN Apartment a ON w.apartmentId = a.id
-    WHERE a.number = '7'
-    GROUP BY w.status
-"""
+conn = get_db_connection()
 
 try:
-    df = pd.read_sql_query(query, conn)
+    # Status counts for Apt 7 (WorkItemStatusSummary when installed, WorkItem otherwise)
+    df = status_counts(conn, by=['status'], apt_num='7')
     print("--- Current Database Values for Apartment 7 ---")
     print(df)
     
@@ -0,0 +1,136 @@
+"""
+Completion Trajectory Pipeline
+The analysis of notebook cells 11-13 (cumulative completed items per
+apartment and category over time) as pipeline stages:
+
+    work_items -> status_flags -> grouped -> cumulative -> charts
+
+work_items reads the DB and is keyed by db_token(), so every stage is
+reused until the DB or a stage's code changes. The cell*.py files ask the
+pipeline for the stage they show instead of reading notebook globals.
+
+Usage:
+    python completion_pipeline.py [stage] [--force]   # default: charts
+    python completion_pipeline.py status
+    python completion_pipeline.py clear
+"""
+
+import io
+import os
+import sys
+
+import pandas as pd
+
+from explore_db import db_token
+from pipeline import Pipeline
+from work_items import as_category, load_work_items
+
+# Statuses that count as completed, besides anything containing COMPLETED or DONE
+COMPLETED_STATUSES = ['COMPLETED', 'DONE', 'OK', 'בוצע', 'תקין', 'בוצע - תקין']
+
+SERIES_KEYS = ['projectId', 'apartment_number', 'category']
+
+CHART_DIR = 'chart_output'
+
+pipeline = Pipeline('completion')
+
+
+def is_done(status):
+    if not isinstance(status, str):
+        return 0
+    return 1 if status in COMPLETED_STATUSES or 'COMPLETED' in status.upper() or 'DONE' in status.upper() else 0
+
+
+@pipeline.stage(token=db_token, uses=[load_work_items, as_category])
+def work_items():
+    """Every apartment WorkItem with its report date."""
+    return load_work_items(drop_info=False)
+
+
+@pipeline.stage(inputs=['work_items'], uses=[is_done, COMPLETED_STATUSES])
+def status_flags(items):
+    """work_items plus is_completed (0/1), decided once per distinct status."""
+    flags = {status: is_done(status) for status in items['status'].cat.categories}
+    return items.assign(is_completed=items['status'].map(flags).astype('int64'))
+
+
+@pipeline.stage(inputs=['status_flags'], uses=[SERIES_KEYS])
+def grouped(items):
+    """Completed items per (project, apartment, category, report date)."""
+    return (
+        items.groupby(SERIES_KEYS + ['reportDate'], observed=True)['is_completed']
+        .sum().reset_index()
+        .sort_values(SERIES_KEYS + ['reportDate'])
+        .reset_index(drop=True)
+    )
+
+
+@pipeline.stage(inputs=['grouped'], uses=[SERIES_KEYS])
+def cumulative(counts):
+    """grouped plus the running total of completed items per series."""
+    return counts.assign(
+        cumulative_completed=counts.groupby(SERIES_KEYS, observed=True)['is_completed'].cumsum()
+    )
+
+
+@pipeline.stage(inputs=['cumulative'])
+def charts(df):
+    """One PNG (bytes) per (project, apartment): cumulative completed items per category."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    images = {}
+    for (project_id, apt_num), apt_data in df.groupby(['projectId', 'apartment_number'], observed=True):
+        fig, ax = plt.subplots(figsize=(12, 6))
+        for category, series in apt_data.groupby('category', observed=True):
+            ax.plot(series['reportDate'], series['cumulative_completed'], marker='o', label=str(category))
+        ax.set_title(f'Apartment {apt_num} - Completion Trajectory')
+        ax.set_xlabel('Date')
+        ax.set_ylabel('Items Completed (Cumulative)')
+        ax.tick_params(axis='x', rotation=45)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+        plt.close(fig)
+        images[(str(project_id), str(apt_num))] = buffer.getvalue()
+    return images
+
+
+def save_charts(images, output_dir=CHART_DIR):
+    """Writes the chart PNGs; file names carry the project when there is more than one."""
+    os.makedirs(output_dir, exist_ok=True)
+    multi_project = len({project_id for project_id, _ in images}) > 1
+    paths = []
+    for (project_id, apt_num), png in images.items():
+        prefix = f'{project_id}_apt_{apt_num}' if multi_project else f'apt_{apt_num}'
+        path = os.path.join(output_dir, f'{prefix}_completion.png')
+        with open(path, 'wb') as f:
+            f.write(png)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != '--force']
+    target = args[0] if args else 'charts'
+
+    if target == 'status':
+        for name, inputs, cached in pipeline.status():
+            print(f"{'cached' if cached else 'stale ':<7} {name:<13} <- {', '.join(inputs) or 'DB'}")
+    elif target == 'clear':
+        pipeline.clear()
+        print("Cache cleared.")
+    elif target not in pipeline.stages:
+        print(__doc__)
+        sys.exit(2)
+    else:
+        output = pipeline.run(target, force=[target] if '--force' in sys.argv else ())
+        if target == 'charts':
+            paths = save_charts(output)
+            print(f"Saved {len(paths)} charts to {os.path.abspath(CHART_DIR)}")
+        elif isinstance(output, pd.DataFrame):
+            print(output.to_string(index=False))
@@ -10,57 +10,38 @@ except ImportError:
 import matplotlib
 matplotlib.use('Agg')  # Non-interactive backend
 import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-import sqlite3
 import pandas as pd
 import os
-from datetime import datetime
 
-# Connect to DB
-db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-conn = sqlite3.connect(db_path)
+import aggregate_store
+import work_items
+from explore_db import STATUS_MAP, check_unambiguous, get_db_connection, get_projects
+from memo import memoize
+from work_items import load_work_items
 
-# STATUS MAPPING (Consistent with progress_analysis.py)
-STATUS_MAP = {
-    'COMPLETED': 'OK',
-    'COMPLETED_OK': 'OK',
-    'DEFECT': 'DEFECT',
-    'NOT_OK': 'DEFECT',
-    'IN_PROGRESS': 'PENDING',
-    'PENDING': 'PENDING',
-}
-
-def generate_defect_history_chart(apt_num):
-    print(f"Generating Defect Handling History for Apartment {apt_num}...")
-    
-    # 1. Data Extraction
-    query = f"""
-    SELECT 
-        r.reportDate,
-        a.number as apartment_number,
-        wi.category,
-        wi.status,
-        wi.location,
-        wi.description
-    FROM WorkItem wi
-    JOIN Report r ON wi.reportId = r.id
-    JOIN Apartment a ON wi.apartmentId = a.id
-    WHERE a.number = '{apt_num}'
-    AND (r.hasErrors = 0 OR r.hasErrors IS NULL)
-    ORDER BY r.reportDate ASC
+@memoize(uses=[work_items, aggregate_store, STATUS_MAP])
+def get_defect_history(apt_num, project_id=None, conn=None, aggregates=False):
     """
-    
-    df = pd.read_sql_query(query, conn)
+    Returns (df, df_history) for an apartment: the raw items with their mapped
+    state, and the pending DEFECT count per (reportDate, category).
+    Both frames are empty when the apartment has no data. Raises ValueError
+    when project_id is None and the number exists in more than one project.
+    aggregates=True reads df_history from aggregate_store.py (synced first);
+    df is then None, the store keeps no items.
+    Memoized (see memo.py) until the DB or this module changes.
+    """
+    if aggregates:
+        return None, aggregate_store.read_current(aggregate_store.read_defect_history, apt_num, project_id,
+                                                  conn=conn)
+
+    # 1. Data Extraction (state is mapped by the loader; INFO rows kept so every report date shows up)
+    df = load_work_items(conn, project_id=project_id, apt_num=apt_num, exclude_errors=True,
+                         extra_columns=['description'], drop_info=False)
     
     if df.empty:
-        print(f"No data found for Apartment {apt_num}")
-        return
-
-    df['reportDate'] = pd.to_datetime(df['reportDate'], unit='ms')
-
-    # 2. Categorize Status
-    df['state'] = df['status'].map(STATUS_MAP).fillna('INFO')
+        return df, pd.DataFrame(columns=['reportDate', 'category', 'pending_defects'])
+    if project_id is None:
+        check_unambiguous(apt_num, df['projectId'].unique())
     
     # Logic Update:
     # 1. User specified: "omitted from following report: i.e. also fixed"
@@ -69,27 +50,47 @@ def generate_defect_history_chart(apt_num):
     # 2. Uniqueness: Defects are distinct by (Category, Location, Description).
     #    Previous logic aggregated by (Category, Location) which collapsed multiple defects.
     
+    if 'General' not in df['location'].cat.categories:
+        df['location'] = df['location'].cat.add_categories(['General'])
     df['location'] = df['location'].fillna('General')
     df['description'] = df['description'].fillna('')
     
     # Identify defects in each report
     # We filter for items that are legally 'DEFECT' in that specific report.
-    defects_only = df[df['state'] == 'DEFECT'].copy()
+    defects_only = df[df['state'] == 'DEFECT']
     
     # Count defects per Report and Category
     # Group by reportDate and category
     # We assume items within a single report are unique by ID (database row).
     # But just in case of duplicates in the join/extract (unlikely), we count rows.
     
-    history_counts = defects_only.groupby(['reportDate', 'category']).size().reset_index(name='pending_defects')
+    history_counts = defects_only.groupby(['reportDate', 'category'], observed=True).size().reset_index(name='pending_defects')
+    history_counts['category'] = history_counts['category'].astype(str)
     
     # Ensure all report dates are represented for all categories (fill with 0 where 0 defects)
     report_dates = sorted(df['reportDate'].unique())
-    categories = sorted(df['category'].unique())
+    categories = sorted(df['category'].unique().astype(str))
     
     # Build complete index
     full_index = pd.MultiIndex.from_product([report_dates, categories], names=['reportDate', 'category'])
     df_history = history_counts.set_index(['reportDate', 'category']).reindex(full_index, fill_value=0).reset_index()
+    return df, df_history
+
+def generate_defect_history_chart(apt_num, project_id=None, streaming=False, aggregates=False):
+    print(f"Generating Defect Handling History for Apartment {apt_num}...")
+    
+    if streaming:
+        # Bounded memory: only the per-report counts are ever materialized
+        from streaming import stream_defect_history
+        df_history = stream_defect_history(apt_num, project_id)
+    else:
+        df, df_history = get_defect_history(apt_num, project_id, aggregates=aggregates)
+    
+    if df_history.empty:
+        print(f"No data found for Apartment {apt_num}")
+        return
+    
+    categories = sorted(df_history['category'].unique())
 
     # 3. Visualization
     plt.figure(figsize=(12, 6))
@@ -123,7 +124,9 @@ def generate_defect_history_chart(apt_num):
     # Save
     output_dir = 'chart_output'
     os.makedirs(output_dir, exist_ok=True)
-    filename = os.path.join(output_dir, f'defect_history_apt_{apt_num}.png')
+    # Apartment numbers repeat across projects, so scope the file name by project
+    prefix = f'defect_history_{project_id}_apt' if project_id is not None else 'defect_history_apt'
+    filename = os.path.join(output_dir, f'{prefix}_{apt_num}.png')
     plt.savefig(filename, dpi=150, bbox_inches='tight')
     plt.close()
     
@@ -140,18 +143,20 @@ def generate_defect_history_chart(apt_num):
         print("No defects found in Late 2025.")
 
 if __name__ == "__main__":
-    # Get all unique apartment numbers
-    query_apts = "SELECT DISTINCT number FROM Apartment ORDER BY number"
+    # Get all apartments, scoped by project
+    conn = get_db_connection()
+    query_apts = "SELECT projectId, number FROM Apartment ORDER BY projectId, number"
     df_apts = pd.read_sql_query(query_apts, conn)
+    multi_project = len(get_projects(conn)) > 1
+    conn.close()
     
     if not df_apts.empty:
         print(f"Found {len(df_apts)} apartments. Generating charts...")
-        for apt_num in df_apts['number']:
+        for project_id, apt_num in df_apts.itertuples(index=False):
             try:
-                generate_defect_history_chart(str(apt_num))
+                # The aggregate store answers each apartment without re-reading its history
+                generate_defect_history_chart(str(apt_num), project_id if multi_project else None, aggregates=True)
             except Exception as e:
                 print(f"Error generating chart for Apt {apt_num}: {e}")
     else:
         print("No apartments found in database.")
-        
-    conn.close()
@@ -0,0 +1,336 @@
+"""
+Defect Lifecycle
+Turns the report sequence into per-defect intervals instead of treating
+each report as an independent snapshot of DEFECT rows.
+
+A defect is identified by (apartment, category, description), the item key
+the dashboard uses. Per apartment, its reports (without errors) are
+numbered 0, 1, 2... (seq) by date. A defect present in consecutive reports
+is one interval; the first report it is missing from closes it:
+- fixed:   the item is still listed, no longer as DEFECT
+- omitted: the item is not listed at all (the "omitted means fixed" rule
+           defect_history_chart.py only applies implicitly)
+A later DEFECT for the same key opens a new interval (reopened).
+
+Intervals are found by sorting the (apartment, key, seq) defect rows and
+splitting them where the key changes or seq skips a report - a sorted
+merge of every report with the next one - plus one join with the items of
+the closing reports to tell fixed from omitted.
+
+The interval table lives in the analytics DB (DefectInterval) and is
+extended incrementally: update() only reads the reports that arrived after
+an apartment's last processed report and continues its open intervals. An
+apartment whose earlier reports changed (deleted, re-processed, a
+back-dated report) is rebuilt.
+
+Usage:
+    python defect_lifecycle.py update    # process new reports (default)
+    python defect_lifecycle.py rebuild   # rebuild all intervals
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from explore_db import attach_analytics_db, get_db_connection
+from report_sequence import (
+    LEDGER_COLUMNS, get_apartment_reports, insert_rows, ledger_schema, load_items, plan_update, records,
+)
+
+ITEM_KEY = ['apartmentId', 'category', 'description']
+
+INTERVAL_COLUMNS = ITEM_KEY + [
+    'episode', 'projectId', 'apartmentNumber', 'openedSeq', 'lastSeenSeq', 'closedSeq', 'closedBy',
+]
+
+SCHEMA = ledger_schema('DefectLifecycleReport') + """
+CREATE TABLE IF NOT EXISTS agg.DefectInterval (
+    apartmentId TEXT NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT NOT NULL,
+    episode INTEGER NOT NULL,
+    projectId TEXT NOT NULL,
+    apartmentNumber TEXT NOT NULL,
+    openedSeq INTEGER NOT NULL,
+    lastSeenSeq INTEGER NOT NULL,
+    closedSeq INTEGER,
+    closedBy TEXT,
+    PRIMARY KEY (apartmentId, category, description, episode)
+);
+"""
+
+def connect(db_path=None, analytics_db_path=None):
+    """
+    Opens dev.db with the analytics DB attached as `agg` and the schema in place.
+    """
+    conn = attach_analytics_db(get_db_connection(db_path), analytics_db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def build_intervals(defects, items, last_seq):
+    """
+    Splits DEFECT rows (ITEM_KEY + seq + projectId/apartmentNumber) into
+    intervals of consecutive reports.
+
+    items: every item (any state) of the reports that can close an interval,
+    used to tell fixed from omitted. last_seq: the latest seq per apartmentId;
+    intervals still present there stay open.
+    """
+    defects = defects.drop_duplicates(ITEM_KEY + ['seq'])
+    defects = defects.sort_values(ITEM_KEY + ['seq'], kind='mergesort').reset_index(drop=True)
+    if defects.empty:
+        return pd.DataFrame(columns=INTERVAL_COLUMNS)
+
+    # A run starts where the key changes or a report was skipped
+    keys = defects[ITEM_KEY]
+    starts = keys.ne(keys.shift()).any(axis=1) | defects['seq'].diff().ne(1)
+    runs = defects.groupby(starts.cumsum().to_numpy(), sort=False).agg(
+        apartmentId=('apartmentId', 'first'),
+        category=('category', 'first'),
+        description=('description', 'first'),
+        projectId=('projectId', 'first'),
+        apartmentNumber=('apartmentNumber', 'first'),
+        openedSeq=('seq', 'first'),
+        lastSeenSeq=('seq', 'last'),
+    ).reset_index(drop=True)
+    runs['episode'] = runs.groupby(ITEM_KEY, sort=False).cumcount()
+
+    next_seq = runs['lastSeenSeq'] + 1
+    closed = (next_seq <= runs['apartmentId'].map(last_seq)).to_numpy()
+    runs['closedSeq'] = next_seq.where(closed).astype('Int64')
+
+    listed = items[ITEM_KEY + ['seq']].drop_duplicates().assign(listed=True)
+    still_listed = (
+        runs[ITEM_KEY].assign(seq=next_seq)
+        .merge(listed, on=ITEM_KEY + ['seq'], how='left')['listed']
+        .notna().to_numpy()
+    )
+    runs['closedBy'] = np.where(closed, np.where(still_listed, 'fixed', 'omitted'), None)
+    return runs[INTERVAL_COLUMNS]
+
+
+def compute_intervals(conn=None, project_id=None):
+    """
+    Builds every interval from the full history, without the store.
+    Returns (intervals, reports) in the shape load_intervals() returns.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        reports = get_apartment_reports(conn, project_id)
+        items = load_items(conn, reports)
+    finally:
+        if own_conn:
+            conn.close()
+
+    intervals = build_intervals(
+        items[items['state'] == 'DEFECT'], items, reports.groupby('apartmentId')['seq'].max()
+    )
+    return _with_dates(intervals, reports), reports
+
+
+def update(conn, rebuild_all=False):
+    """
+    Brings DefectInterval up to date with dev.db. Returns (apartments
+    extended, apartments rebuilt).
+    """
+    if rebuild_all:
+        conn.execute("DELETE FROM agg.DefectInterval")
+        conn.execute("DELETE FROM agg.DefectLifecycleReport")
+
+    current = get_apartment_reports(conn)
+    stored = pd.read_sql_query("SELECT * FROM agg.DefectLifecycleReport", conn)
+    extended, rebuilt, work = plan_update(current, stored)
+
+    for apartment_id in rebuilt:
+        conn.execute("DELETE FROM agg.DefectInterval WHERE apartmentId = ?", (apartment_id,))
+        conn.execute("DELETE FROM agg.DefectLifecycleReport WHERE apartmentId = ?", (apartment_id,))
+
+    if work.empty:
+        conn.commit()
+        return extended, rebuilt
+
+    # Open intervals of extended apartments continue from their last seen report
+    existing = pd.read_sql_query("SELECT * FROM agg.DefectInterval", conn)
+    existing = existing[existing['apartmentId'].isin(extended)]
+    open_intervals = existing[existing['closedSeq'].isna()]
+
+    items = load_items(conn, work)
+    defects = pd.concat([
+        items.loc[items['state'] == 'DEFECT', ITEM_KEY + ['projectId', 'apartmentNumber', 'seq']],
+        open_intervals[ITEM_KEY + ['projectId', 'apartmentNumber']].assign(seq=open_intervals['lastSeenSeq']),
+    ], ignore_index=True)
+    runs = build_intervals(defects, items, current.groupby('apartmentId')['seq'].max())
+
+    # Runs starting at an open interval's last seen report continue it
+    continued = runs.merge(
+        open_intervals[ITEM_KEY + ['episode', 'openedSeq', 'lastSeenSeq']],
+        left_on=ITEM_KEY + ['openedSeq'], right_on=ITEM_KEY + ['lastSeenSeq'],
+        how='left', suffixes=('', '_open'),
+    )
+    is_continued = continued['episode_open'].notna().to_numpy()
+    conn.executemany("""
+        UPDATE agg.DefectInterval SET lastSeenSeq = ?, closedSeq = ?, closedBy = ?
+        WHERE apartmentId = ? AND category = ? AND description = ? AND episode = ?
+    """, records(
+        continued[is_continued].assign(episode=continued['episode_open']),
+        ['lastSeenSeq', 'closedSeq', 'closedBy'] + ITEM_KEY + ['episode'],
+    ))
+
+    # New runs are numbered after the key's earlier intervals
+    new_runs = runs[~is_continued]
+    offsets = (
+        existing.groupby(ITEM_KEY).size()
+        .sub(open_intervals.groupby(ITEM_KEY).size(), fill_value=0)
+        .rename('offset')
+    )
+    new_runs = new_runs.join(offsets, on=ITEM_KEY)
+    new_runs['episode'] = new_runs['episode'] + new_runs['offset'].fillna(0).astype(int)
+    insert_rows(conn, 'agg.DefectInterval', new_runs, INTERVAL_COLUMNS)
+    insert_rows(conn, 'agg.DefectLifecycleReport', work, LEDGER_COLUMNS)
+
+    conn.commit()
+    return extended, rebuilt
+
+
+def _with_dates(intervals, reports):
+    """
+    Adds openedDate, closedDate and days_open (to the closing report, or to
+    the apartment's latest report while still open).
+    """
+    dates = pd.to_datetime(reports.set_index(['apartmentId', 'seq'])['reportDate'], unit='ms')
+    latest = dates.groupby(level='apartmentId').max()
+
+    def at(seq):
+        index = pd.MultiIndex.from_arrays([intervals['apartmentId'], seq.fillna(-1).astype(int)])
+        return dates.reindex(index).to_numpy()
+
+    intervals = intervals.copy()
+    intervals['closedSeq'] = intervals['closedSeq'].astype('Int64')
+    intervals['openedDate'] = at(intervals['openedSeq'])
+    intervals['closedDate'] = at(intervals['closedSeq'])
+    end = intervals['closedDate'].fillna(intervals['apartmentId'].map(latest))
+    intervals['days_open'] = (end - intervals['openedDate']).dt.total_seconds() / 86400
+    return intervals
+
+
+def load_intervals(conn, project_id=None):
+    """
+    Reads the stored intervals. Returns (intervals, reports) like
+    compute_intervals().
+    """
+    reports = pd.read_sql_query("SELECT * FROM agg.DefectLifecycleReport", conn)
+    query = "SELECT * FROM agg.DefectInterval"
+    params = ()
+    if project_id is not None:
+        query += " WHERE projectId = ?"
+        params = (project_id,)
+    intervals = pd.read_sql_query(query, conn, params=params)
+    return _with_dates(intervals, reports), reports
+
+
+def event_counts(intervals, reports):
+    """
+    Lifecycle events per apartment report: opened, reopened, still_open,
+    fixed, omitted, and open_defects after the report.
+    """
+    opened = intervals.assign(
+        seq=intervals['openedSeq'],
+        event=np.where(intervals['episode'] == 0, 'opened', 'reopened'),
+    )
+    closed = intervals[intervals['closedSeq'].notna()]
+    closed = closed.assign(seq=closed['closedSeq'].astype(int), event=closed['closedBy'])
+    counts = (
+        pd.concat([opened, closed])[['apartmentId', 'seq', 'event']]
+        .groupby(['apartmentId', 'seq', 'event']).size()
+        .unstack('event', fill_value=0)
+        .reindex(columns=['opened', 'reopened', 'fixed', 'omitted'], fill_value=0)
+    )
+
+    # still_open: +1 from the report after opening, -1 after the last seen report
+    carried = intervals[intervals['lastSeenSeq'] > intervals['openedSeq']]
+    delta = pd.concat([
+        pd.Series(1, index=pd.MultiIndex.from_arrays([carried['apartmentId'], carried['openedSeq'] + 1])),
+        pd.Series(-1, index=pd.MultiIndex.from_arrays([carried['apartmentId'], carried['lastSeenSeq'] + 1])),
+    ]).groupby(level=[0, 1]).sum()
+
+    events = reports[['apartmentId', 'seq', 'reportId', 'reportDate']].sort_values(['apartmentId', 'seq'])
+    index = pd.MultiIndex.from_frame(events[['apartmentId', 'seq']])
+    events = events.join(counts.reindex(index, fill_value=0).reset_index(drop=True).set_index(events.index))
+    step = delta.reindex(index, fill_value=0).to_numpy()
+    events['still_open'] = pd.Series(step, index=events.index).groupby(events['apartmentId']).cumsum()
+    events['open_defects'] = events['opened'] + events['reopened'] + events['still_open']
+    events['reportDate'] = pd.to_datetime(events['reportDate'], unit='ms')
+    return events.reset_index(drop=True)
+
+
+def survival_curve(intervals, by=('category',)):
+    """
+    Kaplan-Meier curve of time-to-fix per group. Intervals still open are
+    censored at their current age. Returns by + days_open, closed, at_risk,
+    survival (share of defects still open after that many days).
+    """
+    by = list(by)
+    df = intervals.assign(closed=intervals['closedSeq'].notna())
+    curve = df.groupby(by + ['days_open']).agg(
+        closed=('closed', 'sum'),
+        removed=('closed', 'size'),
+    ).reset_index()
+    removed = curve.groupby(by)['removed']
+    curve['at_risk'] = removed.transform('sum') - removed.cumsum() + curve['removed']
+    curve['survival'] = (1 - curve['closed'] / curve['at_risk']).groupby([curve[c] for c in by]).cumprod()
+    return curve.drop(columns='removed')
+
+
+def time_to_fix_stats(intervals, by=('category',)):
+    """
+    Time-to-fix statistics per group: defects, closed, open, reopened,
+    mean days to fix (closed intervals), Kaplan-Meier median days to fix
+    (NaN while fewer than half are closed) and the age of the oldest open one.
+    """
+    by = list(by)
+    is_closed = intervals['closedSeq'].notna()
+    df = intervals.assign(
+        closed=is_closed,
+        reopened=intervals['episode'] > 0,
+        fix_days=intervals['days_open'].where(is_closed),
+        open_days=intervals['days_open'].where(~is_closed),
+    )
+    grouped = df.groupby(by)
+    stats = pd.DataFrame({
+        'defects': grouped.size(),
+        'closed': grouped['closed'].sum(),
+        'reopened': grouped['reopened'].sum(),
+        'mean_days_to_fix': grouped['fix_days'].mean().round(1),
+        'oldest_open_days': grouped['open_days'].max(),
+    })
+    stats.insert(2, 'open', stats['defects'] - stats['closed'])
+
+    curve = survival_curve(intervals, by)
+    stats['median_days_to_fix'] = curve[curve['survival'] <= 0.5].groupby(by)['days_open'].first()
+    return stats
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'update'
+    conn = connect()
+    try:
+        if command not in ('update', 'rebuild'):
+            print(__doc__)
+            sys.exit(2)
+        extended, rebuilt = update(conn, rebuild_all=(command == 'rebuild'))
+        print(f"Extended {len(extended)} apartments, rebuilt {len(rebuilt)}.")
+
+        intervals, _ = load_intervals(conn)
+        if intervals.empty:
+            print("No defects found.")
+        else:
+            print("\n--- Time to Fix by Category ---")
+            print(time_to_fix_stats(intervals, ['category']).to_string())
+            print("\n--- Time to Fix by Apartment ---")
+            print(time_to_fix_stats(intervals, ['projectId', 'apartmentNumber']).to_string())
+    finally:
+        conn.close()
@@ -0,0 +1,327 @@
+"""
+DuckDB Analytical Engine
+Runs the heavy Explore_Data aggregations (latest-state readiness, cumulative
+completion time series, unique descriptions per location) as SQL inside an
+in-process DuckDB, which executes them vectorized across all cores.
+
+Sources:
+- dev.db, attached read-only through DuckDB's sqlite extension (or copied
+  in through sqlite3 when the extension cannot be loaded)
+- a columnar extract: a directory of Parquet files written by export_columnar()
+
+Results come back as Arrow tables. When DuckDB is not installed, get_engine()
+returns a PandasEngine with the same methods that returns DataFrames instead.
+"""
+
+import os
+
+import pandas as pd
+
+from explore_db import STATUS_MAP, check_unambiguous, get_db_connection, read_db_path
+
+try:
+    import duckdb
+    HAS_DUCKDB = True
+except ImportError:
+    HAS_DUCKDB = False
+
+# Tables (and the columns of them) the aggregations need.
+# Dates and booleans are stored by Prisma as integers (ms since epoch / 0-1).
+SOURCE_COLUMNS = {
+    'Report': "id, projectId, CAST(reportDate AS BIGINT) AS reportDate, fileName, fileHash, "
+              "CAST(hasErrors AS INTEGER) AS hasErrors",
+    'Apartment': "id, projectId, number",
+    'WorkItem': "id, reportId, apartmentId, category, location, description, status",
+}
+
+# The same mapping as STATUS_MAP, expressed as SQL
+STATE_CASE = "CASE w.status " + " ".join(
+    f"WHEN '{status}' THEN '{state}'" for status, state in STATUS_MAP.items()
+) + " ELSE 'INFO' END"
+
+
+def _fetch_arrow(cursor):
+    # to_arrow_table() replaces fetch_arrow_table() in newer DuckDB releases
+    fetch = getattr(cursor, 'to_arrow_table', None) or cursor.fetch_arrow_table
+    return fetch()
+
+
+def _sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class DuckDBEngine:
+    """
+    Aggregations over dev.db (or a Parquet extract) executed by DuckDB.
+    """
+
+    def __init__(self, source=None, threads=None):
+        if not HAS_DUCKDB:
+            raise ImportError("duckdb is not installed; use get_engine() to fall back to pandas")
+
+        self.source = source or read_db_path()
+        self.con = duckdb.connect()
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+
+        if os.path.isdir(self.source):
+            self._load_parquet(self.source)
+        else:
+            self._attach_sqlite(self.source)
+
+    def _attach_sqlite(self, db_path):
+        try:
+            self.con.execute("INSTALL sqlite")
+            self.con.execute("LOAD sqlite")
+            # Read every column as text and cast in the views below:
+            # Prisma's DATETIME columns hold integers the scanner cannot parse
+            self.con.execute("SET sqlite_all_varchar = true")
+            self.con.execute("ATTACH ? AS dev (TYPE sqlite, READ_ONLY)", [db_path])
+            for table, columns in SOURCE_COLUMNS.items():
+                self.con.execute(f"CREATE VIEW {table} AS SELECT {columns} FROM dev.{table}")
+        except duckdb.Error:
+            # Extension unavailable (e.g. offline): copy the needed columns in through sqlite3
+            conn = get_db_connection(db_path)
+            try:
+                for table, columns in SOURCE_COLUMNS.items():
+                    raw_columns = ", ".join(
+                        c.split(" AS ")[-1].strip() for c in columns.split(", ")
+                    )
+                    df = pd.read_sql_query(f"SELECT {raw_columns} FROM {table}", conn)
+                    self.con.register(f"_raw_{table}", df)
+                    self.con.execute(f"CREATE VIEW {table} AS SELECT {columns} FROM _raw_{table}")
+            finally:
+                conn.close()
+
+    def _load_parquet(self, directory):
+        for table in SOURCE_COLUMNS:
+            path = os.path.join(directory, f"{table}.parquet")
+            self.con.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet({_sql_literal(path)})")
+
+    def export_columnar(self, out_dir):
+        """
+        Writes the source tables as Parquet files, usable as a later source.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        for table in SOURCE_COLUMNS:
+            path = os.path.join(out_dir, f"{table}.parquet")
+            self.con.execute(f"COPY (SELECT * FROM {table}) TO {_sql_literal(path)} (FORMAT parquet)")
+        return out_dir
+
+    def close(self):
+        self.con.close()
+
+    def _items_sql(self, project_id=None, exclude_errors=False):
+        where = ["w.apartmentId IS NOT NULL"]
+        params = []
+        if project_id is not None:
+            where.append("a.projectId = ?")
+            params.append(project_id)
+        if exclude_errors:
+            where.append("(r.hasErrors = 0 OR r.hasErrors IS NULL)")
+        sql = f"""
+            SELECT a.projectId, a.number AS apartmentNumber, w.id, w.category, w.location,
+                   w.description, w.status, {STATE_CASE} AS state, r.reportDate
+            FROM WorkItem w
+            JOIN Report r ON w.reportId = r.id
+            JOIN Apartment a ON w.apartmentId = a.id
+            WHERE {' AND '.join(where)}
+        """
+        return sql, params
+
+    def readiness(self, project_id=None):
+        """
+        Latest state per (apartment, category, location) counted per apartment,
+        with Health Score. Same numbers as progress_visualization.get_readiness_data.
+        """
+        items_sql, params = self._items_sql(project_id)
+        sql = f"""
+            WITH items AS ({items_sql}),
+            latest AS (
+                SELECT * FROM items WHERE state != 'INFO'
+                QUALIFY row_number() OVER (
+                    PARTITION BY projectId, apartmentNumber, category, location
+                    ORDER BY reportDate DESC, id DESC
+                ) = 1
+            )
+            SELECT projectId, apartmentNumber,
+                   count(*) FILTER (WHERE state = 'OK') AS OK,
+                   count(*) FILTER (WHERE state = 'DEFECT') AS DEFECT,
+                   count(*) FILTER (WHERE state = 'PENDING') AS PENDING,
+                   count(*) AS Total,
+                   round(100.0 * count(*) FILTER (WHERE state = 'OK') / count(*), 1) AS Health_Score
+            FROM latest
+            GROUP BY ALL
+            ORDER BY projectId, apartmentNumber
+        """
+        return _fetch_arrow(self.con.execute(sql, params))
+
+    def completion_timeseries(self, project_id=None):
+        """
+        Per-report OK/DEFECT/PENDING counts per (apartment, category) with
+        cumulative sums, total scope and completion_pct, as built in improved_charts.py.
+        """
+        items_sql, params = self._items_sql(project_id, exclude_errors=True)
+        sql = f"""
+            WITH items AS ({items_sql}),
+            counts AS (
+                SELECT projectId, apartmentNumber, category, reportDate,
+                       count(*) FILTER (WHERE state = 'OK') AS OK,
+                       count(*) FILTER (WHERE state = 'DEFECT') AS DEFECT,
+                       count(*) FILTER (WHERE state = 'PENDING') AS PENDING
+                FROM items
+                WHERE state != 'INFO'
+                GROUP BY ALL
+            ),
+            cumulative AS (
+                SELECT *,
+                       sum(OK) OVER w AS cumulative_ok,
+                       sum(DEFECT) OVER w AS cumulative_defect,
+                       sum(PENDING) OVER w AS cumulative_pending
+                FROM counts
+                WINDOW w AS (PARTITION BY projectId, apartmentNumber, category ORDER BY reportDate)
+            )
+            SELECT *,
+                   cumulative_ok + cumulative_defect + cumulative_pending AS cumulative_total,
+                   max(cumulative_ok + cumulative_defect + cumulative_pending)
+                       OVER (PARTITION BY projectId, apartmentNumber, category) AS total_scope,
+                   coalesce(100.0 * cumulative_ok / nullif(total_scope, 0), 0) AS completion_pct
+            FROM cumulative
+            ORDER BY projectId, apartmentNumber, category, reportDate
+        """
+        return _fetch_arrow(self.con.execute(sql, params))
+
+    def description_variants(self, apt_num, start_ms=None, end_ms=None, project_id=None):
+        """
+        Number of unique descriptions per (category, location) for an apartment,
+        optionally within a reportDate window (ms since epoch), as in debug_october_data.py.
+        Raises ValueError when project_id is None and the number exists in more than one project.
+        """
+        items_sql, params = self._items_sql(project_id)
+        if project_id is None:
+            projects = self.con.execute(
+                f"SELECT DISTINCT projectId FROM ({items_sql}) WHERE apartmentNumber = ?", params + [str(apt_num)]
+            ).fetchall()
+            check_unambiguous(apt_num, [row[0] for row in projects])
+        sql = f"""
+            SELECT category, location, count(DISTINCT description) AS descriptions
+            FROM ({items_sql})
+            WHERE apartmentNumber = ?
+              AND (? IS NULL OR reportDate >= ?)
+              AND (? IS NULL OR reportDate <= ?)
+            GROUP BY ALL
+            ORDER BY category, location
+        """
+        params = params + [str(apt_num), start_ms, start_ms, end_ms, end_ms]
+        return _fetch_arrow(self.con.execute(sql, params))
+
+
+class PandasEngine:
+    """
+    The same aggregations computed with pandas on top of sqlite3 reads.
+    Used when DuckDB is not installed.
+    """
+
+    def __init__(self, source=None):
+        self.source = source or read_db_path()
+
+    def close(self):
+        pass
+
+    def _items(self, project_id=None, exclude_errors=False):
+        query = """
+            SELECT a.projectId, a.number AS apartmentNumber, w.id, w.category, w.location,
+                   w.description, w.status, r.reportDate
+            FROM WorkItem w
+            JOIN Report r ON w.reportId = r.id
+            JOIN Apartment a ON w.apartmentId = a.id
+            WHERE w.apartmentId IS NOT NULL
+        """
+        params = []
+        if project_id is not None:
+            query += " AND a.projectId = ?"
+            params.append(project_id)
+        if exclude_errors:
+            query += " AND (r.hasErrors = 0 OR r.hasErrors IS NULL)"
+
+        conn = get_db_connection(self.source)
+        try:
+            df = pd.read_sql_query(query, conn, params=params)
+        finally:
+            conn.close()
+        df['state'] = df['status'].map(STATUS_MAP).fillna('INFO')
+        return df
+
+    def readiness(self, project_id=None):
+        df = self._items(project_id)
+        df = df[df['state'] != 'INFO'].sort_values(['reportDate', 'id'])
+        latest = df.drop_duplicates(subset=['projectId', 'apartmentNumber', 'category', 'location'], keep='last')
+
+        summary = latest.groupby(['projectId', 'apartmentNumber', 'state']).size().unstack(fill_value=0)
+        summary = summary.reindex(columns=['OK', 'DEFECT', 'PENDING'], fill_value=0)
+        summary['Total'] = summary.sum(axis=1)
+        summary['Health_Score'] = (summary['OK'] / summary['Total'] * 100).round(1)
+        summary.columns.name = None
+        return summary.reset_index()
+
+    def completion_timeseries(self, project_id=None):
+        keys = ['projectId', 'apartmentNumber', 'category']
+        df = self._items(project_id, exclude_errors=True)
+        df = df[df['state'] != 'INFO']
+
+        counts = df.groupby(keys + ['reportDate', 'state']).size().unstack(fill_value=0)
+        counts = counts.reindex(columns=['OK', 'DEFECT', 'PENDING'], fill_value=0)
+        counts.columns.name = None
+        counts = counts.reset_index().sort_values(keys + ['reportDate'])
+
+        grouped = counts.groupby(keys)
+        counts['cumulative_ok'] = grouped['OK'].cumsum()
+        counts['cumulative_defect'] = grouped['DEFECT'].cumsum()
+        counts['cumulative_pending'] = grouped['PENDING'].cumsum()
+        counts['cumulative_total'] = counts['cumulative_ok'] + counts['cumulative_defect'] + counts['cumulative_pending']
+        counts['total_scope'] = counts.groupby(keys)['cumulative_total'].transform('max')
+        counts['completion_pct'] = (counts['cumulative_ok'] / counts['total_scope'] * 100).fillna(0)
+        return counts.reset_index(drop=True)
+
+    def description_variants(self, apt_num, start_ms=None, end_ms=None, project_id=None):
+        df = self._items(project_id)
+        mask = df['apartmentNumber'] == str(apt_num)
+        check_unambiguous(apt_num, df.loc[mask, 'projectId'].unique())
+        if start_ms is not None:
+            mask &= df['reportDate'] >= start_ms
+        if end_ms is not None:
+            mask &= df['reportDate'] <= end_ms
+        grouped = df[mask].groupby(['category', 'location'], dropna=False)['description'].nunique()
+        return grouped.reset_index(name='descriptions')
+
+
+def get_engine(source=None, prefer_duckdb=True, threads=None):
+    """
+    Returns a DuckDBEngine when DuckDB is available, otherwise a PandasEngine.
+    """
+    if prefer_duckdb and HAS_DUCKDB:
+        return DuckDBEngine(source, threads=threads)
+    if source and os.path.isdir(source):
+        raise ImportError("Reading a Parquet extract requires duckdb")
+    return PandasEngine(source)
+
+
+def as_pandas(result):
+    """
+    Converts an engine result (Arrow table or DataFrame) to a DataFrame.
+    """
+    return result if isinstance(result, pd.DataFrame) else result.to_pandas()
+
+
+if __name__ == "__main__":
+    engine = get_engine()
+    print(f"Engine: {type(engine).__name__}")
+
+    print("\n--- Readiness by Apartment ---")
+    print(as_pandas(engine.readiness()).to_string(index=False))
+
+    timeseries = as_pandas(engine.completion_timeseries())
+    print(f"\n--- Completion Time Series ({len(timeseries)} rows) ---")
+    print(timeseries.tail(10).to_string(index=False))
+
+    engine.close()
@@ -1,23 +1,24 @@
-import sqlite3
 import pandas as pd
-import binascii
 import sys
 
+from explore_db import get_db_connection
+from report_catalog import get_catalog
+
 # Force UTF-8 encoding for stdout
 sys.stdout.reconfigure(encoding='utf-8')
 
 # Connect to DB
-db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-conn = sqlite3.connect(db_path)
+conn = get_db_connection()
 
 print("--- Dumping Hex of Descriptions for Sept 17 ---")
 query = """
     SELECT id, category, description, notes, status
     FROM WorkItem 
-    WHERE reportId=(SELECT id FROM Report WHERE reportDate=1758067200000) 
+    WHERE reportId IN ({})
     AND apartmentId=(SELECT id FROM Apartment WHERE number='7')
 """
-df = pd.read_sql_query(query, conn)
+report_ids = [r['id'] for r in get_catalog(conn).on_date('2025-09-17')]
+df = pd.read_sql_query(query.format(', '.join('?' * len(report_ids)) or 'NULL'), conn, params=report_ids)
 
 for index, row in df.iterrows():
     print(f"\nID: {row['id']}")
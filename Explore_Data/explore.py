@@ -0,0 +1,131 @@
+"""
+Explore CLI
+One entry point for the Explore_Data analyses.
+
+Modules are loaded inside the command that runs, never at start-up, so
+listing the commands or a quick lookup (catalog) does not pay for pandas,
+numpy or matplotlib. Commands backed by a script that has its own command
+line get the remaining arguments as their sys.argv.
+
+check_startup.py holds the start-up budget of the quick commands.
+
+Usage:
+    python explore.py                       # list the commands
+    python explore.py help <command>        # the docstring of its module
+    python explore.py <command> [args...]
+"""
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _readiness(args):
+    from explore_db import get_db_connection
+    from progress_visualization import get_readiness_data
+
+    project_id = args[0] if args else None
+    conn = get_db_connection()
+    try:
+        summary = get_readiness_data(project_id, conn=conn)
+    finally:
+        conn.close()
+    print("No work items found." if summary.empty else summary.to_string())
+
+
+def _progress(args):
+    from calculate_v3_progress import calculate_all_progress
+    from explore_db import get_db_connection
+
+    version = args[0] if args else 'v3'
+    project_id = args[1] if len(args) > 1 else None
+    conn = get_db_connection()
+    try:
+        result = calculate_all_progress(version, project_id, conn=conn)
+    finally:
+        conn.close()
+    if result.empty:
+        print("No apartments with reports found.")
+    else:
+        print(result.drop(columns=['by_category']).to_string(index=False))
+
+
+# name -> (module, handler or None, summary). Without a handler the
+# module runs as __main__ with the remaining arguments.
+COMMANDS = {
+    'readiness': ('progress_visualization', _readiness, "Readiness and health score per apartment [project_id]"),
+    'progress': ('calculate_v3_progress', _progress, "Progress per apartment [version] [project_id]"),
+    'defect-history': ('defect_history_chart', None, "Pending-defect chart of every apartment (PNG)"),
+    'charts': ('improved_charts', None, "Completion trajectory charts (PNG)"),
+    'completion': ('completion_pipeline', None, "Cached completion pipeline [stage|status|clear] [--force]"),
+    'serve': ('analytics_service', None, "Local analytics HTTP service [--host H] [--port N]"),
+    'replica': ('replica', None, "Analytics replica of dev.db [refresh|watch|status|drop]"),
+    'memo': ('memo', None, "Memoized analysis results on disk [stats|clear]"),
+    'forecast': ('forecast', None, "Handover date forecast [n_sims]"),
+    'portfolio': ('portfolio_runner', None, "Progress of every project in parallel [workers]"),
+    'transitions': ('transition_matrix', None, "Status transition matrix [category]"),
+    'lifecycle': ('defect_lifecycle', None, "Defect time-to-fix [update|rebuild]"),
+    'diff': ('report_diff', None, "Item changes between consecutive reports [update|rebuild] [apt]"),
+    'snapshots': ('snapshot_reader', None, "List, show or diff snapshots"),
+    'chain': ('snapshot_chain', None, "Snapshot delta chain: import, capture, list, progress"),
+    'catalog': ('report_catalog', None, "Reports of a date or a date range"),
+    'status': ('status_summary', None, "Status summary table [install|uninstall|check]"),
+    'aggregates': ('aggregate_store', None, "Aggregate store [sync|rebuild|verify]"),
+    'duckdb': ('duckdb_engine', None, "Readiness and time series on the DuckDB engine"),
+    'audit': ('audit_runner', None, "Every report check, run concurrently [--project ID] [--checks ...]"),
+    'reconcile': ('pdf_reconcile', None, "PDFs in data/pdfs vs Report rows [pdf_dir]"),
+    'pdf-text': ('pdf_text', None, "PDF text cache [pdf_dir | search <text>]"),
+    'extractions': ('extraction_store', None, "Compressed rawExtraction store [migrate|stats|show]"),
+    'renormalize': ('renormalize', None, "Statuses and categories re-derived from rawExtraction"),
+    'reimport': ('bulk_reimport', None, "Rebuild WorkItem / Inspection rows from rawExtraction"),
+    'scan': ('scan_global_fix', None, "COMPLETED items that mention a partial fix"),
+    'dump': ('dump_hex', None, "Descriptions of the Sept 17 items of apartment 7"),
+}
+
+
+def module_doc(module):
+    """A module's docstring, read from its source without importing it."""
+    import ast
+
+    with open(os.path.join(HERE, module + '.py'), encoding='utf-8') as f:
+        return ast.get_docstring(ast.parse(f.read())) or f"{module}.py has no docstring."
+
+
+def print_commands():
+    print(__doc__.strip())
+    print("\nCommands:")
+    width = max(len(name) for name in COMMANDS)
+    for name, (_, _, summary) in COMMANDS.items():
+        print(f"    {name:<{width}}  {summary}")
+
+
+def run(command, args):
+    module, handler, _ = COMMANDS[command]
+    if handler is not None:
+        handler(args)
+        return
+    import runpy
+
+    sys.argv = [os.path.join(HERE, module + '.py')] + list(args)
+    runpy.run_module(module, run_name='__main__', alter_sys=True)
+
+
+def main(argv):
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    if not argv or argv[0] in ('-h', '--help'):
+        print_commands()
+        return 0
+    if argv[0] == 'help' and len(argv) > 1 and argv[1] in COMMANDS:
+        print(module_doc(COMMANDS[argv[1]][0]))
+        return 0
+    if argv[0] not in COMMANDS:
+        print(f"Unknown command: {argv[0]} (run without arguments to list the commands)")
+        return 2
+    run(argv[0], argv[1:])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,141 @@
+"""
+Shared database access for the Explore_Data scripts and notebooks.
+
+Keeps the DB location, the status mapping and the project lookups in one
+place so every analysis talks to the same database the same way.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+# Hardcoded for reliability in this specific environment content.
+# Set CONSTRUCTOR_DB_PATH to point the scripts at another copy of the DB.
+DB_PATH = os.environ.get('CONSTRUCTOR_DB_PATH', r'c:\Users\yoel\constructor\prisma\dev.db')
+
+# Side database for derived tables (aggregates, diffs...). Kept out of dev.db
+# so Prisma migrations never see tables it does not own.
+ANALYTICS_DB_PATH = os.environ.get(
+    'CONSTRUCTOR_ANALYTICS_DB_PATH', os.path.join(os.path.dirname(DB_PATH), 'analytics.db')
+)
+
+# Consistent copy of dev.db for the analyses, made by replica.py. While it
+# exists, get_db_connection() reads it instead of the live DB; scripts that
+# write to dev.db use get_live_connection(). Set CONSTRUCTOR_USE_REPLICA=0
+# to read the live DB anyway.
+REPLICA_PATH = os.environ.get(
+    'CONSTRUCTOR_REPLICA_PATH', os.path.join(os.path.dirname(DB_PATH), 'replica.db')
+)
+USE_REPLICA = os.environ.get('CONSTRUCTOR_USE_REPLICA', '1') != '0'
+
+_staleness_reported = False
+
+# STATUS MAP
+STATUS_MAP = {
+    'COMPLETED': 'OK',
+    'COMPLETED_OK': 'OK',
+    'DEFECT': 'DEFECT',
+    'NOT_OK': 'DEFECT',
+    'IN_PROGRESS': 'PENDING',
+    'PENDING': 'PENDING',
+}
+
+
+def read_db_path():
+    """The DB the analyses read: the replica when there is one, else DB_PATH."""
+    if USE_REPLICA and os.path.exists(REPLICA_PATH):
+        return REPLICA_PATH
+    return DB_PATH
+
+
+def get_db_connection(db_path=None):
+    """
+    Connection for reading: db_path, else the replica (see read_db_path).
+    The first connection to a replica that is behind dev.db prints when it
+    was copied.
+    """
+    path = db_path or read_db_path()
+    conn = sqlite3.connect(path)
+    if path == REPLICA_PATH and not _staleness_reported:
+        _report_staleness(conn)
+    return conn
+
+
+def get_live_connection():
+    """Connection to the live dev.db, for the scripts that write to it."""
+    return sqlite3.connect(DB_PATH)
+
+
+def attach_analytics_db(conn, analytics_db_path=None):
+    """
+    Attaches the analytics side DB as `agg` and returns the connection.
+    """
+    conn.execute("ATTACH DATABASE ? AS agg", (analytics_db_path or ANALYTICS_DB_PATH,))
+    return conn
+
+
+def db_token(db_path=None):
+    """
+    Size and mtime of the DB file (default: the one the analyses read) and
+    its WAL: changes whenever the DB is written.
+    """
+    path = db_path or read_db_path()
+    stamp = []
+    for suffix in ('', '-wal'):
+        try:
+            st = os.stat(path + suffix)
+            stamp.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            stamp.append(None)
+    return [os.path.abspath(path), stamp]
+
+
+def _report_staleness(conn):
+    global _staleness_reported
+    _staleness_reported = True
+
+    try:
+        copied_at, source_token = conn.execute("SELECT copiedAt, sourceToken FROM ReplicaInfo").fetchone()
+    except (sqlite3.Error, TypeError):
+        return
+    if source_token != json.dumps(db_token(DB_PATH)):
+        copied = datetime.fromtimestamp(copied_at / 1000).strftime('%Y-%m-%d %H:%M')
+        print(f"Note: reading the replica copied at {copied}; dev.db changed since "
+              f"(python replica.py refresh)")
+
+
+def get_projects(conn):
+    """
+    Returns a list of (projectId, name) tuples, ordered by creation date.
+    """
+    cursor = conn.execute('SELECT id, name FROM Project ORDER BY createdAt, id')
+    return cursor.fetchall()
+
+
+def get_project_apartments(conn, project_id):
+    """
+    Returns the apartment numbers of a project, sorted numerically where possible.
+    Apartment numbers are only unique within a project ([projectId, number]).
+    """
+    cursor = conn.execute('SELECT number FROM Apartment WHERE projectId = ?', (project_id,))
+    numbers = [row[0] for row in cursor.fetchall()]
+    return sorted(numbers, key=lambda n: (0, int(n)) if str(n).isdigit() else (1, str(n)))
+
+
+def apartment_projects(conn, apt_num):
+    """Ids of the projects that have an apartment numbered apt_num."""
+    cursor = conn.execute('SELECT DISTINCT projectId FROM Apartment WHERE number = ?', (str(apt_num),))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def check_unambiguous(apt_num, project_ids):
+    """
+    Raises ValueError when apartment number apt_num was found in more than one
+    project, instead of silently merging their apartments.
+    """
+    project_ids = set(project_ids)
+    if len(project_ids) > 1:
+        raise ValueError(
+            f"Apartment {apt_num} exists in {len(project_ids)} projects; pass project_id to disambiguate"
+        )
@@ -0,0 +1,414 @@
+"""
+Extraction Store
+Compressed copies of the large Report text columns (rawExtraction,
+errorDetails, warningDetails) in the analytics DB, with lazy access from
+Python.
+
+migrate only adds copies: it is a read cache for the analysis scripts, and
+dev.db keeps every column, so it does not get any smaller. The storage
+change is the separate, opt-in prune step. Both work on the live dev.db,
+never on the replica (replica.py):
+- ReportBlob holds one compressed value per (reportId, field), tagged with
+  the Report.updatedAt it was taken from. A copy whose updatedAt no longer
+  matches is stale and is never returned.
+- Values are zstd-compressed with a dictionary trained per field on past
+  values (BlobDict), which is what makes many small, similar JSON
+  documents compress well. Without the zstandard package, zlib is used
+  instead; each row records its codec, so both can be read back.
+- LazyReport / load_reports() read Report metadata only; a big field is
+  read and decompressed the first time it is accessed. read_field() falls
+  back to the live column when the store has no fresh copy.
+- prune sets the columns that have a verified fresh copy to NULL in
+  dev.db and records them in PrunedField. From then on the store holds
+  the only copy, and it stays current until the app writes the column
+  again, whatever else changes in the report. Prune only once everything
+  that reads these columns goes through the store: read_field() here,
+  renormalize.py, bulk_reimport.py and audit_runner.py do; the app reads
+  Report.rawExtraction directly. dev.db gives the space back on its next
+  VACUUM.
+
+Usage:
+    python extraction_store.py migrate [--retrain]   # compress new / changed rows
+    python extraction_store.py stats
+    python extraction_store.py show <report_id> [field]
+    python extraction_store.py prune --yes           # NULL the migrated columns in dev.db
+"""
+
+import os
+import sys
+import time
+import zlib
+
+import pandas as pd
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+from explore_db import REPLICA_PATH, attach_analytics_db, get_db_connection, get_live_connection
+
+FIELDS = ('rawExtraction', 'errorDetails', 'warningDetails')
+
+METADATA_COLUMNS = [
+    'id', 'projectId', 'reportDate', 'fileName', 'filePath', 'fileHash', 'inspector',
+    'processed', 'hasErrors', 'hasWarnings', 'createdAt', 'updatedAt',
+]
+
+DICT_SIZE = 64 * 1024
+# Values sampled to train a dictionary; zstd needs a few dozen to train at all
+DICT_SAMPLES = 500
+MIN_DICT_SAMPLES = 32
+ZSTD_LEVEL = 9
+BATCH_SIZE = 200
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg.BlobDict (
+    id INTEGER PRIMARY KEY,
+    field TEXT NOT NULL,
+    data BLOB NOT NULL,
+    createdAt INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agg.ReportBlob (
+    reportId TEXT NOT NULL,
+    field TEXT NOT NULL,
+    updatedAt TEXT,
+    codec TEXT NOT NULL,
+    dictId INTEGER,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (reportId, field)
+);
+CREATE TABLE IF NOT EXISTS agg.PrunedField (
+    reportId TEXT NOT NULL,
+    field TEXT NOT NULL,
+    prunedAt INTEGER NOT NULL,
+    PRIMARY KEY (reportId, field)
+);
+"""
+
+# dictId -> zstandard.ZstdCompressionDict
+_dicts = {}
+
+
+def attach_store(conn):
+    """Attaches the analytics DB to conn, unless it already is, with the store tables in it."""
+    if 'agg' not in [row[1] for row in conn.execute("PRAGMA database_list")]:
+        attach_analytics_db(conn)
+    conn.executescript(STORE_SCHEMA)
+    return conn
+
+
+def connect():
+    return attach_store(get_db_connection())
+
+
+def _reads_replica(conn):
+    main = next(row[2] for row in conn.execute("PRAGMA database_list") if row[1] == 'main')
+    return bool(main) and os.path.exists(REPLICA_PATH) and os.path.samefile(main, REPLICA_PATH)
+
+
+def has_store(conn):
+    """True when `conn` has the analytics DB attached with the store tables in it."""
+    if 'agg' not in [row[1] for row in conn.execute("PRAGMA database_list")]:
+        return False
+    return conn.execute(
+        "SELECT 1 FROM agg.sqlite_master WHERE name = 'ReportBlob'"
+    ).fetchone() is not None
+
+
+def value_condition(conn, field, table='Report'):
+    """
+    SQL condition for the reports that have a value of `field`: in the
+    column, or pruned to the store when conn has it attached.
+    """
+    condition = f"{table}.{field} IS NOT NULL"
+    if has_store(conn):
+        condition = (f"({condition} OR {table}.id IN "
+                     f"(SELECT reportId FROM agg.PrunedField WHERE field = '{field}'))")
+    return condition
+
+
+def _fresh(field):
+    # A copy is current when taken at the report's updatedAt, or when it was
+    # pruned and the app has not written the column since
+    return f"(b.updatedAt IS r.updatedAt OR (p.reportId IS NOT NULL AND r.{field} IS NULL))"
+
+
+_FRESH_JOIN = """
+    JOIN Report r ON r.id = b.reportId
+    LEFT JOIN agg.PrunedField p ON p.reportId = b.reportId AND p.field = b.field
+"""
+
+
+def _get_dict(conn, dict_id):
+    if dict_id not in _dicts:
+        data = conn.execute("SELECT data FROM agg.BlobDict WHERE id = ?", (dict_id,)).fetchone()[0]
+        _dicts[dict_id] = zstandard.ZstdCompressionDict(data)
+    return _dicts[dict_id]
+
+
+def compress(conn, text, dict_id=None):
+    """(codec, data) for a text value."""
+    raw = text.encode('utf-8')
+    if not HAS_ZSTD:
+        return 'zlib', zlib.compress(raw, 9)
+    dict_data = _get_dict(conn, dict_id) if dict_id is not None else None
+    return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress(raw)
+
+
+def decompress(conn, codec, data, dict_id=None):
+    if codec == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+    if not HAS_ZSTD:
+        raise RuntimeError("zstandard not found. Install it with: pip install zstandard")
+    dict_data = _get_dict(conn, dict_id) if dict_id is not None else None
+    return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data).decode('utf-8')
+
+
+def train_dictionary(conn, field):
+    """
+    Trains a zstd dictionary on the latest values of `field` and stores it.
+    Returns its id, or None when zstd is missing or there are too few values.
+    """
+    if not HAS_ZSTD:
+        return None
+    samples = [
+        value.encode('utf-8') for (value,) in conn.execute(
+            f"SELECT {field} FROM Report WHERE {field} IS NOT NULL ORDER BY updatedAt DESC LIMIT ?",
+            (DICT_SAMPLES,),
+        )
+    ]
+    if len(samples) < MIN_DICT_SAMPLES:
+        return None
+    try:
+        trained = zstandard.train_dictionary(DICT_SIZE, samples)
+    except zstandard.ZstdError:
+        return None
+    cursor = conn.execute(
+        "INSERT INTO agg.BlobDict (field, data, createdAt) VALUES (?, ?, ?)",
+        (field, trained.as_bytes(), int(time.time() * 1000)),
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def current_dict(conn, field):
+    """Id of the latest dictionary of a field, or None."""
+    return conn.execute("SELECT MAX(id) FROM agg.BlobDict WHERE field = ?", (field,)).fetchone()[0]
+
+
+def migrate(conn=None, fields=FIELDS, retrain=False, batch_size=BATCH_SIZE):
+    """
+    Compresses the values of `fields` that have no fresh copy in the store,
+    and drops the copies of deleted reports or emptied fields. With
+    retrain, a new dictionary is trained and every row still in dev.db is
+    compressed again (pruned copies keep their dictionary).
+    Returns a DataFrame of field, stored, rawBytes, storedBytes per field.
+
+    Reads the live dev.db: a replica taken before a prune still has the
+    pruned columns, and would make their copies look obsolete.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = attach_store(get_live_connection())
+    elif _reads_replica(conn):
+        raise ValueError("migrate needs the live dev.db, not the replica (see get_live_connection)")
+    try:
+        conn.executescript(STORE_SCHEMA)
+        summary = []
+        for field in fields:
+            dict_id = current_dict(conn, field) if HAS_ZSTD else None
+            if HAS_ZSTD and (retrain or dict_id is None):
+                dict_id = train_dictionary(conn, field) or dict_id
+
+            # A pruned value is back in dev.db only once the app has written the
+            # column again; a NULL column (or one not read) keeps its copy
+            conn.execute(f"""
+                DELETE FROM agg.PrunedField WHERE field = ? AND (
+                    reportId IN (SELECT id FROM Report WHERE {field} IS NOT NULL)
+                    OR reportId NOT IN (SELECT id FROM Report)
+                )
+            """, (field,))
+            conn.execute(f"""
+                DELETE FROM agg.ReportBlob WHERE field = ?
+                  AND reportId NOT IN (SELECT reportId FROM agg.PrunedField WHERE field = ?)
+                  AND reportId NOT IN (SELECT id FROM Report WHERE {field} IS NOT NULL)
+            """, (field, field))
+            stale = f"""
+                SELECT r.id FROM Report r
+                LEFT JOIN agg.ReportBlob b ON b.reportId = r.id AND b.field = ?
+                WHERE r.{field} IS NOT NULL
+                  AND (b.reportId IS NULL OR b.updatedAt IS NOT r.updatedAt
+                       OR (? AND b.dictId IS NOT ?))
+            """
+            todo = [row[0] for row in conn.execute(stale, (field, retrain, dict_id))]
+
+            raw_bytes = stored_bytes = 0
+            for start in range(0, len(todo), batch_size):
+                batch = todo[start:start + batch_size]
+                rows = conn.execute(
+                    f"SELECT id, updatedAt, {field} FROM Report WHERE id IN ({', '.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                values = []
+                for report_id, updated_at, text in rows:
+                    codec, data = compress(conn, text, dict_id)
+                    used_dict = dict_id if codec == 'zstd' else None
+                    values.append((report_id, field, updated_at, codec, used_dict, len(text.encode('utf-8')), data))
+                    raw_bytes += values[-1][5]
+                    stored_bytes += len(data)
+                conn.executemany("""
+                    INSERT OR REPLACE INTO agg.ReportBlob (reportId, field, updatedAt, codec, dictId, size, data)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, values)
+                conn.commit()
+            conn.commit()
+            summary.append((field, len(todo), raw_bytes, stored_bytes))
+        return pd.DataFrame(summary, columns=['field', 'stored', 'rawBytes', 'storedBytes'])
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def read_field(conn, report_id, field):
+    """
+    A big field of a report: from the store when it holds a fresh copy,
+    else from the live column.
+    """
+    if field not in FIELDS:
+        raise ValueError(f"Unknown field {field}, expected one of {FIELDS}")
+    if has_store(conn):
+        row = conn.execute(f"""
+            SELECT b.codec, b.data, b.dictId FROM agg.ReportBlob b {_FRESH_JOIN}
+            WHERE b.reportId = ? AND b.field = ? AND {_fresh(field)}
+        """, (report_id, field)).fetchone()
+        if row is not None:
+            return decompress(conn, row[0], row[1], row[2])
+    row = conn.execute(f"SELECT {field} FROM Report WHERE id = ?", (report_id,)).fetchone()
+    return row[0] if row else None
+
+
+class LazyReport:
+    """
+    Report metadata, with rawExtraction / errorDetails / warningDetails read
+    and decompressed on first access. Valid while `conn` is open.
+    """
+
+    def __init__(self, conn, row):
+        self._conn = conn
+        self.__dict__.update(row)
+
+    def __getattr__(self, name):
+        if name not in FIELDS:
+            raise AttributeError(name)
+        value = read_field(self._conn, self.id, name)
+        self.__dict__[name] = value
+        return value
+
+    def __repr__(self):
+        return f"LazyReport({self.id!r}, {self.fileName!r})"
+
+
+def load_reports(conn, where=None, params=()):
+    """LazyReports for the Report rows matching an optional WHERE clause."""
+    query = f"SELECT {', '.join(METADATA_COLUMNS)} FROM Report"
+    if where:
+        query += f" WHERE {where}"
+    cursor = conn.execute(query + " ORDER BY reportDate, id", params)
+    columns = [d[0] for d in cursor.description]
+    return [LazyReport(conn, dict(zip(columns, row))) for row in cursor]
+
+
+def prune(conn=None, fields=FIELDS, batch_size=BATCH_SIZE):
+    """
+    Sets `fields` to NULL in dev.db for the reports whose store copy is
+    fresh and decompresses to the exact column value, and records them in
+    PrunedField. A report the app writes meanwhile is left alone. Returns a
+    DataFrame of field, pruned, rawBytes per field.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = attach_store(get_live_connection())
+    try:
+        summary = []
+        now = int(time.time() * 1000)
+        for field in fields:
+            todo = [row[0] for row in conn.execute(f"""
+                SELECT r.id FROM agg.ReportBlob b
+                JOIN Report r ON r.id = b.reportId AND r.updatedAt IS b.updatedAt
+                WHERE b.field = ? AND r.{field} IS NOT NULL
+            """, (field,))]
+
+            pruned = raw_bytes = 0
+            for start in range(0, len(todo), batch_size):
+                batch = todo[start:start + batch_size]
+                rows = conn.execute(f"""
+                    SELECT r.id, r.updatedAt, r.{field}, b.codec, b.data, b.dictId
+                    FROM Report r JOIN agg.ReportBlob b ON b.reportId = r.id AND b.field = ?
+                    WHERE r.id IN ({', '.join('?' * len(batch))})
+                """, [field] + batch).fetchall()
+                with conn:
+                    for report_id, updated_at, text, codec, data, dict_id in rows:
+                        if decompress(conn, codec, data, dict_id) != text:
+                            continue
+                        cursor = conn.execute(f"UPDATE Report SET {field} = NULL WHERE id = ? AND updatedAt IS ?",
+                                              (report_id, updated_at))
+                        if cursor.rowcount:
+                            conn.execute("INSERT OR REPLACE INTO agg.PrunedField VALUES (?, ?, ?)",
+                                         (report_id, field, now))
+                            pruned += 1
+                            raw_bytes += len(text.encode('utf-8'))
+            summary.append((field, pruned, raw_bytes))
+        return pd.DataFrame(summary, columns=['field', 'pruned', 'rawBytes'])
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def storage_stats(conn):
+    """
+    Per field: reports with a value, fresh copies, copies pruned from dev.db,
+    and the raw vs stored bytes of the copies.
+    """
+    stats = []
+    for field in FIELDS:
+        total = conn.execute(f"SELECT COUNT(*) FROM Report WHERE {value_condition(conn, field)}").fetchone()[0]
+        fresh, pruned, raw_bytes, stored_bytes = conn.execute(f"""
+            SELECT COUNT(*), COUNT(p.reportId), COALESCE(SUM(b.size), 0), COALESCE(SUM(length(b.data)), 0)
+            FROM agg.ReportBlob b {_FRESH_JOIN}
+            WHERE b.field = ? AND {_fresh(field)}
+        """, (field,)).fetchone()
+        stats.append((field, total, fresh, pruned, raw_bytes, stored_bytes,
+                      round(raw_bytes / stored_bytes, 1) if stored_bytes else None))
+    return pd.DataFrame(stats, columns=['field', 'reports', 'fresh', 'pruned', 'rawBytes', 'storedBytes', 'ratio'])
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    if command == 'prune':
+        if '--yes' not in sys.argv:
+            print("prune deletes the migrated columns from dev.db; the store then holds the only copy.")
+            print("Only run it once every reader of these columns, the app included, reads through")
+            print("the store. Run `python extraction_store.py migrate` first, then `prune --yes`.")
+            sys.exit(2)
+        print(prune().to_string(index=False))
+        print("Run VACUUM on dev.db (app stopped) to give the space back.")
+        sys.exit(0)
+
+    conn = attach_store(get_live_connection()) if command == 'migrate' else connect()
+    try:
+        if command == 'migrate':
+            if not HAS_ZSTD:
+                print("zstandard not found, compressing with zlib. Install it with: pip install zstandard")
+            print(migrate(conn, retrain='--retrain' in sys.argv).to_string(index=False))
+        elif command == 'show' and len(sys.argv) > 2:
+            field = sys.argv[3] if len(sys.argv) > 3 else 'rawExtraction'
+            print(read_field(conn, sys.argv[2], field))
+        elif command == 'stats':
+            print(storage_stats(conn).to_string(index=False))
+        else:
+            print(__doc__)
+    finally:
+        conn.close()
@@ -0,0 +1,177 @@
+"""
+Completion Date Forecast
+Monte-Carlo handover forecast per apartment, fitted on the report history.
+
+Model, per (apartment, category):
+- Two processes: PENDING items getting done and DEFECT items getting closed.
+  Their events are the net drops in the PENDING / DEFECT counts between
+  consecutive reports; exposure is the days between those reports.
+- Each process is a Poisson process with unknown rate. The rate gets a
+  Gamma posterior whose prior is the portfolio-wide rate of that category
+  (worth PRIOR_DAYS days of observation), so a category with little
+  history borrows from the other apartments instead of forecasting never.
+- A trajectory samples a rate from the posterior, then the time to close
+  the R remaining items, which for a Poisson process is Gamma(R, 1/rate).
+
+An apartment is handed over when every category has no pending items and
+no open defects, i.e. at the max over its categories and both processes.
+
+All trajectories are drawn as (series x n_sims) NumPy arrays and reduced
+per apartment with np.maximum.reduceat; there is no Python loop per
+trajectory or per apartment.
+
+Usage:
+    python forecast.py [n_sims]
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from explore_db import get_db_connection
+from work_items import load_work_items
+
+DEFAULT_SIMS = 10_000
+
+# Weight of the portfolio-wide category rate, in days of observation
+PRIOR_DAYS = 30.0
+
+# Forecasts further out than this are reported without a date
+MAX_HORIZON_DAYS = 3650
+
+QUANTILES = {'p50': 0.5, 'p90': 0.9}
+
+SERIES_KEYS = ['projectId', 'apartment_number', 'category']
+
+
+def get_state_counts(project_id=None, conn=None):
+    """
+    OK/DEFECT/PENDING item counts per (project, apartment, category, report),
+    the same per-report counts improved_charts.py builds before accumulating.
+    """
+    df = load_work_items(conn, project_id=project_id, exclude_errors=True)
+    counts = (
+        df.groupby(SERIES_KEYS + ['reportDate', 'state'], observed=True)
+        .size()
+        .unstack('state', fill_value=0)
+        .reindex(columns=['OK', 'DEFECT', 'PENDING'], fill_value=0)
+    )
+    counts.columns = counts.columns.astype(str)
+    counts = counts.reset_index()
+    for col in SERIES_KEYS:
+        counts[col] = counts[col].astype(str)
+    return counts.sort_values(SERIES_KEYS + ['reportDate']).reset_index(drop=True)
+
+
+def fit_rates(counts):
+    """
+    Per-series observations: closure events and exposure days for both
+    processes, plus the open items at the series' last report.
+    """
+    grouped = counts.groupby(SERIES_KEYS, sort=False)
+    counts = counts.assign(
+        days=grouped['reportDate'].diff().dt.total_seconds() / 86400,
+        completed=(-grouped['PENDING'].diff()).clip(lower=0),
+        closed=(-grouped['DEFECT'].diff()).clip(lower=0),
+    )
+    grouped = counts.groupby(SERIES_KEYS, sort=True)
+    series = pd.DataFrame({
+        'last_report': grouped['reportDate'].max(),
+        'pending': grouped['PENDING'].last(),
+        'defects': grouped['DEFECT'].last(),
+        'exposure_days': grouped['days'].sum(),
+        'completed': grouped['completed'].sum(),
+        'closed': grouped['closed'].sum(),
+    }).reset_index()
+
+    # Category-wide rates pooled over the portfolio act as the prior mean
+    pooled = series.groupby('category')[['completed', 'closed', 'exposure_days']].sum()
+    total_days = pooled['exposure_days'].sum()
+    for events, rate in (('completed', 'completion_rate'), ('closed', 'closure_rate')):
+        # Categories without any observed closures fall back to the global rate
+        global_rate = pooled[events].sum() / total_days if total_days > 0 else 0.0
+        prior_rate = (pooled[events] / pooled['exposure_days']).replace(np.inf, np.nan)
+        prior_rate = prior_rate.where(prior_rate > 0).fillna(global_rate)
+        prior = series['category'].map(prior_rate).to_numpy(dtype=float)
+
+        series[f'{rate}_alpha'] = prior * PRIOR_DAYS + series[events]
+        series[f'{rate}_beta'] = PRIOR_DAYS + series['exposure_days']
+    return series
+
+
+def _simulate_days(remaining, alpha, beta, n_sims, rng):
+    """
+    Days until `remaining` items are closed, shape (len(remaining), n_sims).
+    Series with nothing left take 0 days, series that never close take inf.
+    """
+    remaining = np.asarray(remaining, dtype=float)[:, None]
+    alpha = np.asarray(alpha, dtype=float)[:, None]
+    beta = np.asarray(beta, dtype=float)[:, None]
+    feasible = alpha > 0
+
+    rate = rng.gamma(np.where(feasible, alpha, 1.0), 1.0 / beta, size=(len(remaining), n_sims))
+    days = rng.gamma(np.maximum(remaining, 1.0), 1.0 / rate)
+    days = np.where(feasible, days, np.inf)
+    return np.where(remaining > 0, days, 0.0)
+
+
+def forecast_completion(project_id=None, n_sims=DEFAULT_SIMS, seed=None, conn=None):
+    """
+    P50/P90 handover dates per apartment.
+
+    Returns a DataFrame with projectId, apartmentNumber, last_report,
+    pending, defects, p50_days, p90_days, p50_date and p90_date. Dates are
+    NaT where no closures were ever observed for a category that still has
+    open items, or when the quantile lies beyond MAX_HORIZON_DAYS.
+    """
+    counts = get_state_counts(project_id, conn)
+    if counts.empty:
+        return pd.DataFrame()
+
+    series = fit_rates(counts)
+    rng = np.random.default_rng(seed)
+
+    pending_days = _simulate_days(series['pending'], series['completion_rate_alpha'],
+                                  series['completion_rate_beta'], n_sims, rng)
+    defect_days = _simulate_days(series['defects'], series['closure_rate_alpha'],
+                                 series['closure_rate_beta'], n_sims, rng)
+    # Each series starts counting at its own last report; align them on the
+    # apartment's latest report before taking the max
+    apartment_keys = ['projectId', 'apartment_number']
+    latest = series.groupby(apartment_keys)['last_report'].transform('max')
+    lag = ((latest - series['last_report']).dt.total_seconds() / 86400).to_numpy()[:, None]
+    series_days = np.maximum(np.maximum(pending_days, defect_days) - lag, 0.0)
+
+    # Rows are sorted by apartment, so each apartment is one contiguous block
+    starts = np.flatnonzero(~series.duplicated(apartment_keys).to_numpy())
+    apartment_days = np.maximum.reduceat(series_days, starts, axis=0)
+
+    apartments = series.groupby(apartment_keys, sort=True).agg(
+        last_report=('last_report', 'max'),
+        pending=('pending', 'sum'),
+        defects=('defects', 'sum'),
+    ).reset_index().rename(columns={'apartment_number': 'apartmentNumber'})
+
+    quantiles = np.quantile(apartment_days, list(QUANTILES.values()), axis=1, method='inverted_cdf')
+    for name, values in zip(QUANTILES, quantiles):
+        days = np.where(values <= MAX_HORIZON_DAYS, values, np.nan)
+        apartments[f'{name}_days'] = np.round(days, 1)
+        apartments[f'{name}_date'] = (apartments['last_report'] + pd.to_timedelta(days, unit='D')).dt.normalize()
+    return apartments
+
+
+if __name__ == "__main__":
+    n_sims = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIMS
+
+    conn = get_db_connection()
+    try:
+        result = forecast_completion(n_sims=n_sims, conn=conn)
+    finally:
+        conn.close()
+
+    if result.empty:
+        print("No work items found in database.")
+    else:
+        print(f"--- Handover Forecast ({n_sims} simulations per apartment) ---")
+        print(result.to_string(index=False))
@@ -4,117 +4,63 @@
 import matplotlib
 matplotlib.use('Agg')  # Non-interactive backend
 import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-import sqlite3
-import pandas as pd
 import os
 
-# Connect to DB
-db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-conn = sqlite3.connect(db_path)
-
-# STATUS MAPPING (from progress_analysis.py)
-STATUS_MAP = {
-    'COMPLETED': 'OK',
-    'COMPLETED_OK': 'OK',
-    'DEFECT': 'DEFECT',
-    'NOT_OK': 'DEFECT',
-    'IN_PROGRESS': 'PENDING',
-    'PENDING': 'PENDING',
-}
-
-# 1. Data Extraction
-query = """
-SELECT 
-    r.reportDate,
-    a.number as apartment_number,
-    wi.category,
-    wi.status,
-    wi.location,
-    wi.description
-FROM WorkItem wi
-JOIN Report r ON wi.reportId = r.id
-JOIN Apartment a ON wi.apartmentId = a.id
-WHERE wi.apartmentId IS NOT NULL
-AND (r.hasErrors = 0 OR r.hasErrors IS NULL)
-ORDER BY r.reportDate ASC
-"""
-
-df_progress = pd.read_sql_query(query, conn)
-df_progress['reportDate'] = pd.to_datetime(df_progress['reportDate'], unit='ms')
-
-# 2. Categorize Status
-df_progress['state'] = df_progress['status'].map(STATUS_MAP).fillna('INFO')
-df_progress = df_progress[df_progress['state'] != 'INFO'].copy()
-
-# 3. Implement Snapshot Logic (like defect_history_chart.py)
-# For each report date, we count items with their state AT THAT REPORT
-# Unique items are identified by (apartment, category, location, description)
-
-# Get all unique report dates per apartment
-report_dates = df_progress.groupby('apartment_number')['reportDate'].unique()
-
-# Build time series data using snapshot approach
-timeseries_data = []
-
-for apt_num in df_progress['apartment_number'].unique():
-    apt_data = df_progress[df_progress['apartment_number'] == apt_num]
-    dates = sorted(apt_data['reportDate'].unique())
-    
-    for report_date in dates:
-        # Get snapshot of items in this specific report
-        report_items = apt_data[apt_data['reportDate'] == report_date]
-        
-        # Count by category and state
-        for category in report_items['category'].unique():
-            cat_items = report_items[report_items['category'] == category]
-            
-            for state in ['OK', 'DEFECT', 'PENDING']:
-                count = len(cat_items[cat_items['state'] == state])
-                if count > 0:
-                    timeseries_data.append({
-                        'apartment_number': apt_num,
-                        'category': category,
-                        'reportDate': report_date,
-                        'state': state,
-                        'count': count
-                    })
-
-df_timeseries = pd.DataFrame(timeseries_data)
-
-# Pivot to get OK, DEFECT, PENDING columns
-if not df_timeseries.empty:
-    df_pivot = df_timeseries.pivot_table(
-        index=['apartment_number', 'category', 'reportDate'],
-        columns='state',
-        values='count',
-        fill_value=0
-    ).reset_index()
-else:
-    # Handle empty case
-    df_pivot = pd.DataFrame(columns=['apartment_number', 'category', 'reportDate', 'OK', 'DEFECT', 'PENDING'])
-
-# Ensure all state columns exist
-for state in ['OK', 'DEFECT', 'PENDING']:
-    if state not in df_pivot.columns:
-        df_pivot[state] = 0
-
-# Sort and calculate cumulative sums
-df_pivot = df_pivot.sort_values(['apartment_number', 'category', 'reportDate'])
-
-df_pivot['cumulative_ok'] = df_pivot.groupby(['apartment_number', 'category'])['OK'].transform(pd.Series.cumsum)
-df_pivot['cumulative_defect'] = df_pivot.groupby(['apartment_number', 'category'])['DEFECT'].transform(pd.Series.cumsum)
-df_pivot['cumulative_pending'] = df_pivot.groupby(['apartment_number', 'category'])['PENDING'].transform(pd.Series.cumsum)
-df_pivot['cumulative_total'] = df_pivot['cumulative_ok'] + df_pivot['cumulative_defect'] + df_pivot['cumulative_pending']
-
-# Calculate total scope per category (max items seen)
-df_scope = df_pivot.groupby(['apartment_number', 'category'])['cumulative_total'].max().reset_index()
-df_scope.columns = ['apartment_number', 'category', 'total_scope']
-
-# Merge scope back
-df_pivot = df_pivot.merge(df_scope, on=['apartment_number', 'category'])
-df_pivot['completion_pct'] = (df_pivot['cumulative_ok'] / df_pivot['total_scope'] * 100).fillna(0)
+import aggregate_store
+from explore_db import get_db_connection
+from work_items import load_work_items
+
+def build_completion_timeseries(conn=None, aggregates=False):
+    """
+    Per-report OK/DEFECT/PENDING counts per (project, apartment, category)
+    with cumulative sums, total scope and completion_pct (df_pivot).
+    aggregates=True reads the per-report counts kept by aggregate_store.py
+    (synced first) instead of the WorkItem history.
+    """
+    if aggregates:
+        return aggregate_store.read_current(aggregate_store.read_timeseries, conn=conn)
+
+    # 1. Data Extraction
+    # 2. Categorize Status
+    # The shared loader maps statuses to states (OK/DEFECT/PENDING), drops INFO
+    # rows and returns categorical columns; description is not needed here.
+    df_progress = load_work_items(conn, exclude_errors=True)
+
+    # 3. Implement Snapshot Logic (like defect_history_chart.py)
+    # For each report date, we count items with their state AT THAT REPORT
+    # Unique items are identified by (apartment, category, location, description)
+    # Apartment numbers repeat across projects, so the project is part of the key
+
+    # Count by (project, apartment, category, report) and state in one pass,
+    # with OK, DEFECT, PENDING as columns
+    df_pivot = (
+        df_progress
+        .groupby(['projectId', 'apartment_number', 'category', 'reportDate', 'state'], observed=True)
+        .size()
+        .unstack('state', fill_value=0)
+    )
+    df_pivot.columns = df_pivot.columns.astype(str)
+    df_pivot = df_pivot.reset_index()
+
+    # Ensure all state columns exist
+    for state in ['OK', 'DEFECT', 'PENDING']:
+        if state not in df_pivot.columns:
+            df_pivot[state] = 0
+
+    # Sort and calculate cumulative sums
+    series_keys = ['projectId', 'apartment_number', 'category']
+    df_pivot = df_pivot.sort_values(series_keys + ['reportDate'])
+
+    grouped = df_pivot.groupby(series_keys, observed=True)
+    df_pivot['cumulative_ok'] = grouped['OK'].cumsum()
+    df_pivot['cumulative_defect'] = grouped['DEFECT'].cumsum()
+    df_pivot['cumulative_pending'] = grouped['PENDING'].cumsum()
+    df_pivot['cumulative_total'] = df_pivot['cumulative_ok'] + df_pivot['cumulative_defect'] + df_pivot['cumulative_pending']
+
+    # Calculate total scope per category (max items seen)
+    df_pivot['total_scope'] = df_pivot.groupby(series_keys, observed=True)['cumulative_total'].transform('max')
+    df_pivot['completion_pct'] = (df_pivot['cumulative_ok'] / df_pivot['total_scope'] * 100).fillna(0)
+    return df_pivot
 
 # 5. Visualization Functions
 
@@ -185,31 +131,41 @@ def plot_percentage_chart(apt_num, df_data):
     return plt.gcf()
 
 # 6. Generate Charts for All Apartments
-apartments = sorted(df_pivot['apartment_number'].unique())
-
-# Create output directory
-output_dir = 'chart_output'
-os.makedirs(output_dir, exist_ok=True)
-
-print(f"Generating charts for {len(apartments)} apartments...")
-print(f"Saving charts to: {os.path.abspath(output_dir)}")
-
-for apt_num in apartments:
-    print(f"\n=== Apartment {apt_num} ===")
-    
-    # Multi-state chart
-    fig1 = plot_multistate_chart(apt_num, df_pivot)
-    filename1 = os.path.join(output_dir, f'apt_{apt_num}_multistate.png')
-    plt.savefig(filename1, dpi=150, bbox_inches='tight')
-    plt.close(fig1)
-    print(f"  ✓ Saved multi-state chart: {filename1}")
-    
-    # Percentage chart
-    fig2 = plot_percentage_chart(apt_num, df_pivot)
-    filename2 = os.path.join(output_dir, f'apt_{apt_num}_percentage.png')
-    plt.savefig(filename2, dpi=150, bbox_inches='tight')
-    plt.close(fig2)
-    print(f"  ✓ Saved percentage chart: {filename2}")
-
-conn.close()
-print(f"\n✅ Chart generation complete! All charts saved to: {os.path.abspath(output_dir)}")
+def generate_charts(df_pivot, output_dir='chart_output'):
+    # One group per (project, apartment); file names carry the project when there is more than one
+    apartment_groups = df_pivot.groupby(['projectId', 'apartment_number'], observed=True)
+    multi_project = df_pivot['projectId'].nunique() > 1
+
+    # Create output directory
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Generating charts for {apartment_groups.ngroups} apartments...")
+    print(f"Saving charts to: {os.path.abspath(output_dir)}")
+
+    for (project_id, apt_num), apt_pivot in apartment_groups:
+        print(f"\n=== Apartment {apt_num} ===")
+        prefix = f'{project_id}_apt_{apt_num}' if multi_project else f'apt_{apt_num}'
+
+        # Multi-state chart
+        fig1 = plot_multistate_chart(apt_num, apt_pivot)
+        filename1 = os.path.join(output_dir, f'{prefix}_multistate.png')
+        plt.savefig(filename1, dpi=150, bbox_inches='tight')
+        plt.close(fig1)
+        print(f"  ✓ Saved multi-state chart: {filename1}")
+
+        # Percentage chart
+        fig2 = plot_percentage_chart(apt_num, apt_pivot)
+        filename2 = os.path.join(output_dir, f'{prefix}_percentage.png')
+        plt.savefig(filename2, dpi=150, bbox_inches='tight')
+        plt.close(fig2)
+        print(f"  ✓ Saved percentage chart: {filename2}")
+
+    print(f"\n✅ Chart generation complete! All charts saved to: {os.path.abspath(output_dir)}")
+
+if __name__ == "__main__":
+    conn = get_db_connection()
+    try:
+        df_pivot = build_completion_timeseries(conn, aggregates=True)
+    finally:
+        conn.close()
+    generate_charts(df_pivot)
@@ -1,9 +1,10 @@
-import sqlite3
 import pandas as pd
 
+from explore_db import get_db_connection
+from status_summary import status_counts
+
 # Connect to DB
-db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-conn = sqlite3.connect(db_path)
+conn = get_db_connection()
 
 # Dates to check (approximate timestamps or strings)
 # User mentioned: 2025-10-21, 2025-11-06, 2025-11-19, 2025-12-03, 2025-12-23, 2026-01-11
@@ -21,19 +22,14 @@ reports = pd.read_sql_query(query_reports, conn)
 reports['reportDate_dt'] = pd.to_datetime(reports['reportDate'], unit='ms')
 print(reports[['reportDate_dt', 'fileName', 'id']])
 
-# Now for each report, count items and defects
+# Now for each report, count items and defects (one query for all reports)
 print("\n--- Item Counts per Report ---")
+counts = status_counts(conn, by=['reportId', 'status'], report_ids=reports['id'])
 for _, row in reports.iterrows():
     r_id = row['id']
     date_str = row['reportDate_dt'].strftime('%Y-%m-%d')
     
-    query_items = f"""
-        SELECT status, COUNT(*) as count
-        FROM WorkItem
-        WHERE reportId = '{r_id}'
-        GROUP BY status
-    """
-    items_df = pd.read_sql_query(query_items, conn)
+    items_df = counts[counts['reportId'] == r_id]
     
     total = items_df['count'].sum()
     defects = items_df[items_df['status'] == 'DEFECT']['count'].sum()
@@ -42,8 +38,8 @@ for _, row in reports.iterrows():
     if defects == 0 and total > 0:
         print(f"  [ZERO DEFECTS] Checking sample items...")
         # Get sample items
-        q_sample = f"SELECT category, description, status, notes FROM WorkItem WHERE reportId = '{r_id}' LIMIT 5"
-        sample = pd.read_sql_query(q_sample, conn)
+        q_sample = "SELECT category, description, status, notes FROM WorkItem WHERE reportId = ? LIMIT 5"
+        sample = pd.read_sql_query(q_sample, conn, params=(r_id,))
         for _, s_row in sample.iterrows():
             print(f"    - [{s_row['status']}] {s_row['description'][:50]}... (Notes: {s_row['notes']})")
 
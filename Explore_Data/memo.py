@@ -0,0 +1,260 @@
+"""
+Result Memoization
+@memoize caches what a heavy analysis function returns, in two tiers:
+- memory: an LRU of the last MEMORY_ENTRIES results per function, for
+  repeated calls within a notebook session,
+- disk: one pickle per result under CACHE_DIR, shared across sessions and
+  processes, evicted least recently used first once the cache exceeds
+  DISK_BYTES.
+
+The key covers the call's arguments (bound to their parameter names, with
+defaults applied), the source of the function's module and of what it
+declares in `uses` (other modules, helpers, constants), the DB file change token (size and mtime of the DB
+file and its WAL) and the progress-config version (a hash of
+data/progress-config.json). Any write to the DB, edit of the code or change
+of the config makes the next call recompute. Calls on an in-memory DB are
+never cached.
+
+Results come back as copies, so callers may mutate them. Hit and miss
+counts are kept per function: fn.cache_info(), or stats() for all.
+
+Set CONSTRUCTOR_MEMO_CACHE to move the disk tier and CONSTRUCTOR_PROGRESS_CONFIG
+to point at another progress config.
+
+Usage:
+    python memo.py stats     # disk usage per function
+    python memo.py clear
+"""
+
+import copy
+import functools
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+from explore_db import ANALYTICS_DB_PATH, db_token
+
+CACHE_DIR = os.environ.get(
+    'CONSTRUCTOR_MEMO_CACHE', os.path.join(os.path.dirname(ANALYTICS_DB_PATH), 'memo_cache')
+)
+CONFIG_PATH = os.environ.get(
+    'CONSTRUCTOR_PROGRESS_CONFIG',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'progress-config.json'),
+)
+
+MEMORY_ENTRIES = 32
+DISK_BYTES = 512 * 1024 * 1024
+
+_MISSING = object()
+
+# Every memoized function, for stats() and clear()
+_registry = []
+
+# path -> ((size, mtime), digest), so the config is only hashed when it changes
+_config_digest = {}
+
+
+def config_token(path=CONFIG_PATH):
+    """Hash of the progress config file, or None when there is none (defaults apply)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_size, st.st_mtime_ns)
+    cached = _config_digest.get(path)
+    if cached is None or cached[0] != stamp:
+        with open(path, 'rb') as f:
+            cached = (stamp, hashlib.sha256(f.read()).hexdigest())
+        _config_digest[path] = cached
+    return cached[1]
+
+
+def connection_token(conn):
+    """db_token() of the DB file behind a connection (read_db_path() for None), None for in-memory DBs."""
+    if conn is None:
+        return db_token()
+    for _, name, path in conn.execute("PRAGMA database_list").fetchall():
+        if name == 'main':
+            return db_token(path) if path else None
+    return None
+
+
+def _code_of(obj):
+    if inspect.ismodule(obj) or inspect.isfunction(obj) or inspect.isclass(obj):
+        return inspect.getsource(obj)
+    return repr(obj)
+
+
+def _source_digest(func, uses):
+    sources = [_code_of(obj) for obj in (sys.modules[func.__module__], *uses)]
+    return hashlib.sha256('\n'.join(sources).encode('utf-8')).hexdigest()
+
+
+class Memoized:
+    """A function wrapped by @memoize."""
+
+    def __init__(self, func, ignore, uses, maxsize, disk):
+        self.func = func
+        self.ignore = set(ignore)
+        self.uses = tuple(uses)
+        self.maxsize = maxsize
+        self.disk = disk
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.signature = inspect.signature(func)
+        self.cache_dir = os.path.join(CACHE_DIR, self.name)
+        self.memory = OrderedDict()
+        # Guards `memory`: results may be asked for from several threads
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = self.uncached = 0
+        self._code = None
+        functools.update_wrapper(self, func)
+
+    def key(self, args, kwargs):
+        """The cache key of a call, or None when the call cannot be cached."""
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        token = connection_token(bound.arguments.get('conn'))
+        if token is None:
+            return None
+        if self._code is None:
+            self._code = _source_digest(self.func, self.uses)
+        arguments = sorted((k, v) for k, v in bound.arguments.items() if k not in self.ignore)
+        parts = [self.name, self._code, repr(arguments), token, config_token()]
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+    def __call__(self, *args, **kwargs):
+        key = self.key(args, kwargs)
+        if key is None:
+            self.uncached += 1
+            return self.func(*args, **kwargs)
+
+        with self._lock:
+            value = self.memory.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.move_to_end(key)
+                self.hits += 1
+        if value is not _MISSING:
+            return copy.deepcopy(value)
+
+        path = os.path.join(self.cache_dir, key + '.pkl')
+        if self.disk and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                value = None
+            else:
+                os.utime(path)
+                self.disk_hits += 1
+                self._remember(key, value)
+                return copy.deepcopy(value)
+
+        self.misses += 1
+        value = self.func(*args, **kwargs)
+        self._remember(key, value)
+        if self.disk:
+            self._write(path, value)
+        return copy.deepcopy(value)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.maxsize:
+                self.memory.popitem(last=False)
+
+    def _write(self, path, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write then rename, so another process never reads a partial file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        evict_disk()
+
+    def cache_info(self):
+        return {
+            'function': self.name,
+            'hits': self.hits,
+            'diskHits': self.disk_hits,
+            'misses': self.misses,
+            'uncached': self.uncached,
+            'inMemory': len(self.memory),
+        }
+
+    def cache_clear(self):
+        self.memory.clear()
+        for path in glob.glob(os.path.join(self.cache_dir, '*.pkl')):
+            os.remove(path)
+
+    def __get__(self, instance, owner):
+        # Keeps working when the decorated function is a method
+        return self if instance is None else functools.partial(self, instance)
+
+
+def memoize(ignore=('conn',), uses=(), maxsize=MEMORY_ENTRIES, disk=True):
+    """
+    Caches a function's results. ignore: parameters left out of the key
+    (the connection is covered by its DB token; flags that only change what
+    is printed). uses: modules, functions or constants from other modules
+    the result depends on.
+    """
+    def wrap(func):
+        memoized = Memoized(func, ignore, uses, maxsize, disk)
+        _registry.append(memoized)
+        return memoized
+    return wrap
+
+
+def evict_disk(max_bytes=DISK_BYTES):
+    """Deletes the least recently used disk entries until the cache fits in max_bytes."""
+    entries = []
+    for path in glob.glob(os.path.join(CACHE_DIR, '*', '*.pkl')):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime_ns, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def stats():
+    """cache_info() of every memoized function imported in this session."""
+    return [memoized.cache_info() for memoized in _registry]
+
+
+def clear():
+    for memoized in _registry:
+        memoized.memory.clear()
+    for path in glob.glob(os.path.join(CACHE_DIR, '*', '*.pkl')):
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    if command == 'clear':
+        clear()
+        print("Memo cache cleared.")
+    elif command == 'stats':
+        total = 0
+        for folder in sorted(glob.glob(os.path.join(CACHE_DIR, '*'))):
+            sizes = [os.path.getsize(p) for p in glob.glob(os.path.join(folder, '*.pkl'))]
+            total += sum(sizes)
+            print(f"{os.path.basename(folder):<60} {len(sizes):>5} entries {sum(sizes) / 1024:>10.1f} KB")
+        print(f"Total: {total / 1024 / 1024:.1f} MB of {DISK_BYTES / 1024 / 1024:.0f} MB")
+    else:
+        print(__doc__)
+        sys.exit(2)
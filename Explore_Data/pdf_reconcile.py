@@ -0,0 +1,167 @@
+"""
+PDF Reconciliation
+Compares the PDFs in data/pdfs with the Report table by SHA-256, the same
+digest the upload route stores in Report.fileHash.
+
+Files are hashed with streamed reads in a thread pool (hashlib releases
+the GIL on large buffers), and the digests are cached in the analytics DB
+keyed by (path, size, mtime), so a re-run only hashes new or modified files.
+
+One pass produces:
+- new:        PDFs with no Report by file name or by hash (not uploaded yet)
+- missing:    Reports whose file is not in the folder
+- duplicate:  PDFs whose content is already stored under another file
+              name, or that have the same content as another PDF
+- mismatched: PDFs whose Report has the same file name but another hash
+              (the file changed after it was processed)
+- unprocessed: PDFs whose Report exists but is not processed
+
+Set CONSTRUCTOR_PDF_DIR to reconcile another folder.
+
+Usage:
+    python pdf_reconcile.py [pdf_dir]
+"""
+
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from explore_db import attach_analytics_db, get_db_connection
+from report_catalog import get_catalog
+
+PDF_DIR = os.environ.get(
+    'CONSTRUCTOR_PDF_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'pdfs'),
+)
+
+CHUNK_SIZE = 1024 * 1024
+
+DIGEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg.PdfDigest (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtimeNs INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+RESULT_COLUMNS = {
+    'new': ['fileName', 'sha256'],
+    'missing': ['reportId', 'fileName', 'filePath', 'processed'],
+    'duplicate': ['fileName', 'sha256', 'duplicateOf'],
+    'mismatched': ['fileName', 'reportId', 'sha256', 'fileHash'],
+    'unprocessed': ['fileName', 'reportId'],
+}
+
+
+def hash_file(path):
+    """Hex SHA-256 of a file, read in CHUNK_SIZE blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_pdfs(pdf_dir):
+    """(path, fileName, size, mtimeNs) of every PDF directly in pdf_dir."""
+    files = []
+    with os.scandir(pdf_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith('.pdf'):
+                st = entry.stat()
+                files.append((os.path.abspath(entry.path), entry.name, st.st_size, st.st_mtime_ns))
+    return files
+
+
+def hash_pdfs(conn, pdf_dir=PDF_DIR, max_workers=None):
+    """
+    DataFrame of path, fileName, size, mtimeNs and sha256 for the PDFs in
+    pdf_dir. Only files whose (size, mtime) differ from the cached digest
+    are read; `conn` must have the analytics DB attached as agg.
+    """
+    conn.executescript(DIGEST_SCHEMA)
+    files = pd.DataFrame(scan_pdfs(pdf_dir), columns=['path', 'fileName', 'size', 'mtimeNs'])
+    cached = pd.read_sql_query("SELECT path, size, mtimeNs, sha256 FROM agg.PdfDigest", conn)
+    cached = cached[cached['path'].str.startswith(os.path.abspath(pdf_dir) + os.sep)]
+
+    files = files.merge(cached, on=['path', 'size', 'mtimeNs'], how='left')
+    stale = files[files['sha256'].isna()]
+    if not stale.empty:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            digests = list(pool.map(hash_file, stale['path']))
+        files.loc[stale.index, 'sha256'] = digests
+        conn.executemany("""
+            INSERT INTO agg.PdfDigest (path, size, mtimeNs, sha256) VALUES (?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                size = excluded.size, mtimeNs = excluded.mtimeNs, sha256 = excluded.sha256
+        """, list(zip(stale['path'], stale['size'].astype(int).tolist(),
+                      stale['mtimeNs'].astype(int).tolist(), digests)))
+
+    gone = sorted(set(cached['path']) - set(files['path']))
+    conn.executemany("DELETE FROM agg.PdfDigest WHERE path = ?", [(p,) for p in gone])
+    conn.commit()
+    return files.sort_values('fileName').reset_index(drop=True)
+
+
+def reconcile(pdf_dir=PDF_DIR, conn=None, max_workers=None):
+    """
+    Hashes the PDFs and diffs them against the Report rows.
+    Returns a dict of DataFrames keyed by new, missing, duplicate, mismatched and unprocessed.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = attach_analytics_db(get_db_connection())
+    try:
+        files = hash_pdfs(conn, pdf_dir, max_workers)
+        reports = get_catalog(conn).rows
+    finally:
+        if own_conn:
+            conn.close()
+
+    by_name = {r['fileName']: r for r in reports}
+    by_hash = {}
+    for r in reports:
+        if r['fileHash']:
+            by_hash.setdefault(r['fileHash'], r)
+    first_file = {}
+
+    result = {name: [] for name in RESULT_COLUMNS}
+    for name, sha in zip(files['fileName'], files['sha256']):
+        report = by_name.get(name)
+        same_content = by_hash.get(sha)
+        if report is not None:
+            if report['fileHash'] and report['fileHash'] != sha:
+                result['mismatched'].append((name, report['id'], sha, report['fileHash']))
+            elif not report['processed']:
+                result['unprocessed'].append((name, report['id']))
+        elif same_content is not None:
+            result['duplicate'].append((name, sha, same_content['fileName']))
+        elif sha in first_file:
+            result['duplicate'].append((name, sha, first_file[sha]))
+        else:
+            result['new'].append((name, sha))
+        first_file.setdefault(sha, name)
+
+    on_disk = set(files['fileName'])
+    for r in reports:
+        if r['fileName'] not in on_disk:
+            result['missing'].append((r['id'], r['fileName'], r['filePath'], bool(r['processed'])))
+
+    return {name: pd.DataFrame(rows, columns=RESULT_COLUMNS[name]) for name, rows in result.items()}
+
+
+if __name__ == "__main__":
+    pdf_dir = sys.argv[1] if len(sys.argv) > 1 else PDF_DIR
+    if not os.path.isdir(pdf_dir):
+        print(f"PDF folder not found: {pdf_dir}")
+        sys.exit(1)
+
+    result = reconcile(pdf_dir)
+    for name, df in result.items():
+        print(f"\n--- {name} ({len(df)}) ---")
+        if not df.empty:
+            print(df.to_string(index=False))
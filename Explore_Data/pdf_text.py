@@ -0,0 +1,189 @@
+"""
+PDF Text Cache
+Extracts the text layer of every PDF in data/pdfs page by page with pypdf,
+in a process pool, and stores it in the analytics DB keyed by
+(fileHash, page). The key is the same SHA-256 as Report.fileHash, so the
+cache is content addressed: a renamed file is not extracted again, and
+cross-checks against WorkItem / rawExtraction can join on
+Report.fileHash without opening a PDF.
+
+Text is normalized before it is stored:
+- NFKC (folds presentation forms such as Hebrew ligatures),
+- bidi control characters removed,
+- lines stored in visual order (reversed Hebrew) are put back into
+  logical order. A line counts as visual when Hebrew final letters
+  (ך ם ן ף ץ) open its words more often than they close them; digit and
+  Latin runs keep their left-to-right order.
+
+Bump TEXT_VERSION when the normalization changes; pages stored under an
+older version are extracted again.
+
+Usage:
+    python pdf_text.py [pdf_dir]           # extract new PDFs
+    python pdf_text.py search <text>       # pages containing the text
+"""
+
+import os
+import re
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+try:
+    from pypdf import PdfReader
+    HAS_PYPDF = True
+except ImportError:
+    HAS_PYPDF = False
+
+from explore_db import attach_analytics_db, get_db_connection
+from pdf_reconcile import PDF_DIR, hash_pdfs
+
+TEXT_VERSION = 1
+
+TEXT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg.PdfPageText (
+    fileHash TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (fileHash, page)
+);
+CREATE TABLE IF NOT EXISTS agg.PdfTextFile (
+    fileHash TEXT PRIMARY KEY,
+    pages INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    error TEXT
+);
+"""
+
+BIDI_CONTROLS = re.compile('[\u200e\u200f\u202a-\u202e\u2066-\u2069]')
+HEBREW_FINALS = 'ךםןףץ'
+WORD = re.compile('[\u0590-\u05ff]+')
+# Runs that keep left-to-right order inside a reversed line
+LTR_RUN = re.compile(r'[0-9A-Za-z][0-9A-Za-z.,:/\-]*[0-9A-Za-z]|[0-9A-Za-z]')
+
+
+def is_visual_order(line):
+    """True when the Hebrew words of the line look reversed."""
+    opening = closing = 0
+    for word in WORD.findall(line):
+        if len(word) < 2:
+            continue
+        opening += word[0] in HEBREW_FINALS
+        closing += word[-1] in HEBREW_FINALS
+    return opening > closing
+
+
+def to_logical_order(line):
+    """Reverses a visual-order line, keeping digit/Latin runs left to right."""
+    reversed_line = line[::-1]
+    return LTR_RUN.sub(lambda m: m.group(0)[::-1], reversed_line)
+
+
+def normalize_text(text):
+    text = BIDI_CONTROLS.sub('', unicodedata.normalize('NFKC', text or ''))
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        lines.append(to_logical_order(line) if is_visual_order(line) else line)
+    return '\n'.join(lines)
+
+
+def extract_pages(path):
+    """
+    Normalized text of every page of a PDF. Runs in a worker process.
+    Returns (pages, error): a list of strings, and an error message when the file could not be read.
+    """
+    try:
+        reader = PdfReader(path)
+        return [normalize_text(page.extract_text()) for page in reader.pages], None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+
+def extract_pdfs(pdf_dir=PDF_DIR, conn=None, max_workers=None):
+    """
+    Extracts the PDFs of pdf_dir whose content is not in the cache yet.
+    Returns the number of files extracted.
+    """
+    if not HAS_PYPDF:
+        print("pypdf not found. Install it with: pip install pypdf")
+        return 0
+
+    own_conn = conn is None
+    if own_conn:
+        conn = attach_analytics_db(get_db_connection())
+    try:
+        conn.executescript(TEXT_SCHEMA)
+        files = hash_pdfs(conn, pdf_dir).drop_duplicates('sha256')
+        done = pd.read_sql_query(
+            "SELECT fileHash FROM agg.PdfTextFile WHERE version = ?", conn, params=(TEXT_VERSION,)
+        )
+        todo = files[~files['sha256'].isin(done['fileHash'])]
+        if todo.empty:
+            return 0
+
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            # Store each file as soon as its worker is done
+            for file_hash, (pages, error) in zip(todo['sha256'], pool.map(extract_pages, todo['path'])):
+                conn.execute("DELETE FROM agg.PdfPageText WHERE fileHash = ?", (file_hash,))
+                conn.executemany(
+                    "INSERT INTO agg.PdfPageText (fileHash, page, text) VALUES (?, ?, ?)",
+                    [(file_hash, page, text) for page, text in enumerate(pages, start=1)],
+                )
+                conn.execute("""
+                    INSERT OR REPLACE INTO agg.PdfTextFile (fileHash, pages, version, error)
+                    VALUES (?, ?, ?, ?)
+                """, (file_hash, len(pages), TEXT_VERSION, error))
+                conn.commit()
+        return len(todo)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def load_report_pages(conn, report_ids=None):
+    """
+    Cached page text of the reports: reportId, fileName, page, text.
+    Reports whose PDF was never extracted have no rows.
+    """
+    query = """
+        SELECT r.id as reportId, r.fileName, t.page, t.text
+        FROM Report r
+        JOIN agg.PdfPageText t ON t.fileHash = r.fileHash
+    """
+    params = []
+    if report_ids is not None:
+        query += f" WHERE r.id IN ({', '.join('?' * len(report_ids))})"
+        params = list(report_ids)
+    query += " ORDER BY r.reportDate, r.id, t.page"
+    return pd.read_sql_query(query, conn, params=params)
+
+
+def search_pages(conn, needle):
+    """Pages containing the (normalized) text, with the reports they belong to."""
+    return pd.read_sql_query("""
+        SELECT t.fileHash, t.page, r.id as reportId, r.fileName
+        FROM agg.PdfPageText t
+        LEFT JOIN Report r ON r.fileHash = t.fileHash
+        WHERE instr(t.text, ?) > 0
+        ORDER BY r.reportDate, t.page
+    """, conn, params=(normalize_text(needle),))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == 'search':
+        conn = attach_analytics_db(get_db_connection())
+        try:
+            conn.executescript(TEXT_SCHEMA)
+            print(search_pages(conn, ' '.join(sys.argv[2:])).to_string(index=False))
+        finally:
+            conn.close()
+    else:
+        pdf_dir = sys.argv[1] if len(sys.argv) > 1 else PDF_DIR
+        if not os.path.isdir(pdf_dir):
+            print(f"PDF folder not found: {pdf_dir}")
+            sys.exit(1)
+        count = extract_pdfs(pdf_dir)
+        print(f"Extracted {count} PDF(s).")
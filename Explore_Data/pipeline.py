@@ -0,0 +1,151 @@
+"""
+Stage Pipeline
+A small framework for analyses built as a chain of stages, each declaring
+the stages it reads. Every stage output is cached on disk (and in memory
+for the session), keyed by a hash of:
+- the stage's code: its source, the source (or repr, for constants) of
+  the helpers it declares in `uses`, and a version number to bump for
+  anything else,
+- the keys of its inputs,
+- for source stages, a token of the data they read (explore_db.db_token()
+  for the DB).
+
+Asking for a stage re-runs only the stages whose key changed; everything
+else is loaded from the cache. The same cache serves the CLI and
+notebooks, so a notebook cell can ask for any stage in any order.
+
+Outputs are pickled; a stage should return plain data (DataFrames, dicts,
+bytes), not open connections or figures. An output is shared by every
+caller in the session: derive new frames from it instead of mutating it.
+
+Set CONSTRUCTOR_PIPELINE_CACHE to move the cache.
+"""
+
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+import time
+
+from explore_db import ANALYTICS_DB_PATH
+
+CACHE_DIR = os.environ.get(
+    'CONSTRUCTOR_PIPELINE_CACHE', os.path.join(os.path.dirname(ANALYTICS_DB_PATH), 'pipeline_cache')
+)
+
+
+def _code_of(obj):
+    if inspect.isfunction(obj) or inspect.isclass(obj):
+        return inspect.getsource(obj)
+    return repr(obj)
+
+
+class Stage:
+    def __init__(self, name, func, inputs, version, token, uses):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.version = version
+        self.token = token
+        code = '\n'.join(_code_of(obj) for obj in (func, *uses))
+        self.code = hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+class Pipeline:
+    """
+    Stages registered with @pipeline.stage(...). A stage function takes the
+    outputs of its inputs as positional arguments, in the declared order.
+    """
+
+    def __init__(self, name, cache_dir=None, verbose=True):
+        self.name = name
+        self.cache_dir = os.path.join(cache_dir or CACHE_DIR, name)
+        self.verbose = verbose
+        self.stages = {}
+        # stage name -> (key, output) for this session
+        self._memory = {}
+
+    def stage(self, inputs=(), version=1, token=None, uses=()):
+        """
+        Registers the decorated function as a stage named after it.
+        token: callable returning a value that changes with the data a
+        source stage reads. uses: helpers and constants the stage depends on.
+        """
+        def register(func):
+            missing = [name for name in inputs if name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {func.__name__} reads unknown stages: {', '.join(missing)}")
+            self.stages[func.__name__] = Stage(func.__name__, func, inputs, version, token, uses)
+            return func
+        return register
+
+    def key(self, name):
+        """The cache key of a stage, from its code, its token and its inputs' keys."""
+        stage = self.stages[name]
+        parts = [name, stage.code, stage.version,
+                 stage.token() if stage.token else None,
+                 [self.key(upstream) for upstream in stage.inputs]]
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key[:16]}.pkl")
+
+    def _log(self, message):
+        if self.verbose:
+            print(f"[{self.name}] {message}")
+
+    def run(self, name, force=()):
+        """
+        The output of a stage, from the cache when its key is unchanged.
+        force: stage names (or True for all) to re-run even when cached.
+        """
+        if name not in self.stages:
+            raise KeyError(f"Unknown stage {name} (stages: {', '.join(self.stages)})")
+        forced = force is True or name in force
+        key = self.key(name)
+
+        if not forced:
+            cached = self._memory.get(name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            path = self._path(name, key)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    output = pickle.load(f)
+                self._memory[name] = (key, output)
+                self._log(f"{name}: cached")
+                return output
+
+        stage = self.stages[name]
+        args = [self.run(upstream, force) for upstream in stage.inputs]
+        start = time.perf_counter()
+        output = stage.func(*args)
+        self._log(f"{name}: ran in {time.perf_counter() - start:.2f}s")
+        self._store(name, key, output)
+        return output
+
+    def _store(self, name, key, output):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(name, key)
+        # Write then rename, so a reader never sees a partial file
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+        for old in glob.glob(os.path.join(self.cache_dir, f"{name}-*.pkl")):
+            if old != path:
+                os.remove(old)
+        self._memory[name] = (key, output)
+
+    def status(self):
+        """(stage, inputs, cached) for every stage, in registration order."""
+        return [
+            (name, stage.inputs, os.path.exists(self._path(name, self.key(name))))
+            for name, stage in self.stages.items()
+        ]
+
+    def clear(self):
+        """Drops every cached output of the pipeline."""
+        self._memory.clear()
+        for path in glob.glob(os.path.join(self.cache_dir, '*.pkl')):
+            os.remove(path)
@@ -0,0 +1,131 @@
+"""
+Portfolio Runner
+Partitions the analyses by projectId and runs each project's readiness,
+progress and defect computations in its own worker process, then merges
+the per-project results into a portfolio summary.
+
+Projects never share rows (apartments, reports and work items all carry a
+projectId), so every partition is independent and adding a building adds
+a worker instead of serial wall time.
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from explore_db import get_db_connection, get_projects, get_project_apartments
+from progress_visualization import get_readiness_data
+from calculate_v3_progress import calculate_apartment_progress
+from defect_history_chart import get_defect_history
+
+
+def run_project(project_id, version='v3'):
+    """
+    Computes every analysis for a single project.
+    Runs inside a worker process, so it opens (and closes) its own connection.
+
+    Returns a dict of plain DataFrames keyed by analysis name.
+    """
+    conn = get_db_connection()
+    try:
+        readiness = get_readiness_data(project_id, conn=conn)
+
+        progress_rows = []
+        defect_rows = []
+        for apt_num in get_project_apartments(conn, project_id):
+            result = calculate_apartment_progress(apt_num, version, project_id, conn=conn, verbose=False)
+            if result:
+                progress_rows.append({
+                    'apartmentNumber': apt_num,
+                    'progress': result['overall'],
+                    'latestReportDate': result['latest_report_date'],
+                })
+
+            df, df_history = get_defect_history(apt_num, project_id, conn=conn)
+            if df.empty:
+                continue
+            per_report = df_history.groupby('reportDate')['pending_defects'].sum()
+            defect_rows.append({
+                'apartmentNumber': apt_num,
+                'open_defects': int(per_report.iloc[-1]),
+                'peak_defects': int(per_report.max()),
+            })
+    finally:
+        conn.close()
+
+    progress = pd.DataFrame(progress_rows, columns=['apartmentNumber', 'progress', 'latestReportDate'])
+    defects = pd.DataFrame(defect_rows, columns=['apartmentNumber', 'open_defects', 'peak_defects'])
+
+    apartments = readiness.copy() if not readiness.empty else pd.DataFrame(
+        columns=['OK', 'DEFECT', 'PENDING', 'Total', 'Health_Score']
+    )
+    apartments.index.name = 'apartmentNumber'
+    apartments = (
+        apartments
+        .join(progress.set_index('apartmentNumber'), how='outer')
+        .join(defects.set_index('apartmentNumber'), how='outer')
+    )
+    return {'project_id': project_id, 'apartments': apartments}
+
+
+def merge_results(results, project_names=None):
+    """
+    Merges per-project results into
+    (apartments indexed by (projectId, apartmentNumber), one summary row per project).
+    """
+    project_names = project_names or {}
+    frames = {r['project_id']: r['apartments'] for r in results if not r['apartments'].empty}
+    if not frames:
+        return pd.DataFrame(), pd.DataFrame()
+
+    apartments = pd.concat(frames, names=['projectId', 'apartmentNumber'])
+
+    grouped = apartments.groupby(level='projectId')
+    summary = grouped[['OK', 'DEFECT', 'PENDING', 'Total', 'open_defects']].sum()
+    summary['apartments'] = grouped.size()
+    summary['Health_Score'] = (summary['OK'] / summary['Total'] * 100).round(1)
+    summary['avg_progress'] = grouped['progress'].mean().round(1)
+    summary.insert(0, 'name', [project_names.get(pid, pid) for pid in summary.index])
+
+    return apartments, summary
+
+
+def run_portfolio(max_workers=None, version='v3'):
+    """
+    Runs run_project for every project in a process pool and merges the results.
+    Returns (apartments, summary) as produced by merge_results.
+    """
+    conn = get_db_connection()
+    projects = get_projects(conn)
+    conn.close()
+
+    if not projects:
+        return pd.DataFrame(), pd.DataFrame()
+
+    max_workers = max_workers or min(len(projects), os.cpu_count() or 1)
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run_project, project_id, version): project_id for project_id, _ in projects}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error processing project {futures[future]}: {e}")
+
+    return merge_results(results, dict(projects))
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    apartments, summary = run_portfolio(max_workers=workers)
+
+    if summary.empty:
+        print("No projects found in database.")
+    else:
+        print("--- Portfolio Summary ---")
+        print(summary.to_string())
+        print("\n--- Apartments ---")
+        print(apartments.to_string())
@@ -1,83 +1,112 @@
-import sqlite3
 import pandas as pd
-import os
 
-# STATUS MAP
-STATUS_MAP = {
-    'COMPLETED': 'OK',
-    'COMPLETED_OK': 'OK',
-    'DEFECT': 'DEFECT',
-    'NOT_OK': 'DEFECT',
-    'IN_PROGRESS': 'PENDING',
-    'PENDING': 'PENDING',
-}
+import aggregate_store
+import streaming as streaming_module
+import work_items
+from explore_db import STATUS_MAP
+from memo import memoize
+from work_items import load_work_items
 
-def get_db_connection():
-    # Hardcoded for reliability in this specific environment content
-    db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-    return sqlite3.connect(db_path)
-
-def get_readiness_data():
+def get_readiness_data(project_id=None, conn=None, streaming=False, aggregates=False):
     """
     Fetches WorkItem data, determines the latest state for each item,
     and returns a summary DataFrame with counts and Health Score per apartment.
+
+    With a project_id the summary covers that project only. It is indexed
+    by apartment number when it covers one project (a project_id, or a DB
+    with a single project), else by (projectId, apartmentNumber), since
+    apartment numbers repeat across projects (see readiness_index).
+
+    streaming=True reads the rows in cursor batches (see streaming.py) so
+    memory stays bounded by the number of distinct items, not by history.
+    aggregates=True reads the latest states kept by aggregate_store.py
+    (synced first) instead of the WorkItem history.
+
+    Results are memoized (see memo.py) until the DB file changes (its size
+    and mtime, not PRAGMA data_version) or this module does. A failed read
+    prints the error and returns an empty frame, which is not cached.
     """
-    conn = get_db_connection()
-    
-    query = """
-        SELECT 
-            a.number as apartmentNumber,
-            w.category, 
-            w.location, 
-            w.status,
-            r.reportDate
-        FROM WorkItem w
-        JOIN Report r ON w.reportId = r.id
-        LEFT JOIN Apartment a ON w.apartmentId = a.id
-        WHERE w.apartmentId IS NOT NULL
-        ORDER BY r.reportDate ASC
-    """
-    
+    if streaming or aggregates:
+        return _readiness_data(project_id, conn=conn, streaming=streaming, aggregates=aggregates)
     try:
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        if df.empty:
-            return pd.DataFrame()
-
-        # 1. Map Status
-        df['State'] = df['status'].map(STATUS_MAP).fillna('INFO')
-        df = df[df['State'] != 'INFO'].copy()
-        
-        # 2. Get Latest State
-        df = df.sort_values('reportDate')
-        latest = df.drop_duplicates(subset=['apartmentNumber', 'category', 'location'], keep='last')
-        
-        # 3. Create Summary
-        summary = latest.groupby(['apartmentNumber', 'State']).size().unstack(fill_value=0)
-        
-        # Ensure all columns exist
-        for col in ['OK', 'DEFECT', 'PENDING']:
-            if col not in summary.columns:
-                summary[col] = 0
-                
-        # Calculate Metrics
-        summary['Total'] = summary[['OK', 'DEFECT', 'PENDING']].sum(axis=1)
-        summary['Health_Score'] = (summary['OK'] / summary['Total'] * 100).round(1)
-        
-        # Reorder columns
-        return summary[['OK', 'DEFECT', 'PENDING', 'Total', 'Health_Score']]
-        
+        return _readiness_data(project_id, conn=conn)
     except Exception as e:
         print(f"Error in get_readiness_data: {e}")
-        if conn: conn.close()
         return pd.DataFrame()
 
-def display_readiness_heatmap():
+@memoize(uses=[work_items, streaming_module, aggregate_store, STATUS_MAP])
+def _readiness_data(project_id=None, conn=None, streaming=False, aggregates=False):
+    """get_readiness_data() without the error handling, so errors are never memoized"""
+    if streaming:
+        from streaming import stream_readiness
+        return stream_readiness(project_id, conn=conn)
+    if aggregates:
+        return aggregate_store.read_current(aggregate_store.read_readiness, project_id, conn=conn)
+    return readiness_from_items(load_work_items(conn, project_id=project_id), project_id)
+
+def readiness_from_items(df, project_id=None):
+    """
+    The get_readiness_data() summary computed from a load_work_items() frame
+    that is already in memory (INFO rows, if loaded, are left out). With a
+    project_id only that project's apartments are summarized.
+    """
+    df = df[df['state'] != 'INFO']
+    if project_id is not None:
+        df = df[df['projectId'] == project_id]
+    if df.empty:
+        return pd.DataFrame()
+
+    # 1. Map Status (done by the loader)
+    df = df.rename(columns={'apartment_number': 'apartmentNumber', 'state': 'State'})
+    
+    # 2. Get Latest State (rows arrive sorted by reportDate)
+    latest = df.drop_duplicates(subset=['projectId', 'apartmentNumber', 'category', 'location'], keep='last')
+    
+    # 3. Create Summary
+    return summarize_readiness(latest, readiness_index(latest, project_id))
+
+def readiness_index(latest, project_id=None):
+    """
+    Index columns of a readiness summary: apartmentNumber when `latest`
+    holds a single project, else (projectId, apartmentNumber).
+    """
+    if project_id is not None or latest['projectId'].nunique() <= 1:
+        return ['apartmentNumber']
+    return ['projectId', 'apartmentNumber']
+
+def summarize_readiness(latest, index_cols):
+    """
+    Counts the latest State per apartment and adds Total and Health_Score.
+    `latest` holds one row per item with its most recent 'State'.
+    """
+    summary = latest.groupby(index_cols + ['State'], observed=True).size().unstack(fill_value=0)
+    
+    # Plain string labels, whether or not the keys came in as categoricals
+    summary.columns = summary.columns.astype(str)
+    summary = summary.reset_index()
+    summary[index_cols] = summary[index_cols].astype(str)
+    summary = summary.set_index(index_cols).rename_axis(columns='State')
+    
+    # Ensure all columns exist
+    for col in ['OK', 'DEFECT', 'PENDING']:
+        if col not in summary.columns:
+            summary[col] = 0
+            
+    # Calculate Metrics
+    summary['Total'] = summary[['OK', 'DEFECT', 'PENDING']].sum(axis=1)
+    summary['Health_Score'] = (summary['OK'] / summary['Total'] * 100).round(1)
+    
+    # Reorder columns
+    return summary[['OK', 'DEFECT', 'PENDING', 'Total', 'Health_Score']]
+
+def display_readiness_heatmap(project_id=None):
     """
     Returns a styled DataFrame suitable for display in Jupyter Notebook.
+    Served by the analytics service when it is running (see analytics_client.py).
     """
-    df = get_readiness_data()
+    from analytics_client import readiness
+
+    df = readiness(project_id)
     
     if df.empty:
         print("No data available for readiness heatmap.")
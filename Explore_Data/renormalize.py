@@ -0,0 +1,435 @@
+"""
+Offline Re-normalization
+Re-derives WorkItem status and category from Report.rawExtraction with the
+rules of normalizeStatus / normalizeCategory (src/lib/report-processing.ts),
+without running the TypeScript pipeline or calling any extraction API, and
+reports the items whose stored value differs.
+
+Edit the maps below (or pass a modified Rules) to see what a rule change
+would do to the whole history before touching the TypeScript side.
+
+How it stays fast:
+- Each keyword list is compiled into an Aho-Corasick automaton, so a text
+  is scanned once for all keywords instead of once per keyword.
+- Statuses and categories are derived once per distinct (status, notes) /
+  (category, description) pair and mapped back to the items.
+- rawExtraction is read report by report (from the extraction store when
+  the connection has it attached, as its own connection does, so pruned
+  reports are included) and parsed lazily; parsed items are cached per
+  (reportId, updatedAt).
+
+Extracted items are matched to WorkItems by (apartment, description,
+location, notes) and their order within the report; WorkItems edited by the
+fix scripts may have no match and are listed separately.
+
+Usage:
+    python renormalize.py            # summary + changed items
+    python renormalize.py --csv out.csv
+"""
+
+import json
+import sys
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from explore_db import get_db_connection
+from extraction_store import attach_store, read_field, value_condition
+
+# Status mapping (from report-processing.ts)
+HEBREW_STATUS_MAP = {
+    'בוצע': 'COMPLETED',
+    'בוצע - תקין': 'COMPLETED_OK',
+    'תקין': 'COMPLETED_OK',
+    'לא תקין': 'NOT_OK',
+    'ליקוי': 'DEFECT',
+    'בטיפול': 'IN_PROGRESS',
+    'טופל': 'HANDLED',
+    'ממתין': 'PENDING',
+    'לא התחיל': 'NOT_STARTED',
+    'בביצוע': 'IN_PROGRESS',
+    'הושלם': 'COMPLETED',
+    'נמצא ליקוי': 'DEFECT',
+    'תוקן': 'HANDLED',
+    'קיימים אי תאומים': 'DEFECT',
+    'קיימים אי תיאומים': 'DEFECT',
+    'אי תאומים': 'DEFECT',
+    'אי תיאומים': 'DEFECT',
+    'יש הערות': 'DEFECT',
+    'בוצע - יש הערות': 'DEFECT',
+    'בוצע - יש ליקויים': 'DEFECT',
+    'בוצע - נמצאו אי תאומים': 'DEFECT',
+    'בוצע - נמצאו אי תיאומים': 'DEFECT',
+    'נמצאו אי תאומים': 'DEFECT',
+    'נמצאו אי תיאומים': 'DEFECT',
+    'בוצע חלקי': 'IN_PROGRESS',
+    'לטיפול': 'PENDING',
+    'נדרש מעקב': 'PENDING',
+    'נדרש ביצוע': 'PENDING',
+    'בוצע עם הערות': 'DEFECT',
+}
+
+# Category mapping (from report-processing.ts)
+HEBREW_CATEGORY_MAP = {
+    'חשמל': 'ELECTRICAL',
+    'אינסטלציה': 'PLUMBING',
+    'מיזוג': 'AC',
+    'מיזוג אויר': 'AC',
+    'מ"א': 'AC',
+    'ריצוף': 'FLOORING',
+    'חיפוי': 'FLOORING',
+    'ספרינקלרים': 'SPRINKLERS',
+    'ספרינקלר': 'SPRINKLERS',
+    'כיבוי': 'SPRINKLERS',
+    'כיבוי אש': 'SPRINKLERS',
+    'גבס': 'DRYWALL',
+    'הנמכות': 'DRYWALL',
+    'הנמכה': 'DRYWALL',
+    'איטום': 'WATERPROOFING',
+    'צביעה': 'PAINTING',
+    'צבע': 'PAINTING',
+    'מטבח': 'KITCHEN',
+    'חלונות': 'OTHER',
+    'דלת כניסה': 'OTHER',
+    'כללי': 'OTHER',
+    'סניטריה': 'OTHER',
+    'פיתוח': 'OTHER',
+    'עבודות פיתוח': 'OTHER',
+    'אחר': 'OTHER',
+}
+
+# Keywords searched in the description when the category maps to OTHER
+CATEGORY_KEYWORDS = {
+    'ELECTRICAL': ['חשמל', 'שקע', 'מפסק', 'תאורה', 'לוח', 'כבל', 'חוטים'],
+    'AC': ['מ"א', 'מיזוג', 'מזגן', 'דמפר', 'תריס', 'VRF', 'vrf', 'צנרת גז'],
+    'SPRINKLERS': ['ספרינקלר', 'מתז', 'כיבוי אש', 'גלאי', 'ספרינקלרים'],
+    'DRYWALL': ['גבס', 'הנמכות', 'הנמכה', 'קרניז', 'נישה', 'תקרה אקוסטית'],
+    'FLOORING': ['ריצוף', 'חיפוי', 'פוגה', 'רובה', 'שיפועים', 'קרמיקה', 'פורצלן', 'פרקט', 'פנלים'],
+    'PLUMBING': ['אינסטלציה', 'צנרת', 'ביוב', 'דלוחין', 'נקז', 'סיפון', 'ברז', 'אסלה', 'כיור', 'מקלחת', 'אמבטיה'],
+    'WATERPROOFING': ['איטום', 'יריעות', 'פריימר', 'זפת', 'רולקות', 'סף הפרדה'],
+    'PAINTING': ['צבע', 'צביעה', 'סיוד', 'תיקוני שפכטל', 'צביעת קירות', 'צביעת תקרה'],
+    'KITCHEN': ['מטבח', 'ארונות', 'שיש', 'כיור מטבח'],
+}
+
+# Defect keywords: any of them in status + notes makes the item a DEFECT
+DEFECT_KEYWORDS = [
+    'אי תיאומים', 'אי תאומים', 'נמצאו אי', 'קיימים אי', 'יש הערות', 'יש ליקויים',
+    'ליקוי', 'ליקויים', 'לא תקין', 'חסר', 'חסרה', 'חסרות',
+    'חסרים', 'שבור', 'שבורה', 'שבורים', 'סדוק', 'סדוקה',
+    'סדוקים', 'פגם', 'פגמים', 'בעיה', 'בעיות', 'לתקן',
+    'תיקון', 'לא בוצע', 'לא הותקן', 'לא הותקנו', 'חתוך', 'חתוכים',
+    'להחליף', 'החלפה', 'נזק', 'נזקים', 'לא הושלם', 'טעון',
+]
+
+PARTIAL_KEYWORDS = [
+    'חלקי', 'חלקית', 'בביצוע', 'בטיפול',
+]
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a keyword list. find() returns the indices
+    (in list order) of every keyword occurring in a text, in one pass.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for ch in keyword:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.output[state].append(index)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            found.update(self.output[state])
+        return found
+
+    def longest(self, text):
+        """Longest keyword in text (the earliest listed on ties), or None."""
+        found = self.find(text)
+        if not found:
+            return None
+        return self.keywords[min(found, key=lambda i: (-len(self.keywords[i]), i))]
+
+    def first(self, text):
+        """Earliest listed keyword in text, or None."""
+        found = self.find(text)
+        return self.keywords[min(found)] if found else None
+
+
+class Rules:
+    """The status and category rules, compiled once."""
+
+    def __init__(self, status_map=None, category_map=None, category_keywords=None,
+                 defect_keywords=None, partial_keywords=None):
+        self.status_map = dict(HEBREW_STATUS_MAP if status_map is None else status_map)
+        self.category_map = dict(HEBREW_CATEGORY_MAP if category_map is None else category_map)
+        self.category_keywords = dict(CATEGORY_KEYWORDS if category_keywords is None else category_keywords)
+        defect_keywords = DEFECT_KEYWORDS if defect_keywords is None else defect_keywords
+        partial_keywords = PARTIAL_KEYWORDS if partial_keywords is None else partial_keywords
+
+        self.defects = KeywordAutomaton(k.lower() for k in defect_keywords)
+        self.partials = KeywordAutomaton(k.lower() for k in partial_keywords)
+        self.statuses = KeywordAutomaton(k.lower() for k in self.status_map)
+        self.status_by_key = {k.lower(): v for k, v in reversed(list(self.status_map.items()))}
+        self.categories = KeywordAutomaton(self.category_map)
+
+        # Flattened (category, keyword) pairs; the first pair in this order wins
+        self.keyword_category = [(cat, k.lower()) for cat, words in self.category_keywords.items() for k in words]
+        self.description_keywords = KeywordAutomaton(k for _, k in self.keyword_category)
+
+    def normalize_status(self, status, notes=None):
+        """normalizeStatus: defect keywords, partial keywords, exact, then longest partial match."""
+        status = status or ''
+        trimmed = status.strip().lower()
+        combined = ' '.join(s for s in (status, notes) if s).lower()
+
+        if self.defects.find(combined):
+            return 'DEFECT'
+        if self.partials.find(trimmed):
+            return 'IN_PROGRESS'
+        if status.strip() in self.status_map:
+            return self.status_map[status.strip()]
+        match = self.statuses.longest(trimmed)
+        return self.status_by_key[match] if match is not None else 'IN_PROGRESS'
+
+    def normalize_category(self, category, description=''):
+        """normalizeCategory: exact, first partial match in map order, then description keywords."""
+        trimmed = (category or '').strip()
+        if trimmed in self.category_map:
+            normalized = self.category_map[trimmed]
+        else:
+            match = self.categories.first(trimmed)
+            normalized = self.category_map[match] if match is not None else 'OTHER'
+
+        if normalized == 'OTHER' and description:
+            found = self.description_keywords.find(description.lower())
+            if found:
+                return self.keyword_category[min(found)][0]
+        return normalized
+
+
+def _text(value):
+    """JS `value || ''` for a JSON value."""
+    if value is None or value is False or value == '':
+        return ''
+    return value if isinstance(value, str) else str(value)
+
+
+def parse_extraction(raw):
+    """
+    The work items of a rawExtraction JSON in the order processReport saves
+    them: apartment items, then development items (apartmentNumber None).
+    Takes the JSON text or the already parsed object.
+    """
+    data = json.loads(raw) if isinstance(raw, str) else raw
+    rows = []
+    for apt in data.get('apartments') or []:
+        for item in apt.get('workItems') or []:
+            rows.append((_text(apt.get('apartmentNumber')), item))
+    dev_items = data.get('developmentItems')
+    for item in dev_items if isinstance(dev_items, list) else []:
+        rows.append((None, item))
+    return [
+        {
+            'apartmentNumber': apt_num,
+            'rawCategory': _text(item.get('category')),
+            'rawStatus': _text(item.get('status')),
+            'description': _text(item.get('description')),
+            'location': _text(item.get('location')) or None,
+            'notes': _text(item.get('notes')) or None,
+            'hasPhoto': bool(item.get('hasPhoto')),
+        }
+        for apt_num, item in rows
+    ]
+
+
+# Parsed items per (reportId, updatedAt)
+_parse_cache = {}
+
+
+def iter_extracted_items(conn, project_id=None):
+    """
+    Yields (report row, parsed items) for every report with a rawExtraction,
+    reading one rawExtraction at a time. Reports whose JSON cannot be
+    parsed yield items=None.
+    """
+    query = f"SELECT id, projectId, reportDate, updatedAt FROM Report WHERE {value_condition(conn, 'rawExtraction')}"
+    params = ()
+    if project_id is not None:
+        query += " AND projectId = ?"
+        params = (project_id,)
+    reports = conn.execute(query + " ORDER BY reportDate, id", params).fetchall()
+
+    for report_id, project, report_date, updated_at in reports:
+        key = (report_id, updated_at)
+        if key not in _parse_cache:
+            raw = read_field(conn, report_id, 'rawExtraction')
+            try:
+                _parse_cache[key] = parse_extraction(raw)
+            except (ValueError, AttributeError, TypeError):
+                _parse_cache[key] = None
+        yield (report_id, project, report_date), _parse_cache[key]
+
+
+def load_extracted_items(conn, project_id=None):
+    """
+    All extracted items as one DataFrame with reportId, projectId, reportDate,
+    apartmentId and the raw fields. Items of unknown apartments are dropped,
+    as processReport skips them. Also returns the ids of unparseable reports.
+    """
+    frames = []
+    unparsed = []
+    for (report_id, project, report_date), items in iter_extracted_items(conn, project_id):
+        if items is None:
+            unparsed.append(report_id)
+            continue
+        df = pd.DataFrame(items, columns=['apartmentNumber', 'rawCategory', 'rawStatus',
+                                          'description', 'location', 'notes'])
+        df.insert(0, 'reportId', report_id)
+        df.insert(1, 'projectId', project)
+        df.insert(2, 'reportDate', report_date)
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(), unparsed
+
+    items = pd.concat(frames, ignore_index=True)
+    apartments = pd.read_sql_query("SELECT id as apartmentId, projectId, number as apartmentNumber FROM Apartment", conn)
+    items = items.merge(apartments, on=['projectId', 'apartmentNumber'], how='left')
+    items = items[items['apartmentNumber'].isna() | items['apartmentId'].notna()]
+    return items.reset_index(drop=True), unparsed
+
+
+def _map_unique(df, columns, func):
+    """func(*row) for every row of df[columns], called once per distinct row."""
+    keys = df[columns].astype(object)
+    keys = keys.where(keys.notna(), None)
+    codes = keys.groupby(columns, sort=False, dropna=False).ngroup().to_numpy()
+    values = [func(*row) for row in keys.drop_duplicates().itertuples(index=False)]
+    return np.array(values, dtype=object)[codes]
+
+
+def derive(items, rules):
+    """Adds the re-derived status and category, computed once per distinct input pair."""
+    items['newStatus'] = _map_unique(items, ['rawStatus', 'notes'], rules.normalize_status)
+    items['newCategory'] = _map_unique(items, ['rawCategory', 'description'], rules.normalize_category)
+    return items
+
+
+MATCH_KEY = ['reportId', 'apartmentId', 'description', 'location', 'notes']
+
+
+def _with_occurrence(df):
+    df = df.assign(**{c: df[c].astype(object).where(df[c].notna(), '') for c in MATCH_KEY})
+    return df.assign(occurrence=df.groupby(MATCH_KEY, sort=False).cumcount())
+
+
+def renormalize(project_id=None, rules=None, conn=None):
+    """
+    Re-derives status and category for every extracted item and matches
+    the items to the stored WorkItems.
+
+    Returns a dict of DataFrames:
+    - changed: matched items whose stored status or category differs
+    - unmatched_extracted: extracted items without a WorkItem
+    - unmatched_stored: WorkItems (of reports with a rawExtraction) without an extracted item
+    - summary: counts of (old -> new) status and category changes
+    """
+    rules = rules or Rules()
+    own_conn = conn is None
+    if own_conn:
+        conn = attach_store(get_db_connection())
+    try:
+        items, unparsed = load_extracted_items(conn, project_id)
+        stored = pd.read_sql_query(f"""
+            SELECT w.id as workItemId, w.reportId, w.apartmentId, w.category, w.status,
+                   w.description, w.location, w.notes
+            FROM WorkItem w
+            JOIN Report r ON w.reportId = r.id
+            WHERE {value_condition(conn, 'rawExtraction', 'r')}
+            ORDER BY w.reportId, w.createdAt, w.id
+        """, conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+    if items.empty:
+        return {}
+    items = derive(items, rules)
+    stored = stored[~stored['reportId'].isin(unparsed)]
+
+    merged = _with_occurrence(items).merge(
+        _with_occurrence(stored)[MATCH_KEY + ['occurrence', 'workItemId', 'category', 'status']],
+        on=MATCH_KEY + ['occurrence'], how='outer', indicator=True,
+    )
+    matched = merged[merged['_merge'] == 'both']
+    changed = matched[(matched['status'] != matched['newStatus']) | (matched['category'] != matched['newCategory'])]
+    changed = changed[[
+        'reportId', 'reportDate', 'workItemId', 'apartmentNumber', 'description',
+        'rawStatus', 'status', 'newStatus', 'rawCategory', 'category', 'newCategory',
+    ]].sort_values(['reportDate', 'reportId', 'apartmentNumber', 'description'])
+    changed['reportDate'] = pd.to_datetime(changed['reportDate'], unit='ms')
+
+    summary = pd.concat([
+        changed[changed['status'] != changed['newStatus']]
+        .groupby(['status', 'newStatus']).size().rename('items').reset_index()
+        .rename(columns={'status': 'old', 'newStatus': 'new'}).assign(field='status'),
+        changed[changed['category'] != changed['newCategory']]
+        .groupby(['category', 'newCategory']).size().rename('items').reset_index()
+        .rename(columns={'category': 'old', 'newCategory': 'new'}).assign(field='category'),
+    ], ignore_index=True)[['field', 'old', 'new', 'items']]
+
+    return {
+        'changed': changed.reset_index(drop=True),
+        'unmatched_extracted': merged.loc[merged['_merge'] == 'left_only', items.columns].reset_index(drop=True),
+        'unmatched_stored': merged.loc[merged['_merge'] == 'right_only',
+                                       ['workItemId', 'reportId', 'description', 'category', 'status']].reset_index(drop=True),
+        'summary': summary,
+    }
+
+
+if __name__ == "__main__":
+    result = renormalize()
+    if not result:
+        print("No reports with rawExtraction found.")
+        sys.exit(0)
+
+    print("--- Re-normalization Summary ---")
+    print(f"Changed items: {len(result['changed'])}")
+    print(f"Extracted items without a WorkItem: {len(result['unmatched_extracted'])}")
+    print(f"WorkItems without an extracted item: {len(result['unmatched_stored'])}")
+    if not result['summary'].empty:
+        print(result['summary'].to_string(index=False))
+
+    if len(sys.argv) > 2 and sys.argv[1] == '--csv':
+        result['changed'].to_csv(sys.argv[2], index=False, encoding='utf-8-sig')
+        print(f"\nChanged items written to {sys.argv[2]}")
+    elif not result['changed'].empty:
+        print("\n--- Changed Items ---")
+        print(result['changed'].to_string(index=False))
@@ -0,0 +1,237 @@
+"""
+Analytics Replica
+Copies the live dev.db to REPLICA_PATH with SQLite's online backup API,
+which get_db_connection() then reads instead of the live DB (see
+explore_db.read_db_path). Long pandas reads no longer compete with the
+app's writer or see half-applied uploads: the replica is a consistent copy
+of one moment.
+
+How a refresh works:
+- The backup copies PAGES_PER_STEP pages per step and sleeps STEP_SLEEP
+  between steps, so the source is only locked for one short step at a
+  time. A write to dev.db by another connection during the copy makes
+  SQLite restart the copy, so the result is never a mix of two states.
+  A busy writer could keep restarting it, so after MAX_RESTARTS:
+  - in WAL mode the copy is made in one step: a single read transaction,
+    which does not block the writer,
+  - in rollback journal mode (dev.db's default) a one-step copy would hold
+    the read lock for the whole copy and block the app's writes, so the
+    copy is started over with a longer sleep between steps, up to
+    MAX_ATTEMPTS times. If dev.db keeps changing, the refresh gives up
+    and the old replica is kept.
+- It is written to a temporary file, which gets the ANALYTICS_INDEXES
+  (never created on dev.db, so Prisma does not see them), ANALYZE, and a
+  ReplicaInfo row with the copy time and the db_token() of dev.db before
+  the copy. The file then replaces the replica in one rename.
+- The replica is switched to rollback journal mode, so no WAL file of an
+  older replica can be applied to the new one.
+
+Scripts that write to dev.db (bulk_reimport.py, status_summary.py) use
+get_live_connection(). When dev.db has changed since the copy, the first
+read from the replica in a process prints the copy time.
+
+Usage:
+    python replica.py refresh [--force]   # copy now (skipped when dev.db is unchanged)
+    python replica.py watch [minutes]     # refresh every N minutes (default 15)
+    python replica.py status
+    python replica.py drop                # delete it; the tools read dev.db again
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from explore_db import DB_PATH, REPLICA_PATH, db_token, get_live_connection
+
+PAGES_PER_STEP = 1024
+STEP_SLEEP = 0.005
+
+# Restarts of the stepped copy (dev.db written during it) before the copy
+# is done in a single step (WAL) or started over with a longer sleep
+MAX_RESTARTS = 3
+MAX_ATTEMPTS = 4
+BACKOFF = 4
+
+WATCH_MINUTES = 15
+
+# Indexes for the analysis queries (history per apartment, status counts
+# per report, reports of a project by date), on the replica only
+ANALYTICS_INDEXES = """
+CREATE INDEX IF NOT EXISTS replica_WorkItem_apartment_report ON WorkItem (apartmentId, reportId);
+CREATE INDEX IF NOT EXISTS replica_WorkItem_report_status
+    ON WorkItem (reportId, apartmentId, category, status);
+CREATE INDEX IF NOT EXISTS replica_Report_project_date ON Report (projectId, reportDate);
+"""
+
+INFO_SCHEMA = """
+CREATE TABLE ReplicaInfo (
+    copiedAt INTEGER NOT NULL,
+    sourceToken TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    seconds REAL NOT NULL
+);
+"""
+
+
+def info(path=REPLICA_PATH):
+    """The ReplicaInfo row of the replica as a dict, or None when there is no replica."""
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        row = conn.execute("SELECT copiedAt, sourceToken, pages, seconds FROM ReplicaInfo").fetchone()
+    except sqlite3.Error:
+        row = None
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return {'copiedAt': row[0], 'sourceToken': row[1], 'pages': row[2], 'seconds': row[3]}
+
+
+def is_current(path=REPLICA_PATH):
+    """True when the replica exists and dev.db has not been written since it was copied."""
+    current = info(path)
+    return current is not None and current['sourceToken'] == json.dumps(db_token(DB_PATH))
+
+
+class ReplicaBusy(Exception):
+    """dev.db kept changing during every attempt to copy it."""
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _stepped_backup(source, target, pages, sleep):
+    """source.backup() in steps of `pages`; raises _Restarted after MAX_RESTARTS restarts."""
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        # A write between steps restarts the copy: remaining stops going down
+        # (it can come back exactly as high as before, so >= not >)
+        if state['remaining'] is not None and remaining >= state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] >= MAX_RESTARTS:
+                raise _Restarted()
+        state['remaining'] = remaining
+
+    source.backup(target, pages=pages, sleep=sleep, progress=progress)
+
+
+def _backup(source, target, pages, sleep):
+    """
+    Stepped copy of source into target. When a busy writer keeps restarting
+    it: one step in WAL mode, else a longer sleep between steps, up to
+    MAX_ATTEMPTS times, then ReplicaBusy.
+    """
+    wal = source.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal'
+    for _ in range(MAX_ATTEMPTS):
+        try:
+            _stepped_backup(source, target, pages, sleep)
+            return
+        except _Restarted:
+            if wal:
+                source.backup(target, pages=-1)
+                return
+            sleep *= BACKOFF
+    raise ReplicaBusy(f"dev.db changed during each of {MAX_ATTEMPTS} copies")
+
+
+def refresh(path=REPLICA_PATH, force=False, pages=PAGES_PER_STEP, sleep=STEP_SLEEP):
+    """
+    Copies dev.db to the replica. Returns its info(), or None when the
+    replica was already current and force is False. Raises ReplicaBusy,
+    leaving the old replica in place, when dev.db kept changing.
+    """
+    if not force and is_current(path):
+        return None
+
+    tmp = path + '.tmp'
+    for leftover in (tmp, tmp + '-journal', tmp + '-wal', tmp + '-shm'):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+    token = json.dumps(db_token(DB_PATH))
+    start = time.perf_counter()
+    source = get_live_connection()
+    target = sqlite3.connect(tmp)
+    try:
+        try:
+            _backup(source, target, pages, sleep)
+        except ReplicaBusy:
+            target.close()
+            os.remove(tmp)
+            raise
+        seconds = time.perf_counter() - start
+        target.execute("PRAGMA journal_mode = DELETE")
+        target.executescript(ANALYTICS_INDEXES)
+        target.execute("ANALYZE")
+        target.executescript(INFO_SCHEMA)
+        page_count = target.execute("PRAGMA page_count").fetchone()[0]
+        target.execute("INSERT INTO ReplicaInfo VALUES (?, ?, ?, ?)",
+                       (int(time.time() * 1000), token, page_count, round(seconds, 3)))
+        target.commit()
+    finally:
+        target.close()
+        source.close()
+
+    try:
+        os.replace(tmp, path)
+    except PermissionError:
+        # Windows does not replace a file another process has open
+        os.remove(tmp)
+        raise
+    return info(path)
+
+
+def describe(current):
+    copied = datetime.fromtimestamp(current['copiedAt'] / 1000)
+    age = (datetime.now() - copied).total_seconds() / 60
+    return (f"copied at {copied:%Y-%m-%d %H:%M:%S} ({age:.0f} min ago), "
+            f"{current['pages']} pages in {current['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+
+    if command == 'refresh':
+        try:
+            result = refresh(force='--force' in sys.argv)
+        except PermissionError:
+            print("The replica is open in another process; close it and refresh again.")
+            sys.exit(1)
+        except ReplicaBusy as e:
+            print(f"{e}; the old replica is kept. Refresh again when the app is idle.")
+            sys.exit(1)
+        print("Replica already current." if result is None else f"Replica {describe(result)}")
+    elif command == 'watch':
+        minutes = float(sys.argv[2]) if len(sys.argv) > 2 else WATCH_MINUTES
+        print(f"Refreshing {REPLICA_PATH} every {minutes:g} minutes (Ctrl+C to stop)")
+        while True:
+            try:
+                result = refresh()
+                if result is not None:
+                    print(f"Replica {describe(result)}")
+            except PermissionError:
+                print("The replica is open in another process; retrying at the next refresh.")
+            except ReplicaBusy as e:
+                print(f"{e}; the old replica is kept, retrying at the next refresh.")
+            time.sleep(minutes * 60)
+    elif command == 'status':
+        current = info()
+        if current is None:
+            print(f"No replica at {REPLICA_PATH}; the tools read {DB_PATH}.")
+        else:
+            print(f"Replica {REPLICA_PATH}: {describe(current)}")
+            print("dev.db unchanged since." if is_current() else "dev.db has changed since.")
+    elif command == 'drop':
+        if os.path.exists(REPLICA_PATH):
+            os.remove(REPLICA_PATH)
+        print(f"Dropped {REPLICA_PATH}; the tools read {DB_PATH}.")
+    else:
+        print(__doc__)
+        sys.exit(2)
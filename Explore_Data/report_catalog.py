@@ -0,0 +1,230 @@
+"""
+Report Catalog
+In-memory index of the Report table for finding a report by date, file
+name date, file hash or id without scanning Report with epoch literals or
+fileName LIKE patterns.
+
+The catalog holds the Report metadata (not rawExtraction) and is built
+once per database file; get_catalog() rebuilds it when the DB file (or its
+WAL) changed since it was loaded.
+
+Dates are matched two ways, since a report's reportDate and its file name
+do not always agree:
+- reportDate, as a UTC calendar date. The upload route stores ISO file
+  name dates as UTC midnight but DD.MM.YY ones as local midnight, so such
+  a report can sit a day early in UTC.
+- the date parsed from fileName with the rules of extractDateFromFilename
+  (src/lib/report-processing.ts).
+
+Usage:
+    python report_catalog.py 2025-12-03             # reports of a date
+    python report_catalog.py 2025-12-01 2025-12-31  # reports in a date range
+"""
+
+import os
+import re
+import sys
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone
+
+from explore_db import get_db_connection
+
+REPORT_COLUMNS = [
+    'id', 'projectId', 'reportDate', 'fileName', 'filePath', 'fileHash',
+    'processed', 'hasErrors', 'errorDetails', 'updatedAt',
+]
+
+ISO_PREFIX = re.compile(r'^(\d{4}-\d{2}-\d{2})')
+DMY_SUFFIX = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{2,4})(?:\.pdf)?$', re.IGNORECASE)
+DMY_ANYWHERE = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{2,4})')
+
+
+def rolled_date(year, month, day):
+    """date(year, month, day), rolling over out-of-range months and days like JS new Date(year, month - 1, day)."""
+    month -= 1
+    return date(year + month // 12, month % 12 + 1, 1) + timedelta(days=day - 1)
+
+
+def _dmy_date(match):
+    day, month, year = (int(g) for g in match.groups())
+    if year < 100:
+        year = 2000 + year if year < 50 else 1900 + year
+    return rolled_date(year, month, day)
+
+
+def parse_filename_date(filename):
+    """
+    Date in a report file name, or None. Same rules as extractDateFromFilename:
+    YYYY-MM-DD at the start, else DD.MM.YY(YY) at the end, else anywhere.
+    """
+    if not filename:
+        return None
+    match = ISO_PREFIX.match(filename)
+    if match:
+        try:
+            return date.fromisoformat(match.group(1))
+        except ValueError:
+            pass
+    for pattern in (DMY_SUFFIX, DMY_ANYWHERE):
+        match = pattern.search(filename)
+        if match:
+            try:
+                return _dmy_date(match)
+            except (ValueError, OverflowError):
+                pass
+    return None
+
+
+def to_date(value):
+    """A date from a date, datetime, Timestamp, 'YYYY-MM-DD' string or epoch ms."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).date()
+    try:
+        return datetime.fromisoformat(value).date()
+    except (TypeError, ValueError):
+        # pandas is only loaded for the rarer formats, so lookups start fast
+        import pandas as pd
+        return pd.Timestamp(value).date()
+
+
+class ReportCatalog:
+    """
+    Report rows (dicts with REPORT_COLUMNS, reportDate as epoch ms) indexed
+    by id, fileHash, reportDate and file name date.
+    """
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda r: (r['reportDate'], r['id']))
+        self.by_id = {}
+        self.by_hash = {}
+        self.by_date = {}
+        self.by_filename_date = {}
+        for row in self.rows:
+            row['date'] = to_date(row['reportDate'])
+            row['filenameDate'] = parse_filename_date(row['fileName'])
+            self.by_id[row['id']] = row
+            if row['fileHash']:
+                self.by_hash.setdefault(row['fileHash'], []).append(row)
+            self.by_date.setdefault(row['date'], []).append(row)
+            if row['filenameDate'] is not None:
+                self.by_filename_date.setdefault(row['filenameDate'], []).append(row)
+        self._dates = [row['date'] for row in self.rows]
+
+    @classmethod
+    def load(cls, conn):
+        cursor = conn.execute(f"SELECT {', '.join(REPORT_COLUMNS)} FROM Report")
+        return cls([dict(zip(REPORT_COLUMNS, values)) for values in cursor.fetchall()])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, report_id):
+        return self.by_id.get(report_id)
+
+    def with_hash(self, file_hash):
+        return list(self.by_hash.get(file_hash, []))
+
+    def on_date(self, value, project_id=None):
+        """
+        Reports whose reportDate or file name date is the given date, by reportDate.
+        """
+        day = to_date(value)
+        found = {row['id']: row for row in self.by_date.get(day, [])}
+        found.update((row['id'], row) for row in self.by_filename_date.get(day, []))
+        return self._select(found.values(), project_id)
+
+    def between(self, start=None, end=None, project_id=None):
+        """
+        Reports with reportDate between start and end (inclusive dates, either open).
+        """
+        lo = 0 if start is None else bisect_left(self._dates, to_date(start))
+        hi = len(self.rows) if end is None else bisect_right(self._dates, to_date(end))
+        return self._select(self.rows[lo:hi], project_id)
+
+    def latest(self, project_id=None):
+        rows = self._select(self.rows, project_id)
+        return rows[-1] if rows else None
+
+    def _select(self, rows, project_id):
+        if project_id is not None:
+            rows = [row for row in rows if row['projectId'] == project_id]
+        return sorted(rows, key=lambda r: (r['reportDate'], r['id']))
+
+    @staticmethod
+    def to_frame(rows):
+        """Rows as a DataFrame with reportDate as datetime."""
+        import pandas as pd
+
+        df = pd.DataFrame(rows, columns=REPORT_COLUMNS + ['date', 'filenameDate'])
+        df['reportDate'] = pd.to_datetime(df['reportDate'], unit='ms')
+        return df
+
+
+# Catalogs per DB file: path -> (file stamp, catalog)
+_catalogs = {}
+
+
+def _db_file(conn):
+    for _, name, path in conn.execute("PRAGMA database_list").fetchall():
+        if name == 'main':
+            return path or None
+    return None
+
+
+def _file_stamp(path):
+    stamp = []
+    for suffix in ('', '-wal'):
+        try:
+            st = os.stat(path + suffix)
+        except OSError:
+            stamp.append(None)
+        else:
+            stamp.append((st.st_mtime_ns, st.st_size))
+    return tuple(stamp)
+
+
+def get_catalog(conn=None):
+    """
+    The ReportCatalog of the connection's database, loaded on first use and
+    reloaded when the DB file changed. In-memory databases are never cached.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        path = _db_file(conn)
+        if path is None:
+            return ReportCatalog.load(conn)
+        stamp = _file_stamp(path)
+        cached = _catalogs.get(path)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, ReportCatalog.load(conn))
+            _catalogs[path] = cached
+        return cached[1]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    catalog = get_catalog()
+    if len(sys.argv) > 2:
+        rows = catalog.between(sys.argv[1], sys.argv[2])
+    else:
+        rows = catalog.on_date(sys.argv[1])
+
+    if not rows:
+        print("No reports found.")
+    else:
+        # Plain output keeps the lookup free of pandas
+        for row in rows:
+            print(f"{row['id']}  {row['projectId']}  {row['date']}  {row['fileName']}"
+                  f"  processed={bool(row['processed'])}  hasErrors={bool(row['hasErrors'])}")
@@ -0,0 +1,334 @@
+"""
+Report-to-Report Diff
+What changed for each apartment between consecutive reports - the question
+debug_october_data.py, debug_jan2026.py and the Sept 17 scripts answer by
+hand for Apartment 7.
+
+Items are matched on a normalized key: category plus whitespace/punctuation/
+case-normalized location and description, plus an occurrence number for
+repeated keys. The key is hashed to one 64-bit value and the reports are
+joined on (apartment, seq, hash) - one hash join for the whole history.
+
+Changes per consecutive report pair (seq - 1 -> seq):
+- status_changed: same key, different status
+- reworded:       an unmatched item of the previous report and one of the
+                  current report with the same category and location whose
+                  descriptions are at least REWORD_SIMILARITY alike
+- added / removed: the remaining unmatched items
+An apartment's first report (seq 0) has nothing to diff against and gets
+no rows.
+
+Results live in the analytics DB: ReportDiff (one row per change) and
+ReportChangeSummary (one row per apartment report pair). update() appends
+the pairs of newly arrived reports; apartments whose earlier reports
+changed are rebuilt. All reports are included, also those with errors,
+since those are usually the ones being investigated.
+
+Usage:
+    python report_diff.py update [apt_num]    # process new reports, print the summary
+    python report_diff.py rebuild [apt_num]   # rebuild everything
+"""
+
+import sys
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+from explore_db import apartment_projects, attach_analytics_db, check_unambiguous, get_db_connection
+from report_sequence import (
+    LEDGER_COLUMNS, get_apartment_reports, insert_rows, ledger_schema, load_items, plan_update,
+)
+
+# Minimum difflib ratio between normalized descriptions to count as reworded
+REWORD_SIMILARITY = 0.6
+
+CHANGES = ['added', 'removed', 'status_changed', 'reworded']
+
+DIFF_COLUMNS = [
+    'apartmentId', 'projectId', 'apartmentNumber', 'seq', 'reportId', 'prevReportId', 'change',
+    'category', 'location', 'description', 'prevDescription', 'status', 'prevStatus', 'itemId', 'prevItemId',
+]
+
+SUMMARY_COLUMNS = [
+    'apartmentId', 'projectId', 'apartmentNumber', 'seq', 'reportId', 'prevReportId', 'reportDate',
+    'items', 'unchanged', *CHANGES,
+]
+
+SCHEMA = ledger_schema('ReportDiffReport') + """
+CREATE TABLE IF NOT EXISTS agg.ReportDiff (
+    apartmentId TEXT NOT NULL,
+    projectId TEXT NOT NULL,
+    apartmentNumber TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    reportId TEXT NOT NULL,
+    prevReportId TEXT NOT NULL,
+    change TEXT NOT NULL,
+    category TEXT NOT NULL,
+    location TEXT,
+    description TEXT,
+    prevDescription TEXT,
+    status TEXT,
+    prevStatus TEXT,
+    itemId TEXT,
+    prevItemId TEXT
+);
+CREATE INDEX IF NOT EXISTS agg.ReportDiff_apartment_idx ON ReportDiff (apartmentId, seq);
+
+CREATE TABLE IF NOT EXISTS agg.ReportChangeSummary (
+    apartmentId TEXT NOT NULL,
+    projectId TEXT NOT NULL,
+    apartmentNumber TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    reportId TEXT NOT NULL,
+    prevReportId TEXT NOT NULL,
+    reportDate INTEGER NOT NULL,
+    items INTEGER NOT NULL,
+    unchanged INTEGER NOT NULL,
+    added INTEGER NOT NULL,
+    removed INTEGER NOT NULL,
+    status_changed INTEGER NOT NULL,
+    reworded INTEGER NOT NULL,
+    PRIMARY KEY (apartmentId, seq)
+);
+"""
+
+MATCH_KEY = ['category', 'location_key', 'description_key']
+PAIR = ['apartmentId', 'seq']
+
+
+def connect(db_path=None, analytics_db_path=None):
+    """
+    Opens dev.db with the analytics DB attached as `agg` and the schema in place.
+    """
+    conn = attach_analytics_db(get_db_connection(db_path), analytics_db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def normalize_text(values):
+    """
+    Normalizes free text for matching: NFKC, quotes/geresh/punctuation to
+    spaces, collapsed whitespace, lower case.
+    """
+    return (
+        values.fillna('').astype(str)
+        .str.normalize('NFKC')
+        .str.replace(r'[\"\'`״׳.,:;()\-–_/\\]', ' ', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+        .str.lower()
+    )
+
+
+def _hash_keys(items):
+    items = items.assign(
+        location_key=normalize_text(items['location']),
+        description_key=normalize_text(items['description']),
+    )
+    items['occurrence'] = items.groupby(PAIR + MATCH_KEY, sort=False).cumcount()
+    items['key_hash'] = pd.util.hash_pandas_object(items[MATCH_KEY + ['occurrence']], index=False).to_numpy()
+    return items
+
+
+def _pair_rewordings(added, removed):
+    """
+    Pairs unmatched current and previous items with the same category and
+    location, in report order, and keeps the pairs whose descriptions are
+    similar enough. Returns (added index, removed index) arrays.
+    """
+    group = PAIR + ['category', 'location_key']
+    added = added.assign(rank=added.groupby(group, sort=False).cumcount())
+    removed = removed.assign(rank=removed.groupby(group, sort=False).cumcount())
+    pairs = added[group + ['rank', 'description_key']].reset_index().merge(
+        removed[group + ['rank', 'description_key']].reset_index(),
+        on=group + ['rank'], suffixes=('', '_prev'),
+    )
+    if pairs.empty:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    similar = np.fromiter(
+        (SequenceMatcher(None, a, b).ratio() >= REWORD_SIMILARITY
+         for a, b in zip(pairs['description_key'], pairs['description_key_prev'])),
+        dtype=bool, count=len(pairs),
+    )
+    return pairs.loc[similar, 'index'].to_numpy(), pairs.loc[similar, 'index_prev'].to_numpy()
+
+
+def diff_items(items, targets):
+    """
+    Diffs each target report (apartmentId, seq, reportId, prevReportId,
+    reportDate) with the apartment's previous report. items must hold the
+    items of both.
+
+    Returns (changes, summary) with DIFF_COLUMNS and SUMMARY_COLUMNS.
+    """
+    targets = targets[targets['seq'] > 0]
+    if targets.empty:
+        return pd.DataFrame(columns=DIFF_COLUMNS), pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    items = _hash_keys(items)
+    apartments = items.groupby('apartmentId')[['projectId', 'apartmentNumber']].first()
+    columns = PAIR + MATCH_KEY + ['key_hash', 'id', 'location', 'description', 'status']
+    current = items.merge(targets[PAIR], on=PAIR)[columns]
+    previous = items.merge(targets[PAIR].assign(seq=targets['seq'] - 1), on=PAIR)[columns]
+    previous['seq'] += 1
+
+    joined = current.merge(previous, on=PAIR + ['key_hash'], how='outer', suffixes=('', '_prev'), indicator=True)
+    both = joined['_merge'] == 'both'
+    status_changed = joined[both & joined['status'].ne(joined['status_prev'])].assign(change='status_changed')
+    unchanged = joined[both & joined['status'].eq(joined['status_prev'])]
+
+    added = joined[joined['_merge'] == 'left_only']
+    # Removed items only have the previous report's side of the columns
+    removed = joined[joined['_merge'] == 'right_only']
+    removed = removed.assign(**{c: removed[f'{c}_prev'] for c in MATCH_KEY + ['location']})
+    added_idx, removed_idx = _pair_rewordings(added, removed)
+
+    reworded = added.loc[added_idx].assign(change='reworded')
+    for column in ['description', 'status', 'id']:
+        reworded[f'{column}_prev'] = removed.loc[removed_idx, f'{column}_prev'].to_numpy()
+    added = added.drop(index=added_idx).assign(change='added')
+    removed = removed.drop(index=removed_idx).assign(change='removed')
+
+    changes = pd.concat([added, removed, status_changed, reworded], ignore_index=True)
+    changes = changes.rename(columns={
+        'id': 'itemId', 'id_prev': 'prevItemId', 'description_prev': 'prevDescription', 'status_prev': 'prevStatus',
+    })
+    changes = changes.merge(targets[PAIR + ['reportId', 'prevReportId']], on=PAIR).join(apartments, on='apartmentId')
+    changes = changes.sort_values(PAIR + ['change', 'category'], kind='mergesort').reset_index(drop=True)
+
+    counts = pd.concat([
+        current.groupby(PAIR).size().rename('items'),
+        unchanged.groupby(PAIR).size().rename('unchanged'),
+        changes.groupby(PAIR + ['change']).size().unstack('change').reindex(columns=CHANGES),
+    ], axis=1)
+    summary = targets.join(counts, on=PAIR).join(apartments, on='apartmentId')
+    tallies = ['items', 'unchanged', *CHANGES]
+    summary[tallies] = summary[tallies].fillna(0).astype(int)
+    return changes[DIFF_COLUMNS], summary[SUMMARY_COLUMNS].reset_index(drop=True)
+
+
+def _with_previous(reports):
+    """Adds prevReportId (the apartment's report at seq - 1) to a report sequence."""
+    return reports.assign(prevReportId=reports.groupby('apartmentId')['reportId'].shift())
+
+
+def compute_diffs(conn=None, project_id=None):
+    """
+    Diffs every consecutive report pair of the whole history in one pass,
+    without the store. Returns (changes, summary) like load_changes() and
+    load_summary().
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        reports = _with_previous(get_apartment_reports(conn, project_id, exclude_errors=False))
+        items = load_items(conn, reports, ('id', 'category', 'location', 'description', 'status'))
+    finally:
+        if own_conn:
+            conn.close()
+
+    changes, summary = diff_items(items, reports)
+    summary['reportDate'] = pd.to_datetime(summary['reportDate'], unit='ms')
+    return changes, summary
+
+
+def update(conn, rebuild_all=False):
+    """
+    Appends the diffs of new reports. Returns (apartments extended,
+    apartments rebuilt).
+    """
+    if rebuild_all:
+        for table in ('ReportDiff', 'ReportChangeSummary', 'ReportDiffReport'):
+            conn.execute(f"DELETE FROM agg.{table}")
+
+    current = _with_previous(get_apartment_reports(conn, exclude_errors=False))
+    stored = pd.read_sql_query("SELECT * FROM agg.ReportDiffReport", conn)
+    extended, rebuilt, work = plan_update(current[LEDGER_COLUMNS], stored)
+
+    for apartment_id in rebuilt:
+        for table in ('ReportDiff', 'ReportChangeSummary', 'ReportDiffReport'):
+            conn.execute(f"DELETE FROM agg.{table} WHERE apartmentId = ?", (apartment_id,))
+
+    if not work.empty:
+        # The new reports plus the report each one is compared with
+        work = work.merge(current[PAIR + ['prevReportId']], on=PAIR)
+        needed = current.merge(
+            pd.concat([work[PAIR], work[PAIR].assign(seq=work['seq'] - 1)]).drop_duplicates(), on=PAIR
+        )
+        items = load_items(conn, needed, ('id', 'category', 'location', 'description', 'status'))
+        changes, summary = diff_items(items, work)
+
+        insert_rows(conn, 'agg.ReportDiff', changes, DIFF_COLUMNS)
+        insert_rows(conn, 'agg.ReportChangeSummary', summary, SUMMARY_COLUMNS)
+        insert_rows(conn, 'agg.ReportDiffReport', work, LEDGER_COLUMNS)
+    conn.commit()
+    return extended, rebuilt
+
+
+def _filters(conn, apt_num=None, project_id=None, change=None):
+    where, params = [], []
+    if apt_num is not None:
+        if project_id is None:
+            check_unambiguous(apt_num, apartment_projects(conn, apt_num))
+        where.append("apartmentNumber = ?")
+        params.append(str(apt_num))
+    if project_id is not None:
+        where.append("projectId = ?")
+        params.append(project_id)
+    if change is not None:
+        where.append("change = ?")
+        params.append(change)
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+
+def load_changes(conn, apt_num=None, project_id=None, change=None):
+    """
+    Stored item changes, optionally for one apartment number / project / change type.
+    An apartment number that exists in several projects needs project_id.
+    """
+    where, params = _filters(conn, apt_num, project_id, change)
+    return pd.read_sql_query(f"SELECT * FROM agg.ReportDiff{where} ORDER BY apartmentId, seq", conn, params=params)
+
+
+def load_summary(conn, apt_num=None, project_id=None):
+    """Stored per-report change summary, with reportDate as datetime."""
+    where, params = _filters(conn, apt_num, project_id)
+    summary = pd.read_sql_query(
+        f"SELECT * FROM agg.ReportChangeSummary{where} ORDER BY projectId, apartmentNumber, seq", conn, params=params
+    )
+    summary['reportDate'] = pd.to_datetime(summary['reportDate'], unit='ms')
+    return summary
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'update'
+    apt_num = sys.argv[2] if len(sys.argv) > 2 else None
+    if command not in ('update', 'rebuild'):
+        print(__doc__)
+        sys.exit(2)
+
+    conn = connect()
+    try:
+        extended, rebuilt = update(conn, rebuild_all=(command == 'rebuild'))
+        print(f"Extended {len(extended)} apartments, rebuilt {len(rebuilt)}.")
+
+        try:
+            summary = load_summary(conn, apt_num)
+        except ValueError as e:
+            print(e)
+            sys.exit(2)
+        if summary.empty:
+            print("No report pairs to compare.")
+        else:
+            print("\n--- Changes per Report ---")
+            print(summary.drop(columns=['apartmentId', 'reportId', 'prevReportId', 'seq']).to_string(index=False))
+        if apt_num is not None:
+            changes = load_changes(conn, apt_num)
+            print(f"\n--- Item Changes for Apartment {apt_num} ---")
+            print(changes[['seq', 'change', 'category', 'location', 'prevStatus', 'status',
+                           'prevDescription', 'description']].to_string(index=False))
+    finally:
+        conn.close()
@@ -0,0 +1,141 @@
+"""
+Per-apartment report sequences for the incrementally maintained tables.
+
+Each apartment's reports are numbered 0, 1, 2... (seq) by date. A derived
+table that is built report by report keeps a ledger of the (seq, reportId,
+reportDate, updatedAt) rows it has processed; plan_update() compares that
+ledger with dev.db and tells which apartments only gained newer reports
+(extend them) and which had earlier reports deleted, re-processed or
+back-dated (rebuild them).
+"""
+
+import pandas as pd
+
+from explore_db import STATUS_MAP
+from status_summary import SUMMARY_TABLE, is_installed
+
+LEDGER_COLUMNS = ['apartmentId', 'seq', 'reportId', 'reportDate', 'updatedAt']
+
+# Report ids per IN (...) query, well below SQLite's variable limit
+BATCH_SIZE = 500
+
+
+def ledger_schema(table):
+    return f"""
+CREATE TABLE IF NOT EXISTS agg.{table} (
+    apartmentId TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    reportId TEXT NOT NULL,
+    reportDate INTEGER NOT NULL,
+    updatedAt INTEGER,
+    PRIMARY KEY (apartmentId, seq)
+);
+"""
+
+
+def get_apartment_reports(conn, project_id=None, exclude_errors=True):
+    """
+    The reports that list items of each apartment, numbered per apartment by
+    date: apartmentId, seq, reportId, reportDate, updatedAt.
+    """
+    source = SUMMARY_TABLE if is_installed(conn) else 'WorkItem'
+    query = f"""
+        SELECT DISTINCT w.apartmentId, r.id as reportId, r.reportDate, r.updatedAt
+        FROM {source} w
+        JOIN Report r ON w.reportId = r.id
+        WHERE coalesce(w.apartmentId, '') != ''
+    """
+    params = ()
+    if exclude_errors:
+        query += " AND (r.hasErrors = 0 OR r.hasErrors IS NULL)"
+    if project_id is not None:
+        query += " AND r.projectId = ?"
+        params = (project_id,)
+
+    reports = pd.read_sql_query(query, conn, params=params)
+    reports = reports.sort_values(['apartmentId', 'reportDate', 'reportId']).reset_index(drop=True)
+    reports.insert(1, 'seq', reports.groupby('apartmentId').cumcount())
+    return reports
+
+
+def load_items(conn, reports, columns=('category', 'description', 'status')):
+    """
+    WorkItems of the given (apartmentId, reportId) rows with projectId,
+    apartmentNumber, their seq and state, plus the requested WorkItem columns.
+    """
+    select = ', '.join(f'w.{c}' for c in columns)
+    report_ids = reports['reportId'].unique().tolist()
+    frames = []
+    for start in range(0, len(report_ids), BATCH_SIZE):
+        batch = report_ids[start:start + BATCH_SIZE]
+        frames.append(pd.read_sql_query(f"""
+            SELECT w.apartmentId, a.projectId, a.number as apartmentNumber, w.reportId, {select}
+            FROM WorkItem w
+            JOIN Apartment a ON w.apartmentId = a.id
+            WHERE w.reportId IN ({', '.join('?' * len(batch))})
+        """, conn, params=batch))
+    if frames:
+        items = pd.concat(frames, ignore_index=True)
+    else:
+        items = pd.DataFrame(columns=['apartmentId', 'projectId', 'apartmentNumber', 'reportId', *columns])
+
+    items = items.merge(reports[['apartmentId', 'reportId', 'seq']], on=['apartmentId', 'reportId'])
+    if 'status' in items.columns:
+        items['state'] = items['status'].map(STATUS_MAP).fillna('INFO')
+    return items
+
+
+def _differs(current, stored):
+    """
+    Where two updatedAt columns differ: as numbers when both are numeric
+    (the outer merge turns the integer epoch ms into float64), as text
+    otherwise. Two NULLs are equal.
+    """
+    a = pd.to_numeric(current, errors='coerce')
+    b = pd.to_numeric(stored, errors='coerce')
+    numeric = a.notna() & b.notna()
+    text = current.astype(str).ne(stored.astype(str)) & ~(current.isna() & stored.isna())
+    return (numeric & a.ne(b)) | (~numeric & text)
+
+
+def plan_update(current, stored):
+    """
+    Compares the current report sequences with a table's ledger.
+
+    Returns (extended, rebuilt, work): the apartments that only gained newer
+    reports, the apartments whose processed reports changed, and the
+    current report rows still to process (new reports of extended
+    apartments, every report of rebuilt ones).
+    """
+    merged = current.merge(stored, on=['apartmentId', 'seq'], how='outer',
+                           suffixes=('', '_stored'), indicator=True)
+    changed = (merged['_merge'] == 'right_only') | (
+        (merged['_merge'] == 'both') & (
+            merged['reportId'].ne(merged['reportId_stored'])
+            | merged['reportDate'].ne(merged['reportDate_stored'])
+            | _differs(merged['updatedAt'], merged['updatedAt_stored'])
+        )
+    )
+    rebuilt = set(merged.loc[changed, 'apartmentId'])
+    extended = set(merged.loc[merged['_merge'] == 'left_only', 'apartmentId']) - rebuilt
+
+    work = current[current['apartmentId'].isin(rebuilt | extended)]
+    work = work.merge(
+        stored[~stored['apartmentId'].isin(rebuilt)][['apartmentId', 'seq']],
+        on=['apartmentId', 'seq'], how='left', indicator=True,
+    )
+    work = work[work['_merge'] == 'left_only'].drop(columns='_merge')
+    return extended, rebuilt, work
+
+
+def records(df, columns):
+    """Rows of df[columns] as tuples of plain Python values, NA as None."""
+    values = [[None if pd.isna(v) else v for v in df[c].tolist()] for c in columns]
+    return list(zip(*values))
+
+
+def insert_rows(conn, table, df, columns):
+    conn.executemany(f"""
+        INSERT INTO {table} ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+    """, records(df, columns))
@@ -1,13 +1,13 @@
-import sqlite3
 import pandas as pd
 import sys
 
+from explore_db import get_db_connection
+
 # Force UTF-8 encoding for stdout
 sys.stdout.reconfigure(encoding='utf-8')
 
 # Connect to DB
-db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-conn = sqlite3.connect(db_path)
+conn = get_db_connection()
 
 print("--- Scanning for 'Partially Done' (חלקית) items marked COMPLETED ---")
 
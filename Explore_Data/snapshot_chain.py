@@ -0,0 +1,258 @@
+"""
+Snapshot Delta Chain
+Archives DB states as a chain of compressed deltas in the analytics DB, so
+history is kept for every snapshot instead of 20 full JSON copies, and
+answers time-travel queries ("progress as of snapshot X").
+
+Format:
+- ChainVersion: one row per archived state (a Snapshot row or a capture of
+  the live DB), numbered 1, 2, 3... Every BASE_EVERY-th version is a base.
+- ChainRecord: the records of a version keyed by (version, kind, recordId).
+  A base holds every record; a delta holds only the records added or
+  changed since the previous version ('put') and the ids removed ('del').
+  Payloads are the normalized record as zlib-compressed JSON.
+- ChainHead: a digest per record of the latest version, used to compute
+  the next delta without reading the chain.
+
+A state is rebuilt from its base and the deltas up to it only, with the
+last op per record winning; older chains are never read.
+
+Usage:
+    python snapshot_chain.py import            # archive new Snapshot rows
+    python snapshot_chain.py capture [reason]  # archive the live DB state
+    python snapshot_chain.py list
+    python snapshot_chain.py progress <version|snapshot_id>
+"""
+
+import hashlib
+import json
+import sqlite3
+import sys
+import zlib
+
+import pandas as pd
+
+from explore_db import attach_analytics_db, get_db_connection
+from snapshot_reader import KINDS, iter_live, iter_snapshot
+
+BASE_EVERY = 10
+
+CHAIN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg.ChainVersion (
+    version INTEGER PRIMARY KEY,
+    baseVersion INTEGER NOT NULL,
+    snapshotId TEXT UNIQUE,
+    reason TEXT,
+    createdAt INTEGER,
+    puts INTEGER NOT NULL,
+    dels INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agg.ChainRecord (
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    recordId TEXT NOT NULL,
+    op TEXT NOT NULL,
+    payload BLOB,
+    PRIMARY KEY (version, kind, recordId)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agg.ChainHead (
+    kind TEXT NOT NULL,
+    recordId TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY (kind, recordId)
+) WITHOUT ROWID;
+"""
+
+
+def connect():
+    conn = attach_analytics_db(get_db_connection())
+    conn.executescript(CHAIN_SCHEMA)
+    return conn
+
+
+def _open(conn):
+    """(conn, own_conn): a new connection when none is given, else `conn` with the chain tables."""
+    if conn is None:
+        return connect(), True
+    conn.executescript(CHAIN_SCHEMA)
+    return conn, False
+
+
+def _encode(record):
+    return json.dumps(record, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+
+
+def append_version(conn, records, snapshot_id=None, reason=None, created_at=None):
+    """
+    Archives one state, given as a stream of (kind, record), as the next
+    version. Returns the new version number.
+    """
+    last = conn.execute("SELECT MAX(version), MAX(baseVersion) FROM agg.ChainVersion").fetchone()
+    version = (last[0] or 0) + 1
+    is_base = last[0] is None or (version - last[1]) >= BASE_EVERY
+    base_version = version if is_base else last[1]
+
+    head = {}
+    for kind, record_id, digest in conn.execute("SELECT kind, recordId, digest FROM agg.ChainHead"):
+        head[(kind, record_id)] = digest
+
+    # The records are read inside this transaction, so a live capture is consistent
+    conn.execute("BEGIN")
+    try:
+        puts = 0
+        new_head = []
+        for kind, record in records:
+            payload = _encode(record)
+            digest = hashlib.blake2b(payload, digest_size=16).digest()
+            key = (kind, record['id'])
+            if is_base or head.get(key) != digest:
+                conn.execute(
+                    "INSERT INTO agg.ChainRecord (version, kind, recordId, op, payload) VALUES (?, ?, ?, 'put', ?)",
+                    (version, kind, record['id'], zlib.compress(payload)),
+                )
+                puts += 1
+            head.pop(key, None)
+            new_head.append((kind, record['id'], digest))
+
+        # Whatever is left in the old head is gone from this state
+        removed = [] if is_base else list(head)
+        conn.executemany(
+            f"INSERT INTO agg.ChainRecord (version, kind, recordId, op) VALUES ({version}, ?, ?, 'del')", removed
+        )
+        conn.execute("DELETE FROM agg.ChainHead")
+        conn.executemany("INSERT INTO agg.ChainHead (kind, recordId, digest) VALUES (?, ?, ?)", new_head)
+        conn.execute("""
+            INSERT INTO agg.ChainVersion (version, baseVersion, snapshotId, reason, createdAt, puts, dels)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (version, base_version, snapshot_id, reason, created_at, puts, len(removed)))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return version
+
+
+def import_snapshots(conn=None):
+    """Archives the Snapshot rows not in the chain yet, oldest first. Returns the new versions."""
+    conn, own_conn = _open(conn)
+    try:
+        pending = conn.execute("""
+            SELECT id, reason, createdAt FROM Snapshot
+            WHERE id NOT IN (SELECT snapshotId FROM agg.ChainVersion WHERE snapshotId IS NOT NULL)
+            ORDER BY createdAt, id
+        """).fetchall()
+        return [
+            append_version(conn, iter_snapshot(conn, snapshot_id), snapshot_id, reason, created_at)
+            for snapshot_id, reason, created_at in pending
+        ]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def capture_live(reason='manual capture', conn=None):
+    """Archives the current DB state. Returns the new version."""
+    conn, own_conn = _open(conn)
+    try:
+        return append_version(conn, iter_live(conn), reason=reason,
+                              created_at=int(pd.Timestamp.now(tz='UTC').timestamp() * 1000))
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def list_versions(conn):
+    return pd.read_sql_query("SELECT * FROM agg.ChainVersion ORDER BY version", conn)
+
+
+def resolve_version(conn, ref):
+    """A version number from a version number or a Snapshot id."""
+    row = conn.execute("SELECT version FROM agg.ChainVersion WHERE snapshotId = ?", (str(ref),)).fetchone()
+    if row is None and str(ref).isdigit():
+        row = conn.execute("SELECT version FROM agg.ChainVersion WHERE version = ?", (int(ref),)).fetchone()
+    if row is None:
+        raise KeyError(f"No archived state for {ref}")
+    return row[0]
+
+
+def state_at(conn, ref, kinds=None):
+    """
+    The records of every kind (or of `kinds`) as of a version, as a dict
+    kind -> DataFrame. Reads only the version's base and the deltas after it.
+    """
+    version = resolve_version(conn, ref)
+    base_version = conn.execute(
+        "SELECT baseVersion FROM agg.ChainVersion WHERE version = ?", (version,)
+    ).fetchone()[0]
+
+    state = {}
+    for kind in kinds or KINDS:
+        latest = {}
+        rows = conn.execute("""
+            SELECT recordId, op, payload FROM agg.ChainRecord
+            WHERE version BETWEEN ? AND ? AND kind = ?
+            ORDER BY version
+        """, (base_version, version, kind))
+        for record_id, op, payload in rows:
+            latest[record_id] = payload if op == 'put' else None
+        records = [json.loads(zlib.decompress(p)) for p in latest.values() if p is not None]
+        state[kind] = pd.DataFrame(records)
+    return state
+
+
+def open_state(conn, ref):
+    """
+    An in-memory SQLite DB holding the state of a version as Report,
+    WorkItem and Inspection tables, plus Project and Apartment copied from
+    the live DB (snapshots do not include them). Any analysis that takes a
+    `conn` can run on it.
+    """
+    state = state_at(conn, ref)
+    mem = sqlite3.connect(':memory:')
+    for kind, table in KINDS.items():
+        df = state[kind]
+        if df.empty:
+            df = pd.read_sql_query(f"SELECT * FROM main.{table} LIMIT 0", conn)
+        df.to_sql(table, mem, index=False)
+    for table in ('Project', 'Apartment'):
+        pd.read_sql_query(f"SELECT * FROM main.{table}", conn).to_sql(table, mem, index=False)
+    return mem
+
+
+def progress_as_of(ref, version='v3', project_id=None, conn=None):
+    """History-aware apartment progress as it was at an archived version."""
+    from calculate_v3_progress import calculate_all_progress
+
+    conn, own_conn = _open(conn)
+    try:
+        mem = open_state(conn, ref)
+    finally:
+        if own_conn:
+            conn.close()
+    try:
+        return calculate_all_progress(version, project_id, conn=mem)
+    finally:
+        mem.close()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    conn = connect()
+    try:
+        if command == 'import':
+            versions = import_snapshots(conn)
+            print(f"Archived {len(versions)} snapshot(s).")
+        elif command == 'capture':
+            reason = ' '.join(sys.argv[2:]) or 'manual capture'
+            print(f"Archived live state as version {capture_live(reason, conn)}.")
+        elif command == 'progress' and len(sys.argv) > 2:
+            try:
+                result = progress_as_of(sys.argv[2], conn=conn)
+            except KeyError as e:
+                print(e.args[0])
+                sys.exit(1)
+            print(result.drop(columns=['by_category']).to_string(index=False))
+        else:
+            print(list_versions(conn).to_string(index=False))
+    finally:
+        conn.close()
@@ -0,0 +1,278 @@
+"""
+Snapshot Reader
+Streams the records of a Snapshot.data blob (the JSON written by
+createSnapshot in src/lib/snapshot.ts) without loading the whole blob, and
+diffs two snapshots, or a snapshot and the live DB.
+
+Reading:
+- The blob is read from SQLite in chunks through Connection.blobopen().
+- The JSON is parsed incrementally, one array element at a time with
+  json.JSONDecoder.raw_decode over a sliding buffer, so only the current
+  record is ever decoded.
+- Records come out as (kind, record) with kind in reports / workItems /
+  inspections. Dates are converted to epoch ms and flags to bool, the way
+  the live DB stores them, so records from both sides compare directly.
+
+Diffing reads each side as a stream and keeps one digest per record id
+plus the fields of the records that changed, so memory grows with the
+number of records and changes, not with the size of rawExtraction.
+
+Usage:
+    python snapshot_reader.py list
+    python snapshot_reader.py show <snapshot_id>
+    python snapshot_reader.py diff <snapshot_id> <snapshot_id|live>
+"""
+
+import codecs
+import hashlib
+import json
+import sys
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from explore_db import get_db_connection
+
+LIVE = 'live'
+
+# Snapshot section -> live table
+KINDS = {'reports': 'Report', 'workItems': 'WorkItem', 'inspections': 'Inspection'}
+
+DATE_FIELDS = {'reportDate', 'inspectionDate', 'createdAt', 'updatedAt'}
+BOOL_FIELDS = {'processed', 'hasErrors', 'hasWarnings', 'hasPhoto'}
+
+CHUNK_SIZE = 1024 * 1024
+
+# Longer values are shown as their length in diff output
+MAX_SHOWN_LENGTH = 200
+
+
+def to_epoch_ms(value):
+    """Epoch ms from an ISO string (snapshot) or from what the live DB holds."""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def normalize_record(record):
+    return {
+        key: to_epoch_ms(value) if key in DATE_FIELDS
+        else (None if value is None else bool(value)) if key in BOOL_FIELDS
+        else value
+        for key, value in record.items()
+    }
+
+
+class _ArrayReader:
+    """
+    Minimal incremental reader for {"key": [ {...}, ... ], ...} documents:
+    decodes one value at a time from a sliding text buffer.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        # Read at least as much as is buffered, so one huge value costs O(n log n)
+        chunk = self.stream.read(max(CHUNK_SIZE, len(self.buf) - self.pos))
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + self.utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ''
+            self._fill()
+
+    def take(self, expected):
+        if self.peek() != expected:
+            raise ValueError(f"Expected {expected!r} in snapshot JSON, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+    def records(self):
+        self.take('{')
+        while self.peek() not in ('}', ''):
+            key = self.value()
+            self.take(':')
+            if key in KINDS and self.peek() == '[':
+                self.take('[')
+                while self.peek() != ']':
+                    yield key, self.value()
+                    if self.peek() == ',':
+                        self.take(',')
+                self.take(']')
+            else:
+                self.value()
+            if self.peek() == ',':
+                self.take(',')
+
+
+def iter_json_records(stream):
+    """(kind, raw record) for every record of a snapshot JSON byte stream."""
+    return _ArrayReader(stream).records()
+
+
+def list_snapshots(conn):
+    return pd.read_sql_query("""
+        SELECT id, reason, reportCount, createdAt, restoredAt, length(CAST(data AS BLOB)) as bytes
+        FROM Snapshot ORDER BY createdAt DESC
+    """, conn)
+
+
+def open_snapshot(conn, snapshot_id):
+    """Read-only file-like access to a snapshot's data blob."""
+    row = conn.execute("SELECT rowid FROM Snapshot WHERE id = ?", (snapshot_id,)).fetchone()
+    if row is None:
+        raise KeyError(f"Snapshot {snapshot_id} not found")
+    return conn.blobopen('Snapshot', 'data', row[0], readonly=True)
+
+
+def iter_snapshot(conn, snapshot_id, kinds=None):
+    """(kind, record) for the records of a snapshot, normalized like the live DB."""
+    with open_snapshot(conn, snapshot_id) as blob:
+        for kind, record in iter_json_records(blob):
+            if kinds is None or kind in kinds:
+                yield kind, normalize_record(record)
+
+
+def iter_live(conn, kinds=None):
+    """(kind, record) for the rows of the live DB tables a snapshot covers."""
+    for kind, table in KINDS.items():
+        if kinds is not None and kind not in kinds:
+            continue
+        cursor = conn.execute(f"SELECT * FROM {table}")
+        columns = [d[0] for d in cursor.description]
+        for row in cursor:
+            yield kind, normalize_record(dict(zip(columns, row)))
+
+
+def iter_source(conn, source, kinds=None):
+    return iter_live(conn, kinds) if source == LIVE else iter_snapshot(conn, source, kinds)
+
+
+def count_records(conn, source):
+    counts = {kind: 0 for kind in KINDS}
+    for kind, _ in iter_source(conn, source):
+        counts[kind] += 1
+    return counts
+
+
+def _digest(record, fields):
+    payload = json.dumps([record.get(f) for f in fields], ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+
+def _shown(value):
+    if isinstance(value, str) and len(value) > MAX_SHOWN_LENGTH:
+        return f"<{len(value)} chars>"
+    return value
+
+
+def diff(old, new, conn=None, kinds=None):
+    """
+    Differences from source `old` to source `new` (snapshot ids or 'live').
+
+    Returns a DataFrame with kind, id, change (added / removed / changed),
+    field, old and new; one row per changed field. Only fields present on
+    both sides are compared, so a column added since the snapshot is not
+    reported on every record.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        # Pass 1: one digest per old record, over the old side's fields
+        old_fields = {}
+        old_digests = {}
+        for kind, record in iter_source(conn, old, kinds):
+            if kind not in old_fields:
+                old_fields[kind] = sorted(record)
+            old_digests[(kind, record['id'])] = _digest(record, old_fields[kind])
+
+        # Pass 2: new records whose digest differs are candidates
+        rows = []
+        common = {}
+        candidates = {}
+        seen = set()
+        for kind, record in iter_source(conn, new, kinds):
+            key = (kind, record['id'])
+            seen.add(key)
+            if kind not in common:
+                common[kind] = [f for f in old_fields.get(kind, []) if f in record]
+            if key not in old_digests:
+                rows.append((kind, record['id'], 'added', None, None, None))
+            elif _digest(record, old_fields[kind]) != old_digests[key]:
+                candidates[key] = {f: record.get(f) for f in common[kind]}
+        for kind, record_id in sorted(set(old_digests) - seen):
+            rows.append((kind, record_id, 'removed', None, None, None))
+        del old_digests, seen
+
+        # Pass 3: field by field comparison of the candidates
+        if candidates:
+            for kind, record in iter_source(conn, old, kinds):
+                new_record = candidates.pop((kind, record['id']), None)
+                if new_record is None:
+                    continue
+                for field in common[kind]:
+                    if record.get(field) != new_record[field]:
+                        rows.append((kind, record['id'], 'changed', field,
+                                     _shown(record.get(field)), _shown(new_record[field])))
+                if not candidates:
+                    break
+    finally:
+        if own_conn:
+            conn.close()
+
+    result = pd.DataFrame(rows, columns=['kind', 'id', 'change', 'field', 'old', 'new'])
+    return result.sort_values(['kind', 'id'], kind='stable').reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    conn = get_db_connection()
+    try:
+        if command == 'list':
+            print(list_snapshots(conn).to_string(index=False))
+        elif command == 'show' and len(sys.argv) > 2:
+            for kind, count in count_records(conn, sys.argv[2]).items():
+                print(f"{kind}: {count}")
+        elif command == 'diff' and len(sys.argv) > 3:
+            result = diff(sys.argv[2], sys.argv[3], conn=conn)
+            if result.empty:
+                print("No differences.")
+            else:
+                print(result.groupby(['kind', 'change']).size().to_string())
+                print()
+                print(result.to_string(index=False))
+        else:
+            print(__doc__)
+    finally:
+        conn.close()
@@ -0,0 +1,266 @@
+"""
+Trigger-maintained WorkItem status summary.
+
+WorkItemStatusSummary holds one row per (reportId, apartmentId, category,
+status) with the number of WorkItems in it. INSERT/UPDATE/DELETE triggers
+on WorkItem keep it current (cascade deletes of a Report fire them too), so
+the status/defect count queries read a few hundred summary rows instead of
+scanning WorkItem.
+
+The table and triggers live in dev.db itself - SQLite triggers cannot write
+to an attached database. Prisma does not know about them, so run
+`uninstall` before `prisma db push` or `prisma migrate dev` and `install`
+again afterwards: db push offers to drop the unknown table (the triggers
+stay behind and every WorkItem INSERT then fails with "no such table"),
+and a push that redefines WorkItem drops the triggers, leaving the table
+to go silently stale. `check` and the query helpers detect both states.
+
+The query helpers fall back to GROUP BY over WorkItem when the summary is
+not installed, so callers do not need to care.
+
+Usage:
+    python status_summary.py install     # create table + triggers and backfill
+    python status_summary.py uninstall   # drop them again
+    python status_summary.py check       # compare the summary with WorkItem
+"""
+
+import sys
+
+import pandas as pd
+
+from explore_db import apartment_projects, check_unambiguous, get_live_connection
+
+SUMMARY_TABLE = 'WorkItemStatusSummary'
+
+# Site-level WorkItems have no apartment; primary key columns cannot be NULL
+NO_APARTMENT = ''
+
+TABLE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+    reportId TEXT NOT NULL,
+    apartmentId TEXT NOT NULL,
+    category TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (reportId, apartmentId, category, status)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {SUMMARY_TABLE}_apartmentId_idx ON {SUMMARY_TABLE} (apartmentId);
+"""
+
+
+def _increment(row):
+    return f"""
+        INSERT INTO {SUMMARY_TABLE} (reportId, apartmentId, category, status, count)
+        VALUES ({row}.reportId, coalesce({row}.apartmentId, '{NO_APARTMENT}'), {row}.category, {row}.status, 1)
+        ON CONFLICT (reportId, apartmentId, category, status) DO UPDATE SET count = count + 1;"""
+
+
+def _decrement(row):
+    key = (f"reportId = {row}.reportId AND apartmentId = coalesce({row}.apartmentId, '{NO_APARTMENT}')"
+           f" AND category = {row}.category AND status = {row}.status")
+    return f"""
+        UPDATE {SUMMARY_TABLE} SET count = count - 1 WHERE {key};
+        DELETE FROM {SUMMARY_TABLE} WHERE {key} AND count <= 0;"""
+
+
+TRIGGERS = {
+    f'{SUMMARY_TABLE}_insert': f"""
+        CREATE TRIGGER {SUMMARY_TABLE}_insert AFTER INSERT ON WorkItem
+        BEGIN {_increment('NEW')}
+        END;""",
+    f'{SUMMARY_TABLE}_delete': f"""
+        CREATE TRIGGER {SUMMARY_TABLE}_delete AFTER DELETE ON WorkItem
+        BEGIN {_decrement('OLD')}
+        END;""",
+    f'{SUMMARY_TABLE}_update': f"""
+        CREATE TRIGGER {SUMMARY_TABLE}_update
+        AFTER UPDATE OF reportId, apartmentId, category, status ON WorkItem
+        BEGIN {_decrement('OLD')} {_increment('NEW')}
+        END;""",
+}
+
+GROUP_BY_SQL = f"""
+    SELECT reportId, coalesce(apartmentId, '{NO_APARTMENT}') as apartmentId, category, status, COUNT(*) as count
+    FROM WorkItem
+    GROUP BY reportId, coalesce(apartmentId, '{NO_APARTMENT}'), category, status
+"""
+
+# Columns status_counts() can group by, and the SQL that selects them
+GROUP_COLUMNS = {
+    'projectId': 'r.projectId',
+    'reportId': 's.reportId',
+    'reportDate': 'r.reportDate',
+    'apartmentNumber': 'a.number',
+    'category': 's.category',
+    'status': 's.status',
+}
+
+
+def installed_parts(conn):
+    """(whether the summary table exists, the set of its triggers that exist)."""
+    names = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE name = ? OR (type = 'trigger' AND tbl_name = 'WorkItem')",
+        (SUMMARY_TABLE,),
+    )}
+    return SUMMARY_TABLE in names, names & set(TRIGGERS)
+
+
+def partial_install(conn):
+    """
+    What is wrong when only part of the summary is in dev.db, else None.
+    Triggers without the table make every WorkItem write fail; the table
+    without its triggers goes stale.
+    """
+    has_table, triggers = installed_parts(conn)
+    if has_table and not triggers:
+        return f"{SUMMARY_TABLE} has no triggers and is stale"
+    if has_table and triggers != set(TRIGGERS):
+        return f"{SUMMARY_TABLE} is missing triggers {sorted(set(TRIGGERS) - triggers)} and is stale"
+    if not has_table and triggers:
+        return f"{SUMMARY_TABLE} was dropped but its triggers remain: WorkItem writes fail"
+    return None
+
+
+_partial_reported = False
+
+
+def is_installed(conn):
+    """
+    True when the table and all its triggers are in dev.db. A partial
+    install counts as not installed and is reported once.
+    """
+    global _partial_reported
+    has_table, triggers = installed_parts(conn)
+    if has_table and triggers == set(TRIGGERS):
+        return True
+    problem = partial_install(conn)
+    if problem and not _partial_reported:
+        _partial_reported = True
+        print(f"{problem}. Run `python status_summary.py install` to repair it "
+              f"(or `uninstall` to remove it); counting from WorkItem meanwhile.")
+    return False
+
+
+def install(conn):
+    """
+    Creates (or re-creates) the triggers and rebuilds the summary from WorkItem.
+    Runs as one write transaction, so no WorkItem change can slip in between
+    the backfill and the triggers.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # statement by statement: executescript() would COMMIT first
+        for statement in TABLE_SQL.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        for name, sql in TRIGGERS.items():
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            conn.execute(sql)
+        conn.execute(f"DELETE FROM {SUMMARY_TABLE}")
+        conn.execute(f"INSERT INTO {SUMMARY_TABLE} (reportId, apartmentId, category, status, count) {GROUP_BY_SQL}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def uninstall(conn):
+    for name in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"DROP TABLE IF EXISTS {SUMMARY_TABLE}")
+    conn.commit()
+
+
+def check(conn):
+    """
+    Returns the (reportId, apartmentId, category, status) groups where the
+    summary disagrees with a GROUP BY over WorkItem (empty when in sync).
+    """
+    keys = ['reportId', 'apartmentId', 'category', 'status']
+    summary = pd.read_sql_query(f"SELECT * FROM {SUMMARY_TABLE}", conn)
+    actual = pd.read_sql_query(GROUP_BY_SQL, conn)
+    merged = summary.merge(actual, on=keys, how='outer', suffixes=('_summary', '_actual')).fillna(0)
+    return merged[merged['count_summary'] != merged['count_actual']]
+
+
+def status_counts(conn, by=('status',), apt_num=None, project_id=None, report_ids=None,
+                  start_ms=None, end_ms=None):
+    """
+    WorkItem counts grouped by any of GROUP_COLUMNS, optionally filtered to an
+    apartment number, a project, a set of reports and a reportDate range
+    (epoch ms, inclusive). Returns a DataFrame with the `by` columns + count.
+    Raises ValueError when apt_num is given without project_id and the number
+    exists in more than one project.
+
+    Reads WorkItemStatusSummary when installed, WorkItem otherwise.
+    """
+    if is_installed(conn):
+        source, count = f"{SUMMARY_TABLE} s", "SUM(s.count)"
+    else:
+        source, count = "WorkItem s", "COUNT(*)"
+
+    select = [f"{GROUP_COLUMNS[c]} as {c}" for c in by]
+    query = f"""
+        SELECT {', '.join(select + [f'{count} as count'])}
+        FROM {source}
+        JOIN Report r ON s.reportId = r.id
+        LEFT JOIN Apartment a ON s.apartmentId = a.id
+        WHERE 1 = 1
+    """
+    params = []
+    if apt_num is not None:
+        if project_id is None:
+            check_unambiguous(apt_num, apartment_projects(conn, apt_num))
+        query += " AND a.number = ?"
+        params.append(str(apt_num))
+    if project_id is not None:
+        query += " AND r.projectId = ?"
+        params.append(project_id)
+    if report_ids is not None:
+        report_ids = list(report_ids)
+        query += f" AND s.reportId IN ({', '.join('?' * len(report_ids))})"
+        params.extend(report_ids)
+    if start_ms is not None:
+        query += " AND r.reportDate >= ?"
+        params.append(start_ms)
+    if end_ms is not None:
+        query += " AND r.reportDate <= ?"
+        params.append(end_ms)
+    if by:
+        group = ', '.join(GROUP_COLUMNS[c] for c in by)
+        query += f" GROUP BY {group} ORDER BY {group}"
+
+    return pd.read_sql_query(query, conn, params=params)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    conn = get_live_connection()
+    try:
+        if command == 'install':
+            install(conn)
+            rows = conn.execute(f"SELECT COUNT(*) FROM {SUMMARY_TABLE}").fetchone()[0]
+            print(f"Installed {SUMMARY_TABLE} ({rows} rows) and {len(TRIGGERS)} triggers.")
+        elif command == 'uninstall':
+            uninstall(conn)
+            print(f"Dropped {SUMMARY_TABLE} and its triggers.")
+        elif command == 'check':
+            problem = partial_install(conn)
+            if problem:
+                print(f"{problem}. Run `python status_summary.py install` to repair it.")
+                sys.exit(1)
+            elif not is_installed(conn):
+                print(f"{SUMMARY_TABLE} is not installed (queries fall back to WorkItem).")
+            else:
+                mismatches = check(conn)
+                if mismatches.empty:
+                    print(f"{SUMMARY_TABLE} matches WorkItem.")
+                else:
+                    print(f"{len(mismatches)} mismatched groups:")
+                    print(mismatches.to_string())
+                    sys.exit(1)
+        else:
+            print(__doc__)
+            sys.exit(2)
+    finally:
+        conn.close()
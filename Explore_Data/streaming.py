@@ -0,0 +1,267 @@
+"""
+Streaming (bounded-memory) execution mode for the analyses.
+
+Instead of loading a whole result set with pd.read_sql_query, rows are read
+from the cursor in batches (fetchmany). Each batch is status-mapped and
+filtered on its own and folded into small partial aggregates (counts,
+latest state per item, per-category progress sums); the batch is then
+dropped. Memory is bounded by the chunk size plus the size of the
+aggregates, which depends on the number of apartments/categories/items,
+not on the length of the report history.
+
+Only the columns an aggregate needs are selected, so the long Hebrew
+description/notes strings are never read unless a computation uses them.
+"""
+
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+from explore_db import STATUS_MAP, check_unambiguous, get_db_connection
+
+DEFAULT_CHUNKSIZE = 20_000
+
+
+def iter_chunks(conn, query, params=(), chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yields the result of `query` as DataFrames of at most `chunksize` rows.
+    """
+    cursor = conn.execute(query, params)
+    columns = [d[0] for d in cursor.description]
+    try:
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns)
+    finally:
+        cursor.close()
+
+
+def map_states(chunk, state_column='State'):
+    """
+    Adds the STATUS_MAP state to a chunk and drops the INFO rows.
+    """
+    chunk[state_column] = chunk['status'].map(STATUS_MAP).fillna('INFO')
+    return chunk[chunk[state_column] != 'INFO']
+
+
+def _with_connection(conn, func):
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        return func(conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def stream_readiness(project_id=None, conn=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming equivalent of progress_visualization.get_readiness_data.
+
+    Rows arrive ordered by reportDate, so the latest state of every
+    (project, apartment, category, location) is simply the last one seen.
+    """
+    from progress_visualization import readiness_index, summarize_readiness
+
+    keys = ['projectId', 'apartmentNumber', 'category', 'location']
+    query = """
+        SELECT a.projectId, a.number as apartmentNumber, w.category, w.location, w.status
+        FROM WorkItem w
+        JOIN Report r ON w.reportId = r.id
+        JOIN Apartment a ON w.apartmentId = a.id
+        WHERE w.apartmentId IS NOT NULL
+    """
+    params = ()
+    if project_id is not None:
+        query += " AND a.projectId = ?"
+        params = (project_id,)
+    query += " ORDER BY r.reportDate ASC, w.id ASC"
+
+    def run(conn):
+        latest = {}
+        for chunk in iter_chunks(conn, query, params, chunksize):
+            chunk = map_states(chunk)
+            chunk = chunk.drop_duplicates(subset=keys, keep='last')
+            latest.update(zip(zip(*(chunk[k] for k in keys)), chunk['State']))
+        return latest
+
+    latest = _with_connection(conn, run)
+    if not latest:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(list(latest.keys()), columns=keys)
+    df['State'] = list(latest.values())
+    return summarize_readiness(df, readiness_index(df, project_id))
+
+
+def stream_defect_history(apt_num, project_id=None, conn=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming equivalent of the df_history frame from
+    defect_history_chart.get_defect_history: pending DEFECT count per
+    (reportDate, category), zero-filled for every report and category seen.
+    Raises ValueError when project_id is None and the number exists in more
+    than one project.
+    """
+    query = """
+        SELECT a.projectId, r.reportDate, w.category, w.status
+        FROM WorkItem w
+        JOIN Report r ON w.reportId = r.id
+        JOIN Apartment a ON w.apartmentId = a.id
+        WHERE a.number = ?
+        AND (r.hasErrors = 0 OR r.hasErrors IS NULL)
+    """
+    params = [str(apt_num)]
+    if project_id is not None:
+        query += " AND a.projectId = ?"
+        params.append(project_id)
+
+    def run(conn):
+        counts = Counter()
+        projects = set()
+        report_dates = set()
+        categories = set()
+        for chunk in iter_chunks(conn, query, params, chunksize):
+            projects.update(chunk['projectId'].unique())
+            report_dates.update(chunk['reportDate'].unique())
+            categories.update(chunk['category'].unique())
+            chunk['state'] = chunk['status'].map(STATUS_MAP).fillna('INFO')
+            defects = chunk[chunk['state'] == 'DEFECT']
+            counts.update(defects.groupby(['reportDate', 'category']).size().to_dict())
+        return counts, projects, report_dates, categories
+
+    counts, projects, report_dates, categories = _with_connection(conn, run)
+    check_unambiguous(apt_num, projects)
+    if not report_dates:
+        return pd.DataFrame(columns=['reportDate', 'category', 'pending_defects'])
+
+    full_index = pd.MultiIndex.from_product(
+        [sorted(report_dates), sorted(categories)], names=['reportDate', 'category']
+    )
+    history = pd.Series(counts, dtype='int64').reindex(full_index, fill_value=0)
+    df_history = history.rename('pending_defects').reset_index()
+    df_history['reportDate'] = pd.to_datetime(df_history['reportDate'], unit='ms')
+    return df_history
+
+
+def stream_completion_timeseries(project_id=None, conn=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming equivalent of the df_pivot frame in improved_charts.py:
+    OK/DEFECT/PENDING per (apartment, category, reportDate) plus cumulative
+    sums, total scope and completion_pct.
+
+    Per-chunk counts are summed (a report may straddle two chunks); the
+    cumulative sums run on the merged counts, which are small.
+    """
+    keys = ['projectId', 'apartment_number', 'category']
+    query = """
+        SELECT a.projectId, a.number as apartment_number, w.category, w.status, r.reportDate
+        FROM WorkItem w
+        JOIN Report r ON w.reportId = r.id
+        JOIN Apartment a ON w.apartmentId = a.id
+        WHERE w.apartmentId IS NOT NULL
+        AND (r.hasErrors = 0 OR r.hasErrors IS NULL)
+    """
+    params = ()
+    if project_id is not None:
+        query += " AND a.projectId = ?"
+        params = (project_id,)
+
+    def run(conn):
+        partial = None
+        for chunk in iter_chunks(conn, query, params, chunksize):
+            chunk = map_states(chunk, 'state')
+            counts = chunk.groupby(keys + ['reportDate', 'state']).size()
+            partial = counts if partial is None else partial.add(counts, fill_value=0)
+        return partial
+
+    partial = _with_connection(conn, run)
+    if partial is None or partial.empty:
+        return pd.DataFrame(columns=keys + ['reportDate', 'OK', 'DEFECT', 'PENDING'])
+
+    df = partial.astype('int64').unstack('state', fill_value=0)
+    df = df.reindex(columns=['OK', 'DEFECT', 'PENDING'], fill_value=0)
+    df.columns.name = None
+    df = df.reset_index().sort_values(keys + ['reportDate'])
+    df['reportDate'] = pd.to_datetime(df['reportDate'], unit='ms')
+
+    grouped = df.groupby(keys)
+    df['cumulative_ok'] = grouped['OK'].cumsum()
+    df['cumulative_defect'] = grouped['DEFECT'].cumsum()
+    df['cumulative_pending'] = grouped['PENDING'].cumsum()
+    df['cumulative_total'] = df['cumulative_ok'] + df['cumulative_defect'] + df['cumulative_pending']
+    df['total_scope'] = df.groupby(keys)['cumulative_total'].transform('max')
+    df['completion_pct'] = (df['cumulative_ok'] / df['total_scope'] * 100).fillna(0)
+    return df.reset_index(drop=True)
+
+
+def stream_apartment_progress(version='v3', project_id=None, conn=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming equivalent of calculate_v3_progress.calculate_apartment_progress
+    (history=False) for every apartment at once: items of each apartment's
+    latest report are scored chunk by chunk and only per-category sums are kept.
+
+    Returns a DataFrame with one row per apartment: overall progress plus
+    the per-category progress as a dict.
+    """
+    from calculate_v3_progress import (
+        CATEGORY_WEIGHTS, calculate_item_progress_v2, calculate_item_progress_v3,
+        has_defect_v2, has_defect_v3,
+    )
+
+    calc_func = calculate_item_progress_v2 if version == 'v2' else calculate_item_progress_v3
+    defect_func = has_defect_v2 if version == 'v2' else has_defect_v3
+
+    query = """
+        WITH latest AS (
+            SELECT w.apartmentId, MAX(r.reportDate) AS reportDate
+            FROM WorkItem w
+            JOIN Report r ON w.reportId = r.id
+            WHERE w.apartmentId IS NOT NULL
+            GROUP BY w.apartmentId
+        )
+        SELECT a.projectId, a.number as apartmentNumber, w.category, w.status, w.notes
+        FROM WorkItem w
+        JOIN Report r ON w.reportId = r.id
+        JOIN Apartment a ON w.apartmentId = a.id
+        JOIN latest l ON l.apartmentId = w.apartmentId AND l.reportDate = r.reportDate
+    """
+    params = ()
+    if project_id is not None:
+        query += " WHERE a.projectId = ?"
+        params = (project_id,)
+
+    def run(conn):
+        details = defaultdict(lambda: {'items': 0, 'defects': 0, 'total_progress': 0})
+        for chunk in iter_chunks(conn, query, params, chunksize):
+            for project, apt, cat, status, notes in chunk.itertuples(index=False):
+                entry = details[(project, apt, cat)]
+                entry['items'] += 1
+                entry['total_progress'] += calc_func(status, notes, is_first_time=False)
+                entry['defects'] += int(defect_func(status, notes))
+        return details
+
+    details = _with_connection(conn, run)
+
+    apartments = defaultdict(dict)
+    defects = Counter()
+    for (project, apt, cat), entry in details.items():
+        apartments[(project, apt)][cat] = round(entry['total_progress'] / entry['items'])
+        defects[(project, apt)] += entry['defects']
+
+    rows = []
+    for (project, apt), by_category in apartments.items():
+        weights = {cat: CATEGORY_WEIGHTS.get(cat, 0.8) for cat in by_category}
+        total_weight = sum(weights.values())
+        overall = round(sum(p * weights[cat] for cat, p in by_category.items()) / total_weight) if total_weight > 0 else 0
+        rows.append({
+            'projectId': project,
+            'apartmentNumber': apt,
+            'overall': overall,
+            'defects': defects[(project, apt)],
+            'by_category': by_category,
+        })
+
+    return pd.DataFrame(rows, columns=['projectId', 'apartmentNumber', 'overall', 'defects', 'by_category'])
@@ -0,0 +1,143 @@
+"""
+Test fixtures: a small dev.db built from the Prisma migrations, in a
+temporary directory CONSTRUCTOR_DB_PATH points at. It is set before any
+Explore_Data module is imported, since explore_db reads it at import time;
+the side files the scripts keep next to dev.db land in the same directory.
+"""
+
+import glob
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EXPLORE_DATA = os.path.dirname(HERE)
+MIGRATIONS = os.path.join(os.path.dirname(EXPLORE_DATA), 'prisma', 'migrations')
+
+DB_DIR = tempfile.mkdtemp(prefix='explore_data_tests_')
+DB_PATH = os.path.join(DB_DIR, 'dev.db')
+
+os.environ['CONSTRUCTOR_DB_PATH'] = DB_PATH
+sys.path.insert(0, EXPLORE_DATA)
+
+PROJECTS = ('p1', 'p2')
+# Both projects have the same apartment numbers
+APARTMENTS = ('1', '3', '7', '11')
+REPORTS_PER_PROJECT = 6
+FIRST_REPORT_MS = 1730592000000  # 2024-11-03 UTC
+DAY_MS = 86400000
+NOW_MS = 1760000000000
+
+# (Hebrew category in the PDF, category processReport stores)
+CATEGORIES = [
+    ('חשמל', 'ELECTRICAL'), ('אינסטלציה', 'PLUMBING'), ('מיזוג', 'AC'),
+    ('ריצוף', 'FLOORING'), ('צביעה', 'PAINTING'), ('כללי', 'OTHER'),
+]
+# (Hebrew status in the PDF, status processReport stores)
+STATUSES = [
+    ('בוצע', 'COMPLETED'), ('בוצע - תקין', 'COMPLETED_OK'), ('ליקוי', 'DEFECT'),
+    ('ממתין', 'PENDING'), ('בביצוע', 'IN_PROGRESS'), ('טופל', 'HANDLED'),
+]
+
+
+def report_date(index):
+    return FIRST_REPORT_MS + index * 20 * DAY_MS
+
+
+def insert_report(conn, project, index, rng, updated_at=NOW_MS):
+    """
+    Report `index` of a project, with one WorkItem per category for each of
+    its apartments and the matching rawExtraction.
+    """
+    report_id = f'{project}_r{index}'
+    day = time.strftime('%Y-%m-%d', time.gmtime(report_date(index) / 1000))
+    apartments, items = [], []
+    for number in APARTMENTS:
+        extracted = []
+        for k, (hebrew_category, category) in enumerate(CATEGORIES):
+            hebrew_status, status = rng.choice(STATUSES)
+            location = f'room {k % 3}'
+            extracted.append({'category': hebrew_category, 'location': location,
+                              'description': f'item {k}', 'status': hebrew_status})
+            items.append((f'{report_id}_a{number}_w{k}', report_id, f'{project}_a{number}', category,
+                          location, f'item {k}', status, updated_at, updated_at))
+        apartments.append({'apartmentNumber': number, 'workItems': extracted})
+    conn.execute("""
+        INSERT INTO Report (id, projectId, reportDate, fileName, filePath, fileHash, rawExtraction,
+                            processed, hasErrors, hasWarnings, createdAt, updatedAt)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1, 0, 0, ?, ?)
+    """, (report_id, project, report_date(index), f'{day} - {project}.pdf', f'{day} - {project}.pdf',
+          f'hash_{report_id}', json.dumps({'apartments': apartments}, ensure_ascii=False),
+          updated_at, updated_at))
+    conn.executemany("""
+        INSERT INTO WorkItem (id, reportId, apartmentId, category, location, description,
+                              status, hasPhoto, createdAt, updatedAt)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+    """, items)
+    return report_id
+
+
+def build_db(path):
+    """dev.db with PROJECTS x APARTMENTS and REPORTS_PER_PROJECT reports of one item per category each."""
+    conn = sqlite3.connect(path)
+    for migration in sorted(glob.glob(os.path.join(MIGRATIONS, '*', 'migration.sql'))):
+        with open(migration, encoding='utf-8') as f:
+            conn.executescript(f.read())
+
+    rng = random.Random(1)
+    for project in PROJECTS:
+        conn.execute("INSERT INTO Project (id, name, address, createdAt, updatedAt) VALUES (?, ?, '', ?, ?)",
+                     (project, project, NOW_MS, NOW_MS))
+        for number in APARTMENTS:
+            conn.execute("INSERT INTO Apartment (id, projectId, number, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?)",
+                         (f'{project}_a{number}', project, number, NOW_MS, NOW_MS))
+        for index in range(REPORTS_PER_PROJECT):
+            insert_report(conn, project, index, rng)
+    conn.commit()
+    conn.close()
+
+
+def _reset_caches():
+    """Forgets what the imported modules cached about the previous test's DB."""
+    memo = sys.modules.get('memo')
+    if memo is not None:
+        for memoized in memo._registry:
+            memoized.memory.clear()
+    extraction_store = sys.modules.get('extraction_store')
+    if extraction_store is not None:
+        extraction_store._dicts.clear()
+    report_catalog = sys.modules.get('report_catalog')
+    if report_catalog is not None:
+        report_catalog._catalogs.clear()
+    renormalize = sys.modules.get('renormalize')
+    if renormalize is not None:
+        renormalize._parse_cache.clear()
+
+
+@pytest.fixture(scope='session')
+def template_db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('template') / 'dev.db')
+    build_db(path)
+    yield path
+    shutil.rmtree(DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def db(template_db):
+    """A fresh copy of the fixture dev.db at DB_PATH, with nothing else next to it."""
+    for name in os.listdir(DB_DIR):
+        path = os.path.join(DB_DIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    _reset_caches()
+    shutil.copyfile(template_db, DB_PATH)
+    return DB_PATH
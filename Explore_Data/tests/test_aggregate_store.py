@@ -0,0 +1,36 @@
+import random
+import sqlite3
+
+import aggregate_store
+from conftest import NOW_MS, insert_report
+
+
+def test_synced_store_matches_full_recomputation(db):
+    conn = aggregate_store.connect()
+    assert aggregate_store.sync(conn) == (12, 0)
+    assert aggregate_store.verify(conn) == []
+    assert aggregate_store.sync(conn) == (0, 0)
+
+
+def test_sync_follows_new_changed_and_deleted_reports(db):
+    conn = aggregate_store.connect()
+    aggregate_store.sync(conn)
+
+    live = sqlite3.connect(db)
+    insert_report(live, 'p1', 6, random.Random(2))
+    live.execute("UPDATE WorkItem SET status = 'DEFECT' WHERE reportId = 'p2_r3'")
+    live.execute("UPDATE Report SET updatedAt = ? WHERE id = 'p2_r3'", (NOW_MS + 1,))
+    live.execute("DELETE FROM WorkItem WHERE reportId = 'p2_r5'")
+    live.execute("DELETE FROM Report WHERE id = 'p2_r5'")
+    live.commit()
+
+    assert aggregate_store.sync(conn) == (2, 1)
+    assert aggregate_store.verify(conn) == []
+
+
+def test_aggregate_paths_match_the_recomputation(db):
+    from defect_history_chart import get_defect_history
+    from progress_visualization import get_readiness_data
+
+    assert get_readiness_data(aggregates=True).equals(get_readiness_data())
+    assert get_defect_history('7', 'p1', aggregates=True)[1].equals(get_defect_history('7', 'p1')[1])
@@ -0,0 +1,27 @@
+import asyncio
+from datetime import datetime
+
+from audit_runner import check_date
+
+
+def _local_midnight_ms(year, month, day):
+    return int(datetime(year, month, day).timestamp() * 1000)
+
+
+def _check(file_name, report_date):
+    return asyncio.run(check_date(None, {'fileName': file_name, 'reportDate': report_date}))
+
+
+def test_iso_file_name_date_matches_utc_midnight():
+    assert _check('2025-01-05 - p1.pdf', 1736035200000) == []
+
+
+def test_dmy_file_name_date_may_sit_a_day_early_in_utc():
+    # The upload route stores DD.MM.YY dates at local midnight (UTC+2/+3 in production)
+    assert _check('report 18.9.23.pdf', 1694984400000) == []
+    assert _check('report 18.9.23.pdf', _local_midnight_ms(2023, 9, 18)) == []
+
+
+def test_other_dates_are_reported():
+    assert _check('2025-01-05 - p1.pdf', 1736035200000 + 2 * 86400000)[0][0] == 'warning'
+    assert _check('no date.pdf', 1736035200000) == [('warning', "no date in the file name")]
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from bulk_reimport import parse_date
+
+
+def _local_midnight_ms(year, month, day):
+    return int(datetime(year, month, day).timestamp() * 1000)
+
+
+def test_dmy_dates_are_local_midnight():
+    assert parse_date('3.11.24') == _local_midnight_ms(2024, 11, 3)
+    assert parse_date('03.11.2024') == _local_midnight_ms(2024, 11, 3)
+
+
+def test_out_of_range_dmy_dates_roll_over_like_js():
+    assert parse_date('31.2.25') == _local_midnight_ms(2025, 3, 3)
+    assert parse_date('0.1.25') == _local_midnight_ms(2024, 12, 31)
+    assert parse_date('1.13.24') == _local_midnight_ms(2025, 1, 1)
+
+
+def test_non_dates():
+    assert parse_date('תקין') is None
+    assert parse_date('') is None
+    assert parse_date(None) is None
+    assert parse_date('2025-01-05') == 1736035200000
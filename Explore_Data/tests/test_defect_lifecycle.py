@@ -0,0 +1,46 @@
+import random
+import sqlite3
+
+import defect_lifecycle
+from conftest import APARTMENTS, NOW_MS, insert_report
+
+KEY = defect_lifecycle.ITEM_KEY + ['episode']
+
+
+def _sorted(intervals):
+    return intervals[defect_lifecycle.INTERVAL_COLUMNS].sort_values(KEY).reset_index(drop=True)
+
+
+def test_update_extends_only_apartments_with_new_reports(db):
+    conn = defect_lifecycle.connect()
+    defect_lifecycle.update(conn)
+    assert defect_lifecycle.update(conn) == (set(), set())
+
+    # A stored ledger reads updatedAt back as an integer; it must still match
+    live = sqlite3.connect(db)
+    insert_report(live, 'p1', 6, random.Random(2))
+    live.commit()
+    extended, rebuilt = defect_lifecycle.update(conn)
+    assert extended == {f'p1_a{n}' for n in APARTMENTS}
+    assert rebuilt == set()
+
+    expected, _ = defect_lifecycle.compute_intervals(conn)
+    stored, _ = defect_lifecycle.load_intervals(conn)
+    assert _sorted(stored).equals(_sorted(expected))
+
+
+def test_update_rebuilds_apartments_of_a_changed_report(db):
+    conn = defect_lifecycle.connect()
+    defect_lifecycle.update(conn)
+
+    live = sqlite3.connect(db)
+    live.execute("UPDATE WorkItem SET status = 'DEFECT' WHERE reportId = 'p2_r2'")
+    live.execute("UPDATE Report SET updatedAt = ? WHERE id = 'p2_r2'", (NOW_MS + 1,))
+    live.commit()
+    extended, rebuilt = defect_lifecycle.update(conn)
+    assert extended == set()
+    assert rebuilt == {f'p2_a{n}' for n in APARTMENTS}
+
+    expected, _ = defect_lifecycle.compute_intervals(conn)
+    stored, _ = defect_lifecycle.load_intervals(conn)
+    assert _sorted(stored).equals(_sorted(expected))
@@ -0,0 +1,96 @@
+import json
+import sqlite3
+
+import pytest
+
+import extraction_store
+from conftest import NOW_MS
+from explore_db import get_live_connection
+
+REPORTS = 12
+
+
+def _column(db, report_id='p1_r0'):
+    return sqlite3.connect(db).execute("SELECT rawExtraction FROM Report WHERE id = ?", (report_id,)).fetchone()[0]
+
+
+def _read(report_id='p1_r0'):
+    conn = extraction_store.connect()
+    try:
+        return extraction_store.read_field(conn, report_id, 'rawExtraction')
+    finally:
+        conn.close()
+
+
+def _blobs(conn):
+    return conn.execute("SELECT COUNT(*) FROM agg.ReportBlob WHERE field = 'rawExtraction'").fetchone()[0]
+
+
+def test_migrate_prune_round_trip(db):
+    original = _column(db)
+    summary = extraction_store.migrate(fields=('rawExtraction',)).set_index('field')
+    assert summary.loc['rawExtraction', 'stored'] == REPORTS
+    assert extraction_store.migrate(fields=('rawExtraction',))['stored'].sum() == 0
+
+    pruned = extraction_store.prune(fields=('rawExtraction',)).set_index('field')
+    assert pruned.loc['rawExtraction', 'pruned'] == REPORTS
+    assert _column(db) is None
+    assert _read() == original
+
+    # Migrating again keeps the pruned copies: they are the only ones left
+    assert extraction_store.migrate(fields=('rawExtraction',))['stored'].sum() == 0
+    assert _read() == original
+    conn = extraction_store.connect()
+    stats = extraction_store.storage_stats(conn).set_index('field').loc['rawExtraction']
+    assert (stats['reports'], stats['fresh'], stats['pruned']) == (REPORTS, REPORTS, REPORTS)
+    conn.close()
+
+
+def test_app_write_after_prune_replaces_the_copy(db):
+    extraction_store.migrate(fields=('rawExtraction',))
+    extraction_store.prune(fields=('rawExtraction',))
+
+    rewritten = json.dumps({'apartments': []})
+    live = sqlite3.connect(db)
+    live.execute("UPDATE Report SET rawExtraction = ?, updatedAt = ? WHERE id = 'p1_r0'", (rewritten, NOW_MS + 1))
+    live.commit()
+    assert _read() == rewritten
+
+    extraction_store.migrate(fields=('rawExtraction',))
+    conn = extraction_store.attach_store(get_live_connection())
+    assert conn.execute("SELECT COUNT(*) FROM agg.PrunedField WHERE reportId = 'p1_r0'").fetchone()[0] == 0
+    assert _blobs(conn) == REPORTS
+    conn.close()
+    assert _read() == rewritten
+
+
+def test_migrate_ignores_a_replica_taken_before_prune(db):
+    import replica
+
+    original = _column(db)
+    extraction_store.migrate()
+    replica.refresh()
+    extraction_store.prune()
+    # The replica still has the pruned columns until its next refresh
+    assert sqlite3.connect(replica.REPLICA_PATH).execute(
+        "SELECT rawExtraction FROM Report WHERE id = 'p1_r0'"
+    ).fetchone()[0] == original
+    extraction_store.migrate()
+    replica.refresh()
+    extraction_store.migrate()
+
+    assert _column(db) is None
+    conn = extraction_store.attach_store(get_live_connection())
+    assert _blobs(conn) == REPORTS
+    conn.close()
+    assert _read() == original
+
+
+def test_migrate_refuses_the_replica(db):
+    import replica
+
+    replica.refresh()
+    conn = extraction_store.connect()
+    with pytest.raises(ValueError):
+        extraction_store.migrate(conn)
+    conn.close()
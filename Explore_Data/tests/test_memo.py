@@ -0,0 +1,27 @@
+import sqlite3
+
+import progress_visualization
+
+
+def test_failed_readiness_read_is_not_cached(db, monkeypatch, capsys):
+    def fail(*args, **kwargs):
+        raise OSError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(progress_visualization, 'load_work_items', fail)
+        assert progress_visualization.get_readiness_data().empty
+    assert 'database is locked' in capsys.readouterr().out
+
+    assert not progress_visualization.get_readiness_data().empty
+
+
+def test_readiness_is_cached_until_the_db_changes(db):
+    first = progress_visualization.get_readiness_data('p1')
+    assert progress_visualization.get_readiness_data('p1').equals(first)
+    info = progress_visualization._readiness_data.cache_info()
+    assert info['hits'] + info['diskHits'] >= 1
+
+    live = sqlite3.connect(db)
+    live.execute("UPDATE WorkItem SET status = 'DEFECT' WHERE reportId = 'p1_r5'")
+    live.commit()
+    assert progress_visualization.get_readiness_data('p1')['DEFECT'].sum() > first['DEFECT'].sum()
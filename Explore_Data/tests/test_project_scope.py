@@ -0,0 +1,35 @@
+import sqlite3
+
+import pytest
+
+from conftest import APARTMENTS
+from explore_db import apartment_projects, check_unambiguous
+
+
+def test_apartment_numbers_repeat_across_projects(db):
+    conn = sqlite3.connect(db)
+    assert sorted(apartment_projects(conn, 7)) == ['p1', 'p2']
+    with pytest.raises(ValueError):
+        check_unambiguous(7, apartment_projects(conn, 7))
+    check_unambiguous(7, ['p1'])
+
+
+def test_defect_history_needs_a_project_for_shared_numbers(db):
+    from defect_history_chart import get_defect_history
+
+    with pytest.raises(ValueError):
+        get_defect_history('7')
+    _, history = get_defect_history('7', 'p1')
+    assert not history.empty
+
+
+def test_readiness_index(db):
+    from progress_visualization import get_readiness_data
+
+    both = get_readiness_data()
+    assert list(both.index.names) == ['projectId', 'apartmentNumber']
+    assert len(both) == 2 * len(APARTMENTS)
+
+    one = get_readiness_data('p1')
+    assert list(one.index.names) == ['apartmentNumber']
+    assert sorted(one.index) == sorted(APARTMENTS)
@@ -0,0 +1,123 @@
+"""
+renormalize.Rules against src/lib/report-processing.ts: the same maps and
+keyword lists, in the same order, and the same answers as a line-by-line
+port of normalizeStatus / normalizeCategory.
+"""
+
+import os
+import re
+import sqlite3
+
+import pytest
+
+from conftest import EXPLORE_DATA
+from renormalize import (
+    CATEGORY_KEYWORDS, DEFECT_KEYWORDS, HEBREW_CATEGORY_MAP, HEBREW_STATUS_MAP, PARTIAL_KEYWORDS, Rules, renormalize,
+)
+
+REPORT_PROCESSING = os.path.join(os.path.dirname(EXPLORE_DATA), 'src', 'lib', 'report-processing.ts')
+
+
+def _ts_source():
+    with open(REPORT_PROCESSING, encoding='utf-8') as f:
+        return f.read()
+
+
+def _strings(text):
+    return re.findall(r"'([^']*)'", re.sub(r'//.*', '', text))
+
+
+def _ts_map(name):
+    body = re.search(rf"const {name}[^=]*= \{{(.*?)\n\}};", _ts_source(), re.S).group(1)
+    pairs = re.findall(r"'([^']*)':\s*'([^']*)'", re.sub(r'//.*', '', body))
+    return dict(pairs)
+
+
+def _ts_list(name):
+    return _strings(re.search(rf"const {name} = \[(.*?)\];", _ts_source(), re.S).group(1))
+
+
+def _ts_keywords():
+    body = re.search(r"const CATEGORY_KEYWORDS[^=]*= \{(.*?)\n\};", _ts_source(), re.S).group(1)
+    return {cat: _strings(words) for cat, words in re.findall(r"'(\w+)':\s*\[(.*?)\]", body)}
+
+
+def test_maps_and_keywords_match_report_processing():
+    assert list(HEBREW_STATUS_MAP.items()) == list(_ts_map('hebrewStatusMap').items())
+    assert list(HEBREW_CATEGORY_MAP.items()) == list(_ts_map('hebrewCategoryMap').items())
+    assert list(CATEGORY_KEYWORDS.items()) == list(_ts_keywords().items())
+    assert DEFECT_KEYWORDS == _ts_list('DEFECT_KEYWORDS')
+    assert PARTIAL_KEYWORDS == _ts_list('PARTIAL_KEYWORDS')
+
+
+def normalize_status(status, notes=None):
+    trimmed = status.strip().lower()
+    combined = ' '.join(s for s in (status, notes) if s).lower()
+    for keyword in DEFECT_KEYWORDS:
+        if keyword.lower() in combined:
+            return 'DEFECT'
+    for keyword in PARTIAL_KEYWORDS:
+        if keyword.lower() in trimmed:
+            return 'IN_PROGRESS'
+    if HEBREW_STATUS_MAP.get(status.strip()):
+        return HEBREW_STATUS_MAP[status.strip()]
+    for hebrew, value in sorted(HEBREW_STATUS_MAP.items(), key=lambda kv: -len(kv[0])):
+        if hebrew.lower() in trimmed:
+            return value
+    return 'IN_PROGRESS'
+
+
+def normalize_category(category, description=''):
+    trimmed = category.strip()
+    normalized = 'OTHER'
+    if HEBREW_CATEGORY_MAP.get(trimmed):
+        normalized = HEBREW_CATEGORY_MAP[trimmed]
+    else:
+        for hebrew, value in HEBREW_CATEGORY_MAP.items():
+            if hebrew in trimmed:
+                normalized = value
+                break
+    if normalized == 'OTHER' and description:
+        for value, keywords in CATEGORY_KEYWORDS.items():
+            for keyword in keywords:
+                if keyword.lower() in description.lower():
+                    return value
+    return normalized
+
+
+STATUS_SAMPLES = [
+    *HEBREW_STATUS_MAP, *DEFECT_KEYWORDS, *PARTIAL_KEYWORDS, '', '  בוצע  ', 'בוצע בחלקו', 'הושלם - טופל',
+    'לא התחיל עדיין', 'ממתין לטיפול', 'טופל ותוקן', 'unknown',
+]
+NOTES_SAMPLES = [None, '', 'הכל תקין', 'נמצא סדוק', 'VRF']
+CATEGORY_SAMPLES = [*HEBREW_CATEGORY_MAP, '', ' חשמל ', 'עבודות חשמל', 'מיזוג אויר מרכזי', 'כיבוי אש וגילוי',
+                    'שונות', 'דלת כניסה ראשית']
+DESCRIPTION_SAMPLES = ['', 'החלפת שקע', 'צנרת גז למזגן', 'vrf unit', 'ארונות מטבח', 'ניקיון']
+
+
+@pytest.mark.parametrize('status', STATUS_SAMPLES)
+def test_status_rules_match_report_processing(status):
+    rules = Rules()
+    for notes in NOTES_SAMPLES:
+        assert rules.normalize_status(status, notes) == normalize_status(status, notes)
+
+
+@pytest.mark.parametrize('category', CATEGORY_SAMPLES)
+def test_category_rules_match_report_processing(category):
+    rules = Rules()
+    for description in DESCRIPTION_SAMPLES:
+        assert rules.normalize_category(category, description) == normalize_category(category, description)
+
+
+def test_fixture_history_renormalizes_unchanged(db):
+    result = renormalize()
+    assert result['changed'].empty
+    assert result['unmatched_extracted'].empty
+    assert result['unmatched_stored'].empty
+
+
+def test_rule_change_shows_the_affected_items(db):
+    import sqlite3
+    handled = sqlite3.connect(db).execute("SELECT COUNT(*) FROM WorkItem WHERE status = 'HANDLED'").fetchone()[0]
+    result = renormalize(rules=Rules(status_map={**HEBREW_STATUS_MAP, 'טופל': 'COMPLETED'}))
+    assert len(result['changed']) == handled > 0
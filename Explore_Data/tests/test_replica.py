@@ -0,0 +1,32 @@
+import sqlite3
+
+import pytest
+
+import replica
+
+
+class SteadyWriter:
+    """A source whose copy restarts at the same remaining count after every step."""
+
+    def __init__(self):
+        self.steps = 0
+
+    def backup(self, target, pages, sleep, progress):
+        for _ in range(100):
+            self.steps += 1
+            progress(sqlite3.SQLITE_OK, 56, 61)
+
+
+def test_restart_at_the_same_remaining_counts():
+    source = SteadyWriter()
+    with pytest.raises(replica._Restarted):
+        replica._stepped_backup(source, None, 5, 0)
+    assert source.steps == replica.MAX_RESTARTS + 1
+
+
+def test_refresh_copies_the_live_db(db):
+    info = replica.refresh()
+    assert info is not None and replica.is_current()
+    assert replica.refresh() is None
+    count = sqlite3.connect(replica.REPLICA_PATH).execute("SELECT COUNT(*) FROM WorkItem").fetchone()[0]
+    assert count == sqlite3.connect(db).execute("SELECT COUNT(*) FROM WorkItem").fetchone()[0]
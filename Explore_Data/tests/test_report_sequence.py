@@ -0,0 +1,53 @@
+import random
+import sqlite3
+
+import pandas as pd
+
+import report_diff
+from conftest import APARTMENTS, NOW_MS, insert_report
+from report_sequence import plan_update
+
+COMPARED = ['apartmentId', 'seq', 'reportId', 'items', 'unchanged', *report_diff.CHANGES]
+
+
+def _ledger(rows):
+    return pd.DataFrame(rows, columns=['apartmentId', 'seq', 'reportId', 'reportDate', 'updatedAt'])
+
+
+def test_plan_update_compares_updated_at_as_numbers():
+    current = _ledger([('a', 0, 'r0', 1, NOW_MS), ('a', 1, 'r1', 2, NOW_MS), ('b', 0, 'r0', 1, NOW_MS)])
+    stored = _ledger([('a', 0, 'r0', 1, NOW_MS), ('b', 0, 'r0', 1, NOW_MS)])
+    extended, rebuilt, work = plan_update(current, stored)
+    assert extended == {'a'}
+    assert rebuilt == set()
+    assert work[['apartmentId', 'seq']].values.tolist() == [['a', 1]]
+
+
+def test_plan_update_rebuilds_changed_and_removed_reports():
+    current = _ledger([('a', 0, 'r0', 1, NOW_MS + 1), ('b', 0, 'r0', 1, None), ('c', 0, 'r0', 1, None)])
+    stored = _ledger([('a', 0, 'r0', 1, NOW_MS), ('b', 0, 'r0', 1, None), ('c', 0, 'r0', 1, NOW_MS),
+                      ('c', 1, 'r1', 2, NOW_MS)])
+    extended, rebuilt, work = plan_update(current, stored)
+    assert extended == set()
+    assert rebuilt == {'a', 'c'}
+    assert sorted(work['apartmentId']) == ['a', 'c']
+
+
+def _summary(summary):
+    return summary[COMPARED].sort_values(['apartmentId', 'seq']).astype(str).reset_index(drop=True)
+
+
+def test_report_diff_update_only_diffs_new_reports(db):
+    conn = report_diff.connect()
+    report_diff.update(conn)
+    assert report_diff.update(conn) == (set(), set())
+
+    live = sqlite3.connect(db)
+    insert_report(live, 'p2', 6, random.Random(2))
+    live.commit()
+    extended, rebuilt = report_diff.update(conn)
+    assert extended == {f'p2_a{n}' for n in APARTMENTS}
+    assert rebuilt == set()
+
+    _, expected = report_diff.compute_diffs(conn)
+    assert _summary(report_diff.load_summary(conn)).equals(_summary(expected))
@@ -0,0 +1,15 @@
+"""The check_startup.py budgets, as tests: quick explore.py commands stay fast and light."""
+
+import pytest
+
+import check_startup
+
+
+@pytest.mark.parametrize('args', list(check_startup.BUDGETS), ids=lambda args: ' '.join(args) or 'usage')
+def test_quick_command_imports_no_heavy_module(db, args):
+    assert check_startup.heavy_imports(args) == []
+
+
+@pytest.mark.parametrize('args', list(check_startup.BUDGETS), ids=lambda args: ' '.join(args) or 'usage')
+def test_quick_command_within_budget(db, args):
+    assert check_startup.time_command(args) <= check_startup.BUDGETS[args]
@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+import status_summary
+from status_summary import SUMMARY_TABLE, TRIGGERS
+
+
+@pytest.fixture
+def conn(db):
+    conn = sqlite3.connect(db)
+    status_summary.install(conn)
+    yield conn
+    conn.close()
+
+
+def _counts(conn):
+    return status_summary.status_counts(conn, by=('projectId', 'status'))
+
+
+def test_installed_summary_matches_work_items(conn):
+    assert status_summary.is_installed(conn)
+    assert status_summary.partial_install(conn) is None
+    assert status_summary.check(conn).empty
+    installed = _counts(conn)
+    status_summary.uninstall(conn)
+    assert not status_summary.is_installed(conn)
+    assert _counts(conn).equals(installed)
+
+
+def test_dropped_table_with_triggers_left_is_detected(conn):
+    expected = _counts(conn)
+    # What `prisma db push` does when told to drop the unknown table
+    conn.execute(f"DROP TABLE {SUMMARY_TABLE}")
+    assert not status_summary.is_installed(conn)
+    assert 'triggers remain' in status_summary.partial_install(conn)
+    assert _counts(conn).equals(expected)
+
+
+def test_table_without_triggers_is_detected(conn):
+    # What a push that redefines WorkItem leaves behind
+    for name in TRIGGERS:
+        conn.execute(f"DROP TRIGGER {name}")
+    conn.execute("UPDATE WorkItem SET status = 'DEFECT' WHERE reportId = 'p1_r0'")
+    assert not status_summary.is_installed(conn)
+    assert 'stale' in status_summary.partial_install(conn)
+    assert not status_summary.check(conn).empty
+    counts = _counts(conn)
+    defects = counts[(counts['projectId'] == 'p1') & (counts['status'] == 'DEFECT')]['count'].item()
+    assert defects == conn.execute(
+        "SELECT COUNT(*) FROM WorkItem w JOIN Report r ON w.reportId = r.id "
+        "WHERE r.projectId = 'p1' AND w.status = 'DEFECT'"
+    ).fetchone()[0]
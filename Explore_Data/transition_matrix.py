@@ -0,0 +1,294 @@
+"""
+Status Transition Matrix
+How often items move between statuses (COMPLETED -> DEFECT, DEFECT ->
+HANDLED, ...) from one report to the next, per category, apartment or
+contractor period.
+
+The history is encoded once as a sparse items x reports matrix in COO
+form: three parallel arrays (item row, report column, int8 status code),
+sorted by (row, column). An item is (apartment, category, normalized
+description); a column is the apartment's report seq, with the report
+dates kept in a small (apartments x seq) array. Status code 0 means the
+item is not in that report (ABSENT).
+
+Transitions are consecutive entries of the same row in adjacent columns,
+found with one shifted comparison of the arrays; dwell times are runs of
+equal codes. select() slices by category, apartment, project and date
+window on the arrays alone, without re-reading the DB.
+
+Usage:
+    python transition_matrix.py [category]
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from explore_db import STATUS_MAP, get_db_connection
+from report_diff import normalize_text
+from report_sequence import get_apartment_reports, load_items
+from work_items import WORK_STATUSES
+
+ABSENT = 'ABSENT'
+
+
+class StatusHistory:
+    """
+    Sparse (item x report) status matrix.
+
+    rows, cols, codes: COO arrays sorted by (row, col); codes index statuses.
+    items: one row per item (apartment, projectId, apartmentNumber, category,
+    description, apt_index). report_dates: datetime64 array of shape
+    (apartments, max seq + 1), NaT past an apartment's last report.
+    """
+
+    def __init__(self, rows, cols, codes, items, report_dates, statuses, start=None, end=None):
+        self.rows = rows
+        self.cols = cols
+        self.codes = codes
+        self.items = items
+        self.report_dates = report_dates
+        self.statuses = statuses
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_db(cls, conn=None, project_id=None):
+        """Reads the item history (reports without errors) into the sparse form."""
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        try:
+            reports = get_apartment_reports(conn, project_id)
+            items = load_items(conn, reports, ('id', 'category', 'description', 'status'))
+        finally:
+            if own_conn:
+                conn.close()
+        return cls.from_frames(items, reports)
+
+    @classmethod
+    def from_frames(cls, items, reports):
+        """Builds the matrix from report_sequence frames (items need category, description, status, seq)."""
+        items = items.assign(description_key=normalize_text(items['description']))
+        # An item listed twice in one report keeps its first row
+        items = items.sort_values(['apartmentId', 'seq', 'id']).drop_duplicates(
+            ['apartmentId', 'category', 'description_key', 'seq']
+        )
+
+        seen = pd.unique(items['status'].dropna())
+        statuses = [ABSENT] + WORK_STATUSES + sorted(s for s in seen if s not in WORK_STATUSES)
+        codes = pd.Categorical(items['status'], categories=statuses).codes.astype(np.int8)
+
+        apartments, apt_index = np.unique(reports['apartmentId'].to_numpy(dtype=str), return_inverse=True)
+        report_dates = np.full((len(apartments), reports['seq'].max() + 1 if len(reports) else 0),
+                               np.datetime64('NaT'), dtype='datetime64[ms]')
+        report_dates[apt_index, reports['seq'].to_numpy()] = pd.to_datetime(
+            reports['reportDate'], unit='ms').to_numpy(dtype='datetime64[ms]')
+
+        keys = ['apartmentId', 'category', 'description_key']
+        rows = items.groupby(keys, sort=True).ngroup().to_numpy(dtype=np.int32)
+        catalog = (
+            items.assign(row=rows)
+            .groupby('row')[['apartmentId', 'projectId', 'apartmentNumber', 'category', 'description']]
+            .first()
+            .reset_index(drop=True)
+        )
+        catalog['apt_index'] = np.searchsorted(apartments, catalog['apartmentId'].to_numpy(dtype=str))
+
+        cols = items['seq'].to_numpy(dtype=np.int32)
+        order = np.lexsort((cols, rows))
+        return cls(rows[order], cols[order], codes[order], catalog, report_dates, statuses)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _entry_dates(self, rows, cols):
+        return self.report_dates[self.items['apt_index'].to_numpy()[rows], cols]
+
+    def select(self, category=None, apartment=None, project_id=None, start=None, end=None):
+        """
+        A view restricted to some categories / apartment numbers / a project
+        and a report date window (inclusive). Works on the arrays only.
+        """
+        keep_items = np.ones(len(self.items), dtype=bool)
+        for column, value in (('category', category), ('apartmentNumber', apartment), ('projectId', project_id)):
+            if value is not None:
+                values = [value] if isinstance(value, str) else list(value)
+                keep_items &= self.items[column].isin([str(v) for v in values]).to_numpy()
+
+        start = pd.Timestamp(start).to_datetime64() if start is not None else self.start
+        end = pd.Timestamp(end).to_datetime64() if end is not None else self.end
+        keep = keep_items[self.rows]
+        dates = self._entry_dates(self.rows, self.cols)
+        if start is not None:
+            keep &= dates >= start
+        if end is not None:
+            keep &= dates <= end
+        return StatusHistory(self.rows[keep], self.cols[keep], self.codes[keep], self.items,
+                             self.report_dates, self.statuses, start, end)
+
+    def to_dense(self):
+        """Dense (items x report seq) int8 matrix; 0 where the item is absent."""
+        dense = np.zeros((len(self.items), self.report_dates.shape[1]), dtype=np.int8)
+        dense[self.rows, self.cols] = self.codes
+        return dense
+
+    def _in_window(self, rows, cols):
+        """Whether (row, col) is a report of the item's apartment inside the window."""
+        inside = cols < self.report_dates.shape[1]
+        dates = np.full(len(rows), np.datetime64('NaT'), dtype='datetime64[ms]')
+        dates[inside] = self._entry_dates(rows[inside], cols[inside])
+        inside &= ~np.isnat(dates)
+        if self.start is not None:
+            inside &= dates >= self.start
+        if self.end is not None:
+            inside &= dates <= self.end
+        return inside
+
+    def transitions(self, include_absent=False):
+        """
+        One row per transition between adjacent reports: row, col (of the
+        later report), from and to codes. With include_absent, an item
+        missing from the apartment's next report (inside the window)
+        transitions to ABSENT, and an item coming back transitions from it.
+        """
+        rows, cols, codes = self.rows, self.cols, self.codes
+        same = (rows[1:] == rows[:-1]) & (cols[1:] == cols[:-1] + 1)
+        frames = [(rows[1:][same], cols[1:][same], codes[:-1][same], codes[1:][same])]
+
+        if include_absent:
+            # An entry with no entry in the next column: gone from that report
+            followed = np.zeros(len(rows), dtype=bool)
+            followed[:-1] = same
+            gone = ~followed & self._in_window(rows, cols + 1)
+            frames.append((rows[gone], cols[gone] + 1, codes[gone], np.zeros(gone.sum(), dtype=np.int8)))
+
+            # An entry after a gap in its row: back after being absent
+            back = np.zeros(len(rows), dtype=bool)
+            back[1:] = (rows[1:] == rows[:-1]) & (cols[1:] > cols[:-1] + 1)
+            frames.append((rows[back], cols[back], np.zeros(back.sum(), dtype=np.int8), codes[back]))
+
+        return pd.DataFrame({
+            'row': np.concatenate([f[0] for f in frames]),
+            'col': np.concatenate([f[1] for f in frames]),
+            'from': np.concatenate([f[2] for f in frames]),
+            'to': np.concatenate([f[3] for f in frames]),
+        })
+
+    def _grouped(self, transitions, by=None, period=None):
+        """Adds the group columns (item columns and/or the later report's period)."""
+        by = [by] if isinstance(by, str) else list(by or [])
+        group = transitions.join(self.items[by], on='row') if by else transitions
+        if period is not None:
+            dates = self._entry_dates(transitions['row'].to_numpy(), transitions['col'].to_numpy())
+            group = group.assign(period=pd.PeriodIndex(dates, freq=period))
+            by = by + ['period']
+        return group, by
+
+    def transition_counts(self, by=None, period=None, include_absent=False):
+        """
+        Transition counts as a from x to matrix, or a long frame
+        (by..., from, to, count, probability) when grouped by item columns
+        (category, apartmentNumber, projectId) and/or a pandas period
+        frequency of the later report date (e.g. 'Q' for quarters).
+        """
+        group, by = self._grouped(self.transitions(include_absent), by, period)
+        labels = np.array(self.statuses)
+        group = group.assign(**{'from': labels[group['from']], 'to': labels[group['to']]})
+        if not by:
+            matrix = pd.crosstab(group['from'], group['to'])
+            order = [s for s in self.statuses if s in matrix.index or s in matrix.columns]
+            return matrix.reindex(index=order, columns=order, fill_value=0)
+
+        counts = group.groupby(by + ['from', 'to']).size().rename('count').reset_index()
+        counts['probability'] = counts['count'] / counts.groupby(by + ['from'])['count'].transform('sum')
+        return counts
+
+    def transition_matrix(self, include_absent=False):
+        """Row-normalized Markov transition matrix (P(to | from))."""
+        counts = self.transition_counts(include_absent=include_absent)
+        return counts.div(counts.sum(axis=1).replace(0, np.nan), axis=0).fillna(0)
+
+    def dwell_times(self, by=None):
+        """
+        Runs of the same status in adjacent reports. Per status (and group):
+        runs, finished runs (followed by another status), and mean/median
+        length in reports and days of the finished runs.
+        """
+        rows, cols, codes = self.rows, self.cols, self.codes
+        if len(codes) == 0:
+            return pd.DataFrame()
+        starts = np.ones(len(codes), dtype=bool)
+        starts[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1] + 1) | (codes[1:] != codes[:-1])
+        first = np.flatnonzero(starts)
+        last = np.append(first[1:] - 1, len(codes) - 1)
+
+        # Finished: the next entry is the same item in the next report, with another status
+        nxt = last + 1
+        finished = np.zeros(len(first), dtype=bool)
+        has_next = nxt < len(codes)
+        finished[has_next] = (rows[nxt[has_next]] == rows[last[has_next]]) & \
+                             (cols[nxt[has_next]] == cols[last[has_next]] + 1)
+
+        runs = pd.DataFrame({
+            'row': rows[first],
+            'status': np.array(self.statuses)[codes[first]],
+            'reports': cols[last] - cols[first] + 1,
+            'finished': finished,
+        })
+        end_col = np.where(finished, cols[last] + 1, cols[last])
+        runs['days'] = (self._entry_dates(rows[first], end_col) - self._entry_dates(rows[first], cols[first])) \
+            / np.timedelta64(1, 'D')
+
+        group, keys = self._grouped(runs, by)
+        done = group[group['finished']]
+        stats = pd.DataFrame({
+            'runs': group.groupby(keys + ['status']).size(),
+            'finished': done.groupby(keys + ['status']).size(),
+            'mean_reports': done.groupby(keys + ['status'])['reports'].mean(),
+            'median_reports': done.groupby(keys + ['status'])['reports'].median(),
+            'mean_days': done.groupby(keys + ['status'])['days'].mean().round(1),
+            'median_days': done.groupby(keys + ['status'])['days'].median(),
+        })
+        stats['finished'] = stats['finished'].fillna(0).astype(int)
+        return stats
+
+    def regression_rates(self, by=None, period=None):
+        """
+        Share of transitions out of an OK status (STATUS_MAP) that go to a
+        DEFECT or PENDING status, per group.
+        """
+        group, by = self._grouped(self.transitions(), by, period)
+        state = np.array([STATUS_MAP.get(s, 'INFO') for s in self.statuses])
+        from_state, to_state = state[group['from']], state[group['to']]
+        group = group.assign(
+            from_ok=from_state == 'OK',
+            regressed=(from_state == 'OK') & np.isin(to_state, ['DEFECT', 'PENDING']),
+        )
+        group = group[group['from_ok']]
+        if not by:
+            total = len(group)
+            return pd.Series({'from_ok': total, 'regressed': int(group['regressed'].sum()),
+                              'rate': group['regressed'].mean() if total else np.nan})
+        stats = group.groupby(by).agg(from_ok=('from_ok', 'size'), regressed=('regressed', 'sum'))
+        stats['rate'] = (stats['regressed'] / stats['from_ok']).round(3)
+        return stats
+
+
+if __name__ == "__main__":
+    history = StatusHistory.from_db()
+    if len(sys.argv) > 1:
+        history = history.select(category=sys.argv[1])
+
+    if len(history) == 0:
+        print("No work items found.")
+    else:
+        print(f"--- Transition Counts ({len(history.items)} items, {len(history)} observations) ---")
+        print(history.transition_counts(include_absent=True).to_string())
+        print("\n--- Transition Matrix P(to | from) ---")
+        print(history.transition_matrix().round(2).to_string())
+        print("\n--- Regression Rate by Category (OK -> DEFECT/PENDING) ---")
+        print(history.regression_rates(by='category').to_string())
+        print("\n--- Dwell Times ---")
+        print(history.dwell_times().to_string())
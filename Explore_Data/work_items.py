@@ -0,0 +1,140 @@
+"""
+Shared WorkItem loader for the analysis frames.
+
+Returns compact frames: category, status, state, location, apartment_number
+and projectId are dictionary-encoded categoricals (a small integer code per
+row plus one copy of each distinct string), and the free-text columns use
+string[pyarrow] when pyarrow is installed. The category and status
+vocabularies are fixed (STANDARD_APARTMENT_CATEGORIES, WorkStatus) so codes
+are stable across loads; values outside them are appended, never dropped.
+
+Filtering happens in SQL where possible. Frames filtered afterwards are not
+.copy()'d; callers derive new frames instead of mutating filtered ones.
+Group on these columns with observed=True.
+"""
+
+import pandas as pd
+
+from explore_db import STATUS_MAP, get_db_connection
+
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = pd.StringDtype('pyarrow')
+except ImportError:
+    TEXT_DTYPE = object
+
+# Same order as STANDARD_APARTMENT_CATEGORIES in progress-calculator-v3.ts
+STANDARD_APARTMENT_CATEGORIES = [
+    'ELECTRICAL',
+    'PLUMBING',
+    'AC',
+    'FLOORING',
+    'SPRINKLERS',
+    'DRYWALL',
+    'WATERPROOFING',
+    'PAINTING',
+    'KITCHEN',
+    'OTHER',
+]
+
+# WorkStatus enum from status-mapper.ts
+WORK_STATUSES = [
+    'COMPLETED',
+    'COMPLETED_OK',
+    'NOT_OK',
+    'DEFECT',
+    'IN_PROGRESS',
+    'HANDLED',
+    'PENDING',
+    'NOT_STARTED',
+]
+
+STATES = ['OK', 'DEFECT', 'PENDING', 'INFO']
+
+# Optional columns and the SQL that selects them
+EXTRA_COLUMNS = {
+    'id': 'wi.id',
+    'reportId': 'wi.reportId',
+    'apartmentId': 'wi.apartmentId',
+    'description': 'wi.description',
+    'notes': 'wi.notes',
+}
+TEXT_COLUMNS = ['description', 'notes']
+
+
+def as_category(values, vocabulary=None):
+    """
+    Dictionary-encodes a column. With a vocabulary the categories start with it
+    (in that order) and any unseen values are appended in sorted order.
+    """
+    seen = pd.unique(values.dropna())
+    if vocabulary is None:
+        categories = sorted(seen, key=str)
+    else:
+        known = set(vocabulary)
+        categories = list(vocabulary) + sorted((v for v in seen if v not in known), key=str)
+    return pd.Categorical(values, categories=categories)
+
+
+def load_work_items(conn=None, project_id=None, apt_num=None, exclude_errors=False,
+                    extra_columns=(), drop_info=True):
+    """
+    Loads apartment WorkItems joined with their report date and apartment.
+
+    Columns: projectId, apartment_number, category, status, location,
+    reportDate (datetime), state (STATUS_MAP, INFO for unmapped statuses),
+    plus any of EXTRA_COLUMNS requested in extra_columns.
+    Rows are ordered by reportDate, then WorkItem id so ties resolve the
+    same way everywhere. INFO rows are dropped unless drop_info=False.
+    """
+    select = [
+        'a.projectId',
+        'a.number as apartment_number',
+        'wi.category',
+        'wi.status',
+        'wi.location',
+        'r.reportDate',
+    ] + [f"{EXTRA_COLUMNS[c]} as {c}" for c in extra_columns]
+
+    query = f"""
+    SELECT {', '.join(select)}
+    FROM WorkItem wi
+    JOIN Report r ON wi.reportId = r.id
+    JOIN Apartment a ON wi.apartmentId = a.id
+    WHERE wi.apartmentId IS NOT NULL
+    """
+    params = []
+    if project_id is not None:
+        query += " AND a.projectId = ?"
+        params.append(project_id)
+    if apt_num is not None:
+        query += " AND a.number = ?"
+        params.append(str(apt_num))
+    if exclude_errors:
+        query += " AND (r.hasErrors = 0 OR r.hasErrors IS NULL)"
+    query += " ORDER BY r.reportDate ASC, wi.id ASC"
+
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        df = pd.read_sql_query(query, conn, params=params)
+    finally:
+        if own_conn:
+            conn.close()
+
+    df['reportDate'] = pd.to_datetime(df['reportDate'], unit='ms')
+    state = df['status'].map(STATUS_MAP).fillna('INFO')
+    if drop_info:
+        keep = (state != 'INFO').to_numpy()
+        df, state = df[keep], state[keep]
+
+    return df.assign(
+        projectId=as_category(df['projectId']),
+        apartment_number=as_category(df['apartment_number']),
+        category=as_category(df['category'], STANDARD_APARTMENT_CATEGORIES),
+        status=as_category(df['status'], WORK_STATUSES),
+        location=as_category(df['location']),
+        state=pd.Categorical(state, categories=STATES),
+        **{c: df[c].astype(TEXT_DTYPE) for c in TEXT_COLUMNS if c in df.columns},
+    ).reset_index(drop=True)
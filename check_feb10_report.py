@@ -1,24 +1,25 @@
-import sqlite3
+import os
+import sys
+
 import pandas as pd
 
-db_path = r'c:\Users\yoel\constructor\prisma\dev.db'
-conn = sqlite3.connect(db_path)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Explore_Data'))
+
+from explore_db import get_db_connection
+from report_catalog import ReportCatalog, get_catalog
 
-query = """
-    SELECT id, fileName, reportDate, processed, hasErrors, errorDetails, rawExtraction
-    FROM Report 
-    WHERE fileName LIKE '%2026-02-10%' OR fileName LIKE '%10.2.26%' OR fileName LIKE '%10.02.26%'
-"""
+conn = get_db_connection()
 
 print("--- Searching for Feb 10 2026 Report ---")
-df = pd.read_sql_query(query, conn)
-print(df)
+rows = get_catalog(conn).on_date('2026-02-10')
+df = ReportCatalog.to_frame(rows)
+print(df[['id', 'fileName', 'reportDate', 'processed', 'hasErrors', 'errorDetails']])
 
 if not df.empty:
     r_id = df.iloc[0]['id']
     print(f"\n--- Checking items for report {r_id} ---")
-    query_items = f"SELECT COUNT(*) as count FROM WorkItem WHERE reportId = '{r_id}'"
-    count = pd.read_sql_query(query_items, conn).iloc[0]['count']
+    query_items = "SELECT COUNT(*) as count FROM WorkItem WHERE reportId = ?"
+    count = pd.read_sql_query(query_items, conn, params=(r_id,)).iloc[0]['count']
     print(f"Total Items: {count}")
 
 conn.close()